@@ -0,0 +1,293 @@
+import json
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from zoneinfo import ZoneInfo
+from flask import Blueprint, Response, request, jsonify, abort, current_app
+from sqlalchemy import select, func
+from models import db, Venue, Artist, Show
+from queries import venue_show_history, artist_show_history, shows_page, \
+    artists_page, get_active
+from cache import cache
+from scheduling import check_lineup, show_time, DEFAULT_DURATION, MAX_DURATION
+from geo import nearby_venues, nearby_args
+from areas import venue_directory
+
+#----------------------------------------------------------------------------#
+# JSON API (v1).
+#----------------------------------------------------------------------------#
+
+# Read-only JSON views of the same data the HTML pages render. Responses go
+# through the response cache with the same tags as the pages, carry an ETag
+# of their body and a Last-Modified, and answer If-None-Match or
+# If-Modified-Since with 304 Not Modified.
+#
+# Last-Modified is the latest updated_at of the rows a response is built
+# from: the venues, artists and shows it lists and the shows behind their
+# counts. Detail pages also take the start of their latest past show, when
+# it moved from upcoming to past. Deletes and archiving aren't tracked (as
+# in exporter.py), so a list that lost a row, or a count that dropped with
+# it, only changes its ETag.
+# POST /shows/check tries a lineup against the bookings without saving it.
+# /venues/nearby lists venues by distance and is not cached.
+#
+# Common query parameters:
+#   fields=id,name       only return these keys for each item
+#   page=, per_page=     offset pagination for /venues and /artists (/venues
+#                        counts venues, grouped by city on each page)
+#   cursor=, per_page=   keyset pagination for /shows
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+MAX_LINEUP = 10000
+
+
+def conditional(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return view(*args, **kwargs).make_conditional(request)
+    return wrapper
+
+
+def json_response(data, last_modified=None):
+    response = Response(json.dumps(data, default=str, separators=(',', ':')), mimetype='application/json')
+    response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # clients may keep the body but must revalidate before reusing it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def latest(*stamps):
+    # the latest of the timestamps given, ignoring None
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+def latest_updated_at(*statements):
+    # the latest of the max(updated_at) statements, in one round trip
+    return latest(*db.session.execute(
+        select(*[statement.scalar_subquery() for statement in statements])).one())
+
+
+def started_at(shows):
+    # when the latest of the shows (stored in local time) started, in UTC like updated_at
+    if not shows:
+        return None
+    zone = current_app.config.get('SERVER_TIMEZONE')
+    start_time = shows[-1]["start_time"]
+    start_time = start_time.replace(tzinfo=ZoneInfo(zone)) if zone else start_time.astimezone()
+    return start_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def owner_updated_at(key, owner_id):
+    # the latest change to the shows of a venue or artist, or to whoever they are with
+    other, other_key = (Artist, 'artist_id') if key == 'venue_id' else (Venue, 'venue_id')
+    return latest_updated_at(
+        select(func.max(Show.updated_at)).where(getattr(Show, key) == owner_id),
+        select(func.max(other.updated_at)).
+        join(Show, getattr(Show, other_key) == other.id).
+        where(getattr(Show, key) == owner_id))
+
+
+def requested_fields():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+def select_fields(item, fields):
+    if fields is None:
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+
+def page_args():
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    if page < 1 or per_page < 1:
+        abort(400)
+    return page, min(per_page, MAX_PER_PAGE)
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return jsonify({"error": "bad request"}), 400
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return jsonify({"error": "not found"}), 404
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@conditional
+@cache.cached('venues')
+def venues():
+    page, per_page = page_args()
+    fields = requested_fields()
+    listed = [(area, venue) for area in venue_directory() for venue in area["venues"]]
+    start = (page - 1) * per_page
+    data, last_area = [], None
+    for area, venue in listed[start:start + per_page]:
+        if area is not last_area:
+            data.append(dict(area, venues=[]))
+            last_area = area
+        data[-1]["venues"].append(select_fields(venue, fields))
+    ids = [venue["id"] for _, venue in listed[start:start + per_page]]
+    return json_response({
+        "data": data,
+        "page": page,
+        "per_page": per_page,
+        "has_next": start + per_page < len(listed)
+    }, latest_updated_at(select(func.max(Venue.updated_at)).where(Venue.id.in_(ids)),
+                         select(func.max(Show.updated_at)).where(Show.venue_id.in_(ids))))
+
+
+@api.route('/venues/nearby')
+def venues_nearby():
+    # ?lat=&lng= or ?city=&state=, radius= in miles (unit=km for kilometres)
+    try:
+        latitude, longitude, radius = nearby_args(request.args)
+    except ValueError:
+        abort(400)
+    per_page = min(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), MAX_PER_PAGE)
+    if per_page < 1:
+        abort(400)
+    data = nearby_venues(latitude, longitude, radius, limit=per_page)
+    return json_response({"data": [select_fields(venue, requested_fields()) for venue in data],
+                          "radius": radius})
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional
+@cache.cached('venue:{venue_id}')
+def venue(venue_id):
+    venue = get_active(Venue, venue_id)
+    if venue is None:
+        abort(404)
+    past_shows, upcoming_shows = venue_show_history(venue_id)
+    data = {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": [genre.name for genre in venue.genres],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website_link": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+    return json_response({"data": select_fields(data, requested_fields())},
+                         latest(venue.updated_at, owner_updated_at('venue_id', venue_id),
+                                started_at(past_shows)))
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+@conditional
+@cache.cached('artists')
+def artists():
+    page, per_page = page_args()
+    fields = requested_fields()
+    data, has_next = artists_page(page=page, per_page=per_page)
+    ids = [artist["id"] for artist in data]
+    return json_response({
+        "data": [select_fields(artist, fields) for artist in data],
+        "page": page,
+        "per_page": per_page,
+        "has_next": has_next
+    }, latest_updated_at(select(func.max(Artist.updated_at)).where(Artist.id.in_(ids)),
+                         select(func.max(Show.updated_at)).where(Show.artist_id.in_(ids))))
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional
+@cache.cached('artist:{artist_id}')
+def artist(artist_id):
+    artist = get_active(Artist, artist_id)
+    if artist is None:
+        abort(404)
+    past_shows, upcoming_shows = artist_show_history(artist_id)
+    data = {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": [genre.name for genre in artist.genres],
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website_link": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
+    }
+    return json_response({"data": select_fields(data, requested_fields())},
+                         latest(artist.updated_at, owner_updated_at('artist_id', artist_id),
+                                started_at(past_shows)))
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@api.route('/shows')
+@conditional
+@cache.cached('shows')
+def shows():
+    _, per_page = page_args()
+    fields = requested_fields()
+    try:
+        data, next_cursor = shows_page(cursor=request.args.get('cursor'), per_page=per_page)
+    except ValueError:
+        abort(400)
+    return json_response({
+        "data": [select_fields(show, fields) for show in data],
+        "per_page": per_page,
+        "next_cursor": next_cursor
+    }, latest_updated_at(
+        select(func.max(Show.updated_at)).where(Show.id.in_([show["id"] for show in data])),
+        select(func.max(Venue.updated_at)).where(Venue.id.in_({show["venue_id"] for show in data})),
+        select(func.max(Artist.updated_at)).where(Artist.id.in_({show["artist_id"] for show in data}))))
+
+
+@api.route('/shows/check', methods=['POST'])
+def check_shows():
+    # {"shows": [{"venue_id": 1, "artist_id": 2, "start_time": "2026-11-01T20:00",
+    #             "duration": 90}, ...]} -> the conflicts, see scheduling.check_lineup
+    payload = request.get_json(silent=True)
+    shows = payload.get('shows') if isinstance(payload, dict) else None
+    if not isinstance(shows, list) or len(shows) > MAX_LINEUP:
+        abort(400)
+    lineup = []
+    try:
+        for show in shows:
+            # a value with an offset is compared in the zone shows are stored in
+            start_time = show_time(datetime.fromisoformat(show['start_time']))
+            duration = timedelta(minutes=int(show['duration'])) if show.get('duration') \
+                else DEFAULT_DURATION
+            if not timedelta(0) < duration <= MAX_DURATION:
+                abort(400)
+            lineup.append({"venue_id": int(show['venue_id']), "artist_id": int(show['artist_id']),
+                           "start_time": start_time, "end_time": start_time + duration})
+    except (KeyError, TypeError, ValueError):
+        abort(400)
+    conflicts = check_lineup(lineup)
+    return json_response({"ok": not conflicts, "conflicts": conflicts})
@@ -2,56 +2,169 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import os
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from datetime import timedelta
+from flask import Flask, Blueprint, render_template, request, Response, flash, redirect, url_for, \
+    abort, jsonify, current_app
 from flask_moment import Moment
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 import logging
 from logging import Formatter, FileHandler
 from flask_wtf import Form
 from flask_migrate import Migrate
 from forms import *
-from models import db, Venue, Artist, Show
+from models import db, Venue, Artist, Show, Genre
+from queries import venue_show_history, artist_show_history, shows_page, \
+    get_or_create_genres, genre_directory, artist_list, get_active
+from search import search_by_name
+from cache import cache
+from invalidation import invalidate_venue, invalidate_artist, invalidate_show
+from replicas import replicas
+from metrics import metrics
+from formatting import format_datetime, format_context_key
+from api import api
+from importer import import_command
+from counters import rollover_command, recount_command
+from scheduling import check_lineup, describe, DEFAULT_DURATION
+from geo import nearby_venues, nearby_args, geocode_command
+from deletion import delete, archive, purge_command, restore_command
+from areas import venue_directory, refresh_areas_command
+from autocomplete import autocomplete
+from fragments import fragments
+from images import images, thumbnails, images_command, thumbnail_url
+from assets import assets, bundles, assets_command, asset_urls
+from exporter import export, export_command
+from auth import admin_authorized
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db.init_app(app)
-migrate = Migrate(app, db)
-
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
-
-
-def genre_formatter(genres):
-    formatted_genres = genres.replace('{', '').replace('}', '')
-    formatted_genres = list(formatted_genres.split(','))
-    return formatted_genres
-
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
-
-
-app.jinja_env.filters['datetime'] = format_datetime
+moment = Moment()
+migrate = Migrate()
+main = Blueprint('main', __name__)
+cache.vary_on(format_context_key)
+
+
+def engine_options(config, uri=None):
+    # connection pool settings from config.py; SQLite keeps SQLAlchemy's defaults
+    uri = uri or config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite'):
+        return {}
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT'] and uri.startswith('postgres'):
+        options['connect_args'] = {
+            'options': '-c statement_timeout=%d' % config['DB_STATEMENT_TIMEOUT']
+        }
+    return options
+
+
+def create_app(config=None):
+    # config may be an object or import path loaded over config.py, or a dict
+    app = Flask(__name__)
+    app.config.from_object('config')
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+    moment.init_app(app)
+    db.init_app(app)
+    migrate.init_app(app, db)
+    cache.init_app(app)
+    replicas.init_app(app, engine_options)
+    metrics.init_app(app)
+    images.init_app(app)
+    assets.init_app(app)
+    autocomplete.init_app(app)
+    fragments.init_app(app)
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    app.register_blueprint(export)
+    app.register_blueprint(thumbnails)
+    app.register_blueprint(bundles)
+    app.cli.add_command(import_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(rollover_command)
+    app.cli.add_command(recount_command)
+    app.cli.add_command(images_command)
+    app.cli.add_command(assets_command)
+    app.cli.add_command(geocode_command)
+    app.cli.add_command(purge_command)
+    app.cli.add_command(restore_command)
+    app.cli.add_command(refresh_areas_command)
+    app.jinja_env.filters['datetime'] = format_datetime
+    app.jinja_env.globals['thumbnail'] = thumbnail_url
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(
+            Formatter(
+                '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+        )
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+def delete_owner(model, owner_id):
+    if not admin_authorized():
+        abort(401)
+    archived = current_app.config['SOFT_DELETE']
+    try:
+        found = archive(model, owner_id) if archived else delete(model, owner_id)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('could not delete %s %s', model.__name__, owner_id)
+        return jsonify({"success": False}), 500
+    if not found:
+        abort(404)
+    autocomplete.remove(model, owner_id)
+    return jsonify({"success": True, "archived": archived})
+
+
+def warm_pool(app, connections=None):
+    # open a few connections and hand them back to the pool, so a fresh
+    # worker's first requests don't pay for connection setup
+    if connections is None:
+        connections = app.config['DB_POOL_WARMUP']
+    with app.app_context():
+        opened = [db.engine.connect() for _ in range(connections)]
+        for connection in opened:
+            connection.execute(text('SELECT 1'))
+            connection.close()
+
+
+def warm_templates(app):
+    # compile every template up front (or load it from TEMPLATE_CACHE_DIR),
+    # so a fresh worker's first request to each page doesn't pay for it
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -59,88 +172,63 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@cache.cached('venues')
 def venues():
     # DONE: replace with real venues data.
     #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-    all_venues = Venue.query.all()
-    venue_locations = Venue.query.with_entities(Venue.city, Venue.state).group_by(
-        Venue.city, Venue.state).all()
-    print('All venues', venue_locations)
-    data = []
-
-    for (city, state) in venue_locations:
-        venues = Venue.query.filter(
-            Venue.city == city, Venue.state == state).all()
-        # join with shows and count upcoming
-        print('>>>>>>>>>>>>> \n', venues)
-        data.append({
-        "city": city,
-        "state": state,
-        "venues": venues
-    })
-
+    data = venue_directory()
     return render_template('pages/venues.html', areas=data)
 
 
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
 def search_venues():
     # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
 
-    name = request.form.get('search_term')
-    venues = Venue.query.filter(Venue.name.ilike('%'+name+'%')).all()
-    response = {
-        "count": len(venues),
-        "data": venues
-    }
+    search_term = request.form.get('search_term', '')
+    response = search_by_name(Venue, search_term,
+                              page=max(request.form.get('page', 1, type=int), 1),
+                              per_page=current_app.config['SEARCH_RESULTS_PER_PAGE'])
+
+    return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+
+@main.route('/venues/nearby')
+def venues_nearby():
+    # venues within radius miles of lat/lng or of a city, nearest first
+    results = None
+    if request.args:
+        try:
+            latitude, longitude, radius = nearby_args(request.args)
+            results = nearby_venues(latitude, longitude, radius,
+                                    limit=current_app.config['SEARCH_RESULTS_PER_PAGE'])
+        except ValueError as e:
+            flash(str(e))
+    return render_template('pages/nearby_venues.html', results=results, args=request.args)
+
 
-    return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+@main.route('/autocomplete')
+def autocomplete_names():
+    # venue and artist names with a word starting with q, from memory
+    limit = request.args.get('limit', current_app.config['AUTOCOMPLETE_RESULTS'], type=int)
+    response = jsonify(autocomplete.lookup(request.args.get('q', ''), max(1, min(limit, 20))))
+    response.cache_control.max_age = 60
+    return response
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/<int:venue_id>')
+@cache.cached('venue:{venue_id}')
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
-    venue = Venue.query.filter(Venue.id == venue_id).first()
-    venue.genres = genre_formatter(venue.genres)
-    
-    upcoming_shows_data = Show.query.join("artist_show").\
-        join("venue_show"). \
-        add_columns(Artist.name, Artist.image_link, Venue.id). \
-        filter(Venue.id == venue_id). \
-        filter(Show.start_time >= datetime.now()).all()
-
-    upcoming_shows = []
-    for upcoming_show in upcoming_shows_data:
-        upcoming_shows.append({
-            'artist_id': upcoming_show[0].artist_id,
-            'artist_name': upcoming_show[1],
-            'artist_image_link': upcoming_show[2],
-            'start_time': format_datetime(str(upcoming_show[0].start_time))
-        })
-
-    venue.upcoming_shows_count = len(upcoming_shows)
+    venue = get_active(Venue, venue_id)
+    if venue is None:
+        abort(404)
+
+    past_shows, upcoming_shows = venue_show_history(venue_id)
     venue.upcoming_shows = upcoming_shows
-    
-    
-    past_shows_data = Show.query.join("artist_show").\
-        join("venue_show"). \
-        add_columns(Artist.name, Artist.image_link, Venue.id). \
-        filter(Venue.id == venue_id). \
-        filter(Show.start_time < datetime.now()).all()
-
-    past_shows = []
-    for past_show in past_shows_data:
-        past_shows.append({
-            'artist_id': past_show[0].artist_id,
-            'artist_name': past_show[1],
-            'artist_image_link': past_show[2],
-            'start_time': format_datetime(str(past_show[0].start_time))
-        })
-
-    venue.past_shows_count = len(past_shows)
     venue.past_shows = past_shows
 
     return render_template('pages/show_venue.html', venue=venue)
@@ -149,13 +237,13 @@ def show_venue(venue_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # DONE: insert form data as a new Venue record in the db, instead
     # DONE: modify data to be the data object returned from db insertion
@@ -168,7 +256,7 @@ def create_venue_submission():
                 state=request.form['state'],
                 address=request.form['address'],
                 phone=request.form['phone'],
-                genres=request.form['genres'],
+                genres=get_or_create_genres(request.form.getlist('genres')),
                 facebook_link=request.form['facebook_link'],
                 image_link=request.form['image_link'],
                 website_link=request.form['website_link'],
@@ -178,13 +266,16 @@ def create_venue_submission():
             )
             db.session.add(new_venue)
             db.session.commit()
+            cache.invalidate('venues')
+            autocomplete.add(Venue, new_venue.id, new_venue.name)
+            images.enqueue(new_venue.image_link)
             # on successful db insert, flash success
             flash('The Venue: ' +
                 request.form['name'] + ' was created successfully!')
 
         # DONE: on unsuccessful db insert, flash an error instead.
-        except Exception as e:
-            print('>>>>>>>>>>>>>:', e, '||', request.form['genres'])
+        except Exception:
+            current_app.logger.exception('could not create venue %r', request.form.get('name'))
             flash('An error occurred when creating the venue.')
             db.session.rollback()
         # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
@@ -200,83 +291,54 @@ def create_venue_submission():
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-    return None
+    # DONE: deletes the venue and its shows in one statement, or archives it
+    # with SOFT_DELETE on (see deletion.py). The Delete button on the venue
+    # page calls this and then goes back to the homepage.
+    return delete_owner(Venue, venue_id)
 
 #  Artists
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists')
+@main.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    return delete_owner(Artist, artist_id)
+
+
+@main.route('/artists')
+@cache.cached('artists')
 def artists():
     # DONE: replace with real data returned from querying the database
-    all_artists = Artist.query.all()
-    return render_template('pages/artists.html', artists=all_artists)
+    return render_template('pages/artists.html', artists=artist_list())
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
 def search_artists():
     # DONE: implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search = request.form.get('search_term')
-    artists = Artist.query.filter(Artist.name.ilike('%' + search + '%')).all()
-    response = {
-        "count": len(artists),
-        "data": artists
-    }
+    search_term = request.form.get('search_term', '')
+    response = search_by_name(Artist, search_term,
+                              page=max(request.form.get('page', 1, type=int), 1),
+                              per_page=current_app.config['SEARCH_RESULTS_PER_PAGE'])
 
-    return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+    return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/artists/<int:artist_id>')
+@cache.cached('artist:{artist_id}')
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
     # DONE: replace with real artist data from the artist table, using artist_id
-    artist = Artist.query.get(artist_id)
-    artist.genres = genre_formatter(artist.genres)
-
-    upcoming_shows_data = Show.query.join(Venue).\
-      add_columns(Venue.name, Venue.image_link).\
-      filter(Show.artist_id == artist_id).\
-      filter(Show.start_time >= datetime.now()).all()
-
-    upcoming_shows = []
-    for upcoming_show in upcoming_shows_data:
-      upcoming_shows.append({
-          'venue_id': upcoming_show[0].venue_id,
-          'venue_name': upcoming_show[1],
-          'venue_image_link': upcoming_show[2],
-          'start_time': format_datetime(str(upcoming_show[0].start_time))
-      })
-      
+    artist = get_active(Artist, artist_id)
+    if artist is None:
+        abort(404)
 
+    past_shows, upcoming_shows = artist_show_history(artist_id)
     artist.upcoming_shows = upcoming_shows
-    artist.upcoming_shows_count = len(upcoming_shows)
-    
-    
-    past_shows_datas = Show.query.join(Venue, Show.venue_id == Venue.id).\
-      add_columns(Venue.name, Venue.image_link).\
-      filter(Show.artist_id == artist_id).\
-      filter(Show.start_time < datetime.now()).all()
-
-    past_shows = []
-    for past_show in past_shows_datas:
-      past_shows.append({
-          'venue_id': past_show[0].venue_id,
-          'venue_name': past_show[1],
-          'venue_image_link': past_show[2],
-          'start_time': format_datetime(str(past_show[0].start_time))
-      })
-    
     artist.past_shows = past_shows
-    artist.past_shows_count = len(past_shows)
 
     return render_template('pages/show_artist.html', artist=artist)
 
@@ -284,89 +346,119 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     form = ArtistForm()
     # DONE: populate form with fields from artist with ID <artist_id>
-    artist = Artist.query.filter(Artist.id == artist_id).first()
+    artist = get_active(Artist, artist_id)
+    if artist is None:
+        abort(404)
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # DONE: take values from the form submitted, and update existing
     # artist record with ID <artist_id> using the new attributes
+    if get_active(Artist, artist_id) is None:
+        abort(404)
     try:
         artist = {
             "name": request.form['name'],
             "city": request.form['city'],
             "state": request.form['state'],
             "phone": request.form['phone'],
-            "genres": request.form.getlist('genres'),
             "facebook_link": request.form['facebook_link'],
             "image_link": request.form['image_link'],
             "website_link": request.form['website_link'],
             "seeking_venue": True if request.form.get('seeking_venue') == 'y' else False,
             "seeking_description": request.form['seeking_description']
         }
-        Artist.query.filter_by(id=artist_id).update(artist)
+        existing = db.session.get(Artist, artist_id)
+        image_changed = existing.image_link != artist['image_link']
+        if image_changed:
+            artist['image_key'] = None
+        # set on the instance, so the flush hooks (geo.py, areas.py) see it
+        for key, value in artist.items():
+            setattr(existing, key, value)
+        existing.genres = get_or_create_genres(request.form.getlist('genres'))
         db.session.commit()
+        invalidate_artist(artist_id)
+        autocomplete.add(Artist, artist_id, artist['name'])
+        if image_changed:
+            images.enqueue(artist['image_link'])
         flash(request.form['name'] + ' has been updated!')
-    except:
+    except Exception:
         db.session.rollback()
+        current_app.logger.exception('could not update artist %s', artist_id)
         flash('An error occurred while updating the artist')
     finally:
         db.session.close()
 
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     form = VenueForm()
     # DONE: populate form with values from venue with ID <venue_id>
-    venue = Venue.query.get(venue_id)
+    venue = get_active(Venue, venue_id)
+    if venue is None:
+        abort(404)
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # DONE: take values from the form submitted, and update existing
     # venue record with ID <venue_id> using the new attributes
+    if get_active(Venue, venue_id) is None:
+        abort(404)
     try:
         venue = {
                 "name": request.form['name'],
                 "city": request.form['city'],
                 "state": request.form['state'],
                 "phone": request.form['phone'],
-                "genres": request.form.getlist('genres'),
                 "facebook_link": request.form['facebook_link'],
                 "image_link": request.form['image_link'],
                 "website_link": request.form['website_link'],
                 "seeking_talent": True if request.form.get('seeking_talent') == 'y' else False,
                 "seeking_description": request.form['seeking_description']
                 }
-        Venue.query.filter_by(id=venue_id).update(venue)
+        existing = db.session.get(Venue, venue_id)
+        image_changed = existing.image_link != venue['image_link']
+        if image_changed:
+            venue['image_key'] = None
+        # set on the instance, so the flush hooks (geo.py, areas.py) see it
+        for key, value in venue.items():
+            setattr(existing, key, value)
+        existing.genres = get_or_create_genres(request.form.getlist('genres'))
         db.session.commit()
+        invalidate_venue(venue_id)
+        autocomplete.add(Venue, venue_id, venue['name'])
+        if image_changed:
+            images.enqueue(venue['image_link'])
         flash('Venue has been updated succesifully!')
-    except:
+    except Exception:
         db.session.rollback()
+        current_app.logger.exception('could not update venue %s', venue_id)
         flash('An error occurred while updating the venue')
     finally:
         db.session.close()
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # DONE: insert form data as a new Venue record in the db, instead
@@ -379,7 +471,7 @@ def create_artist_submission():
                 city=request.form['city'],
                 state=request.form['state'],
                 phone=request.form['phone'],
-                genres=request.form.getlist('genres'),
+                genres=get_or_create_genres(request.form.getlist('genres')),
                 image_link=request.form['image_link'],
                 facebook_link=request.form['facebook_link'],
                 seeking_venue=True if request.form.get(
@@ -388,14 +480,17 @@ def create_artist_submission():
                 seeking_description=request.form['seeking_description'])
             db.session.add(artist)
             db.session.commit()
+            cache.invalidate('artists')
+            autocomplete.add(Artist, artist.id, artist.name)
+            images.enqueue(artist.image_link)
             # on successful db insert, flash success
             flash(request.form['name'] +
                 ' was successfully added to artists list!')
 
             return render_template('pages/home.html')
 
-        except Exception as e:
-            print('>>>>>>>>>>>>>>>>>>', e)
+        except Exception:
+            current_app.logger.exception('could not create artist %r', request.form.get('name'))
             db.session.rollback()
             # DONE: on unsuccessful db insert, flash an error instead.
             flash('An error occurred when adding the artist.')
@@ -409,49 +504,87 @@ def create_artist_submission():
     return render_template('pages/home.html')
 
 
+#  Genres
+#  ----------------------------------------------------------------
+
+@main.route('/genres/<name>')
+def show_genre(name):
+    # venues and artists for a genre, e.g. /genres/Jazz?city=San Francisco&state=CA
+    genre = Genre.query.filter_by(name=name).first()
+    if genre is None:
+        abort(404)
+    city = request.args.get('city')
+    state = request.args.get('state')
+    data = genre_directory(genre, city=city, state=state)
+    return render_template('pages/genre.html', genre=genre, city=city, state=state, **data)
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@cache.cached('shows')
 def shows():
     # displays list of shows at /shows
     # DONE: replace with real venues data.
-    data = []
-    shows = Show.query.join("artist_show").join("venue_show").order_by(Show.start_time.desc()).all()
-    for show in shows:
-        data.append({
-        "venue_id": show.venue_id,
-        "venue_name": show.venue_show.name,
-        "artist_id": show.artist_id,
-        "artist_name": show.artist_show.name,
-        "artist_image_link": show.artist_show.image_link,
-        "start_time": format_datetime(str(show.start_time))
-        })
-    
-    return render_template('pages/shows.html', shows=data)
+    try:
+        data, next_cursor = shows_page(
+            cursor=request.args.get('cursor'),
+            per_page=current_app.config['SHOWS_PER_PAGE'])
+    except ValueError:
+        abort(400)
 
+    return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
-@app.route('/shows/create')
+
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # DONE: insert form data as a new Show record in the db, instead
+    form = ShowForm(request.form)
+    if not form.validate():
+        for error in form.errors:
+            flash(form.errors[error][0])
+        return render_template('forms/new_show.html', form=form)
+    if get_active(Artist, form.artist_id.data) is None:
+        flash('There is no artist with ID %s' % form.artist_id.data)
+        return render_template('forms/new_show.html', form=form)
+    if get_active(Venue, form.venue_id.data) is None:
+        flash('There is no venue with ID %s' % form.venue_id.data)
+        return render_template('forms/new_show.html', form=form)
+
+    booking = {
+        "artist_id": form.artist_id.data,
+        "venue_id": form.venue_id.data,
+        "start_time": form.start_time.data,
+        "end_time": form.start_time.data + (timedelta(minutes=form.duration.data)
+                                            if form.duration.data else DEFAULT_DURATION)
+    }
+    conflicts = check_lineup([booking])
+    if conflicts:
+        for conflict in conflicts:
+            flash(describe(conflict))
+        return render_template('forms/new_show.html', form=form)
     try:
-            show = Show(
-                artist_id = request.form['artist_id'],
-                venue_id  = request.form['venue_id'],
-                start_time= request.form['start_time'])
+            show = Show(**booking)
             db.session.add(show)
             db.session.commit()
+            invalidate_show(show.venue_id, show.artist_id)
             # on successful db insert, flash success
             flash('Show was successfully listed!')
             return render_template('pages/home.html')
+    except IntegrityError:
+        # booked by someone else since the check (Postgres exclusion constraints)
+        db.session.rollback()
+        flash('The venue or artist is already booked then.')
+        return render_template('forms/new_show.html', form=form)
     except:
          # DONE: on unsuccessful db insert, flash an error instead.
         db.session.rollback()
@@ -464,38 +597,32 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@main.route('/cache/stats')
+def cache_stats():
+    # hit/miss counters for this worker's response cache
+    if not admin_authorized():
+        abort(401)
+    return jsonify(cache.stats())
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
-# Default port:
-# if __name__ == '__main__':
-#     app.run()
-
-# Or specify port manually:
+# Production: gunicorn wsgi:application (see wsgi.py)
 
 if __name__ == '__main__':
+    app = create_app()
     app.debug = True
     # port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=5000)
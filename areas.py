@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, select, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Venue, Show, VenueArea, VenueAreaRefresh
+from queries import active, venue_areas
+from cache import cache
+from invalidation import report_cli_invalidation
+
+#----------------------------------------------------------------------------#
+# Venue directory summary.
+#----------------------------------------------------------------------------#
+
+# /venues lists every active venue grouped by city. Instead of reading and
+# grouping the whole Venue table on each request, it reads VenueArea: one
+# row per (state, city) holding that city's venue list with the upcoming
+# show counts, already sorted.
+#
+# A row is rebuilt in the transaction that changes it: ORM flushes of venues
+# and shows (including the edit pages, which set the fields on the loaded
+# venue) are picked up by the after_flush hook below, and the Core writes
+# that go around it (counters.roll_over, the importer, deletion.py) call
+# refresh_venue_areas() themselves. Rebuilding a row first locks it, so two
+# writers in the same city take turns instead of overwriting each other.
+#
+# 'flask refresh-areas' rebuilds every row from the Venue table without
+# blocking readers, and should run from cron:
+#
+#   */15 * * * *  flask refresh-areas
+#
+# A write that bypasses both (SQL run by hand, say) is only picked up by
+# the next full rebuild, so when 'flask refresh-areas' hasn't run for
+# VENUE_AREAS_MAX_AGE seconds venue_directory() stops trusting the summary
+# and groups the Venue table live, with a warning in the log, until it
+# does. 0 trusts the summary however old it is.
+
+
+def _matches(column, value):
+    # venues without a city or state are filed under ''
+    return column == value if value else or_(column.is_(None), column == '')
+
+
+def _area(row):
+    return {"id": row.id, "name": row.name, "num_upcoming_shows": row.upcoming_shows_count}
+
+
+def _upsert(connection, rows):
+    table = VenueArea.__table__
+    dialects = {'postgresql': postgresql, 'sqlite': sqlite}
+    dialect = dialects.get(connection.dialect.name)
+    if dialect is None:
+        for row in rows:
+            connection.execute(table.delete().where(table.c.state == row['state'],
+                                                    table.c.city == row['city']))
+        connection.execute(table.insert(), rows)
+        return
+    insert = dialect.insert(table)
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=['state', 'city'],
+        set_={"venues": insert.excluded.venues, "refreshed_at": insert.excluded.refreshed_at}),
+        rows)
+
+
+def refresh_areas(connection, keys, now=None):
+    # rebuilds the rows of the given (state, city) areas
+    now = now or datetime.utcnow()
+    table = VenueArea.__table__
+    venue = Venue.__table__
+    rows, emptied = [], []
+    for state, city in sorted({(state or '', city or '') for state, city in keys}):
+        connection.execute(select(table.c.state).
+                           where(table.c.state == state, table.c.city == city).
+                           with_for_update()).first()
+        venues = connection.execute(
+            select(venue.c.id, venue.c.name, venue.c.upcoming_shows_count).
+            where(_matches(venue.c.state, state), _matches(venue.c.city, city),
+                  venue.c.archived_at.is_(None)).
+            order_by(venue.c.name, venue.c.id)).all()
+        if venues:
+            rows.append({"state": state, "city": city, "refreshed_at": now,
+                         "venues": [_area(row) for row in venues]})
+        else:
+            emptied.append((state, city))
+    for state, city in emptied:
+        connection.execute(table.delete().where(table.c.state == state, table.c.city == city))
+    if rows:
+        _upsert(connection, rows)
+
+
+def venue_area_keys(connection, venue_ids):
+    # the (state, city) of each of the venues
+    if not venue_ids:
+        return set()
+    venue = Venue.__table__
+    return {(row.state, row.city) for row in connection.execute(
+        select(venue.c.state, venue.c.city).where(venue.c.id.in_(list(venue_ids))).distinct())}
+
+
+def refresh_venue_areas(connection, venue_ids, now=None):
+    # rebuilds the areas the venues are in
+    refresh_areas(connection, venue_area_keys(connection, venue_ids), now)
+
+
+def refresh_all(now=None):
+    # rebuilds every row in one transaction; returns how many areas there are
+    now = now or datetime.utcnow()
+    connection = db.session.connection()
+    table = VenueArea.__table__
+    areas = {}
+    for row in db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                Venue.upcoming_shows_count). \
+            filter(active(Venue)).order_by(Venue.name, Venue.id):
+        areas.setdefault((row.state or '', row.city or ''), []).append(_area(row))
+    gone = [(row.state, row.city) for row in connection.execute(
+        select(table.c.state, table.c.city)) if (row.state, row.city) not in areas]
+    for state, city in gone:
+        connection.execute(table.delete().where(table.c.state == state, table.c.city == city))
+    if areas:
+        _upsert(connection, [{"state": state, "city": city, "venues": venues,
+                              "refreshed_at": now}
+                             for (state, city), venues in sorted(areas.items())])
+    marker = VenueAreaRefresh.__table__
+    if not connection.execute(marker.update().values(refreshed_at=now)).rowcount:
+        connection.execute(marker.insert().values(id=1, refreshed_at=now))
+    db.session.commit()
+    return len(areas)
+
+
+#  ORM writes
+#  ----------------------------------------------------------------
+
+# changes to these venue columns move a venue or change what it shows
+VENUE_COLUMNS = ('name', 'city', 'state', 'upcoming_shows_count', 'archived_at')
+
+
+def _venue_keys(venue, changed_only):
+    state = inspect(venue)
+    keys = set()
+    if changed_only and not any(state.attrs[name].history.has_changes()
+                                for name in VENUE_COLUMNS):
+        return keys
+    city, region = state.attrs.city.history, state.attrs.state.history
+    # the area it is in now, and the one it moved out of
+    keys.add(((region.added or region.unchanged or [None])[0],
+              (city.added or city.unchanged or [None])[0]))
+    if region.deleted or city.deleted:
+        keys.add(((region.deleted or region.unchanged or [None])[0],
+                  (city.deleted or city.unchanged or [None])[0]))
+    return keys
+
+
+@event.listens_for(Session, 'after_flush')
+def _refresh_flushed_areas(session, flush_context):
+    keys, venue_ids = set(), set()
+    for obj in session.new:
+        if isinstance(obj, Venue):
+            keys |= _venue_keys(obj, False)
+        elif isinstance(obj, Show):
+            venue_ids.add(obj.venue_id)
+    for obj in session.dirty:
+        if isinstance(obj, Venue):
+            keys |= _venue_keys(obj, True)
+        elif isinstance(obj, Show):
+            history = inspect(obj).attrs.venue_id.history
+            venue_ids.update(history.added + history.deleted)
+    for obj in session.deleted:
+        if isinstance(obj, Venue):
+            keys.add((obj.state, obj.city))
+        elif isinstance(obj, Show):
+            venue_ids.add(obj.venue_id)
+    if not keys and not venue_ids:
+        return
+    connection = session.connection()
+    refresh_areas(connection, keys | venue_area_keys(connection, venue_ids))
+
+
+#  Queries
+#  ----------------------------------------------------------------
+
+def summary_statement():
+    # the rows, each carrying when the summary was last rebuilt in full
+    rebuilt_at = select(VenueAreaRefresh.refreshed_at).scalar_subquery()
+    return select(VenueArea.city, VenueArea.state, VenueArea.venues,
+                  rebuilt_at.label('rebuilt_at')). \
+        order_by(VenueArea.state, VenueArea.city)
+
+
+_warned = False
+
+
+def summary_areas(rows, now=None):
+    # the /venues tree from the summary rows, or None if it can't be trusted
+    global _warned
+    max_age = current_app.config['VENUE_AREAS_MAX_AGE']
+    now = now or datetime.utcnow()
+    if not rows:
+        return None
+    rebuilt_at = rows[0].rebuilt_at
+    if max_age and (rebuilt_at is None or rebuilt_at < now - timedelta(seconds=max_age)):
+        if not _warned:
+            current_app.logger.warning(
+                "venue area summary: 'flask refresh-areas' hasn't run in the last %d seconds "
+                "(VENUE_AREAS_MAX_AGE); grouping venues live until it does", max_age)
+            _warned = True
+        return None
+    _warned = False
+    return [{"city": row.city, "state": row.state, "venues": row.venues} for row in rows]
+
+
+def venue_directory(now=None):
+    # the city/state -> venues -> num_upcoming_shows tree for /venues, from
+    # the summary while it is fresh enough
+    areas = summary_areas(db.session.execute(summary_statement()).all(), now)
+    return venue_areas() if areas is None else areas
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('refresh-areas')
+@with_appcontext
+def refresh_areas_command():
+    """Rebuild the per-city venue summary behind /venues.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    count = refresh_all()
+    cache.invalidate('venues')
+    click.echo('Refreshed %d areas' % count)
+    report_cli_invalidation()
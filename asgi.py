@@ -0,0 +1,20 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#----------------------------------------------------------------------------#
+
+# uvicorn asgi:application --workers 4 --host 0.0.0.0 --port 8000
+# gunicorn -k uvicorn.workers.UvicornWorker --workers 4 --bind 0.0.0.0:8000 asgi:application
+#
+# The optional async serving mode (see async_views.py): listing, detail,
+# search and /shows pages run on an async engine, the rest of the app as it
+# does under wsgi.py. Needs the async packages in requirements.txt. As with
+# wsgi.py, each worker must import this module after the fork.
+
+from app import create_app, warm_pool, warm_templates
+from async_views import AsyncPages
+from autocomplete import autocomplete
+
+application = AsyncPages(create_app())
+warm_pool(application.app)
+warm_templates(application.app)
+autocomplete.load(application.app)
@@ -0,0 +1,244 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import posixpath
+import click
+from flask import Blueprint, current_app, request, send_from_directory, url_for, abort
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # only gzip variants are written
+    brotli = None
+
+#----------------------------------------------------------------------------#
+# Static asset bundles.
+#----------------------------------------------------------------------------#
+
+# The layouts load a handful of bundles instead of a dozen separate files.
+# 'flask assets' concatenates and minifies the sources of each bundle in
+# BUNDLES into ASSETS_DIR as <name>.<content hash>.<ext>, next to .gz and
+# (with the brotli package installed) .br copies, and records the file names
+# in manifest.json. /assets/<file> serves them with a one-year immutable
+# Cache-Control, picking the precompressed copy the browser accepts; a new
+# build gets new names, so nothing stale is ever served.
+#
+# Until a build exists, or with ASSETS_DEBUG on, asset_urls() lists the
+# source files under /static instead, so editing a stylesheet in development
+# needs no rebuild. Run 'flask assets' on every deploy, before the workers
+# start: they read the manifest once.
+
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/font-awesome.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'form.css': [
+        'css/bootstrap.min.css',
+        'css/bootstrap-theme.min.css',
+        'css/font-awesome.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    # runs before the page renders, so it stays in <head>
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+    ],
+    # loaded with defer at the end of <body>, in this order
+    'main.js': [
+        'js/libs/jquery-1.11.1.min.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/libs/moment.min.js',
+        'js/plugins.js',
+        'js/script.js',
+    ],
+}
+
+ONE_YEAR = 365 * 24 * 3600
+
+MANIFEST = 'manifest.json'
+NAME_PATTERN = re.compile(r'^[a-z]+\.[0-9a-f]{16}\.(css|js)$')
+MIMETYPES = {'css': 'text/css; charset=utf-8', 'js': 'application/javascript; charset=utf-8'}
+
+# preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+#  Minification
+#  ----------------------------------------------------------------
+
+CSS_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def minify_css(text):
+    # drops comments (except /*! licences */) and insignificant whitespace
+    text = CSS_COMMENT.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # whole-line // comments, indentation and blank lines only: anything
+    # cleverer needs a real parser, and the libraries come minified already
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def rebase_urls(text, source, static_url_path):
+    # url(../fonts/x.woff) in css/y.css becomes url(/static/fonts/x.woff),
+    # since the bundle is served from somewhere else
+    directory = posixpath.dirname(source)
+
+    def absolute(match):
+        quote, target = match.groups()
+        if re.match(r'^([a-z]+:|/|#)', target):
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(directory, target))
+        return 'url(%s%s/%s%s)' % (quote, static_url_path, path, quote)
+
+    return CSS_URL.sub(absolute, text)
+
+
+#  Build
+#  ----------------------------------------------------------------
+
+def bundle(name, static_folder, static_url_path):
+    # the minified contents of one bundle
+    extension = name.rsplit('.', 1)[1]
+    parts = []
+    for source in BUNDLES[name]:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if extension == 'css':
+            text = rebase_urls(text, source, static_url_path)
+            if not source.endswith('.min.css'):
+                text = minify_css(text)
+        else:
+            text = re.sub(r'^//[#@] sourceMappingURL=.*$', '', text, flags=re.M)
+            if not source.endswith('.min.js'):
+                text = minify_js(text)
+        parts.append(text.strip())
+    # a statement left open by one script must not swallow the next
+    return ('\n' if extension == 'css' else ';\n').join(parts) + '\n'
+
+
+def _write(path, data):
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build(directory, static_folder, static_url_path):
+    # writes every bundle and its compressed copies; returns the new manifest
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory) or {}
+    manifest = {}
+    for name in sorted(BUNDLES):
+        data = bundle(name, static_folder, static_url_path).encode('utf-8')
+        stem, extension = name.rsplit('.', 1)
+        filename = '%s.%s.%s' % (stem, hashlib.sha256(data).hexdigest()[:16], extension)
+        path = os.path.join(directory, filename)
+        _write(path, data)
+        _write(path + '.gz', gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data))
+        manifest[name] = filename
+    _write(os.path.join(directory, MANIFEST),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    # keep the previous build too: cached pages may still point at it
+    keep = set(manifest.values()) | set(previous.values())
+    for filename in os.listdir(directory):
+        base = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if NAME_PATTERN.match(base) and base not in keep:
+            os.remove(os.path.join(directory, filename))
+    return manifest
+
+
+class Assets(object):
+
+    def __init__(self, app=None):
+        self._manifests = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['assets'] = self
+
+    def manifest(self, directory):
+        # read once per worker; None without a build
+        if directory not in self._manifests:
+            self._manifests[directory] = read_manifest(directory)
+        return self._manifests[directory]
+
+
+def asset_urls(name):
+    # template helper: the URLs to load for a bundle
+    config = current_app.config
+    manifest = None if config['ASSETS_DEBUG'] else assets.manifest(config['ASSETS_DIR'])
+    if manifest and name in manifest:
+        return [url_for('assets.bundle_file', name=manifest[name])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+#  HTTP endpoint
+#  ----------------------------------------------------------------
+
+bundles = Blueprint('assets', __name__, url_prefix='/assets')
+
+
+@bundles.route('/<name>')
+def bundle_file(name):
+    if not NAME_PATTERN.match(name):
+        abort(404)
+    directory = current_app.config['ASSETS_DIR']
+    filename, encoding = name, None
+    for candidate, suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and \
+                os.path.exists(os.path.join(directory, name + suffix)):
+            filename, encoding = name + suffix, candidate
+            break
+    response = send_from_directory(directory, filename, max_age=ONE_YEAR,
+                                   mimetype=MIMETYPES[name.rsplit('.', 1)[1]])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('assets')
+@with_appcontext
+def assets_command():
+    """Bundle, minify and compress the static assets for production."""
+    app = current_app._get_current_object()
+    manifest = build(app.config['ASSETS_DIR'], app.static_folder, app.static_url_path)
+    for name, filename in sorted(manifest.items()):
+        size = os.path.getsize(os.path.join(app.config['ASSETS_DIR'], filename))
+        click.echo('%-10s %-32s %8d bytes' % (name, filename, size))
+
+
+assets = Assets()
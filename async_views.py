@@ -0,0 +1,380 @@
+import io
+import sys
+import asyncio
+import contextvars
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, request, render_template, abort
+from sqlalchemy.engine import make_url
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import run_wsgi_app
+from models import Venue, Artist, Show
+from queries import active_statement, venue_areas_statement, group_areas, \
+    venue_shows_statement, artist_shows_statement, shows_page_statement, page_of_shows, \
+    artist_list_statement
+from search import search_statements, search_results, uses_fts, create_fts
+from areas import summary_statement, summary_areas
+from cache import cache
+
+try:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+except ImportError:  # greenlet is missing; AsyncPages refuses to start
+    create_async_engine = None
+
+#----------------------------------------------------------------------------#
+# Async serving mode.
+#----------------------------------------------------------------------------#
+
+# asgi.py serves the app from an ASGI server such as uvicorn. The pages in
+# VIEWS below (the venue and artist listings and detail pages, both
+# searches and /shows) then run as coroutines on the server's event loop,
+# with their queries on an async engine, so a worker waiting on the
+# database goes on with other requests instead of blocking. Queries a page
+# needs independently of each other run at the same time, each on its own
+# connection: a detail page sends the venue or artist, its upcoming shows
+# and its past shows together.
+#
+# Everything else (forms, writes, the JSON API, exports, static files) is
+# the unchanged Flask app, run in a pool of ASYNC_WSGI_THREADS threads with
+# the usual sync engine. Both modes share the queries (queries.py builds the
+# statements), templates, response cache and metrics; wsgi.py keeps working
+# as before.
+#
+# The async engine uses ASYNC_DATABASE_URL, by default DATABASE_URL with
+# the async driver of its database (asyncpg, aiosqlite). It reads from that
+# one database only: replicas.py routes the sync engine alone.
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+VIEWS = {}
+
+_fts_ready = set()
+_fts_lock = asyncio.Lock()
+
+
+def async_url(uri):
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError('no async driver for %s; set ASYNC_DATABASE_URL' % url.drivername)
+    return url.set(drivername=driver)
+
+
+class AsyncDatabase(object):
+    # the async engine of one worker, created on first use inside its loop
+
+    def __init__(self):
+        self.engine = None
+        self.sessions = None
+
+    def connect(self, config):
+        url = make_url(config.get('ASYNC_DATABASE_URL') or
+                       async_url(config['SQLALCHEMY_DATABASE_URI']))
+        options = {}
+        if url.get_backend_name() != 'sqlite':
+            options = {
+                'pool_size': config['DB_POOL_SIZE'],
+                'max_overflow': config['DB_MAX_OVERFLOW'],
+                'pool_timeout': config['DB_POOL_TIMEOUT'],
+                'pool_recycle': config['DB_POOL_RECYCLE'],
+                'pool_pre_ping': config['DB_POOL_PRE_PING'],
+            }
+            if config['DB_STATEMENT_TIMEOUT'] and url.get_backend_name() == 'postgresql':
+                options['connect_args'] = {
+                    'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}
+                }
+        self.engine = create_async_engine(url, **options)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def warm(self, connections):
+        # the async counterpart of app.warm_pool()
+        async def ping():
+            async with self.engine.connect() as connection:
+                await connection.exec_driver_sql('SELECT 1')
+        await asyncio.gather(*[ping() for _ in range(connections)])
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = None
+
+    def get_engine(self):
+        if self.engine is None:
+            self.connect(current_app.config)
+        return self.engine
+
+    # each statement runs on a session of its own, so that several can be
+    # awaited at once
+
+    async def all(self, statement):
+        self.get_engine()
+        async with self.sessions() as session:
+            return (await session.execute(statement)).all()
+
+    async def scalar(self, statement):
+        self.get_engine()
+        async with self.sessions() as session:
+            return (await session.execute(statement)).scalar()
+
+    async def first(self, statement):
+        # the first ORM object, or None
+        self.get_engine()
+        async with self.sessions() as session:
+            return (await session.execute(statement)).scalars().first()
+
+
+database = AsyncDatabase()
+
+
+#  Pages
+#  ----------------------------------------------------------------
+#  Each coroutine answers one endpoint of the Flask app exactly as the sync
+#  view in app.py does, inside a Flask request context.
+
+def view(endpoint):
+    def decorator(func):
+        VIEWS[endpoint] = func
+        return func
+    return decorator
+
+
+@view('main.venues')
+@cache.cached_async('venues')
+async def venues():
+    areas = summary_areas(await database.all(summary_statement()))
+    if areas is None:
+        areas = group_areas(await database.all(venue_areas_statement()))
+    return render_template('pages/venues.html', areas=areas)
+
+
+async def _owner_page(model, owner_id, shows, template, name):
+    now = datetime.now()
+    owner, upcoming, past = await asyncio.gather(
+        database.first(active_statement(model, owner_id)),
+        database.all(shows.where(Show.start_time >= now)),
+        database.all(shows.where(Show.start_time < now)))
+    if owner is None:
+        abort(404)
+    owner.upcoming_shows = [row._asdict() for row in upcoming]
+    owner.past_shows = [row._asdict() for row in past]
+    return render_template(template, **{name: owner})
+
+
+@view('main.show_venue')
+@cache.cached_async('venue:{venue_id}')
+async def show_venue(venue_id):
+    return await _owner_page(Venue, venue_id, venue_shows_statement(venue_id),
+                             'pages/show_venue.html', 'venue')
+
+
+@view('main.artists')
+@cache.cached_async('artists')
+async def artists():
+    return render_template('pages/artists.html',
+                           artists=await database.all(artist_list_statement()))
+
+
+@view('main.show_artist')
+@cache.cached_async('artist:{artist_id}')
+async def show_artist(artist_id):
+    return await _owner_page(Artist, artist_id, artist_shows_statement(artist_id),
+                             'pages/show_artist.html', 'artist')
+
+
+async def _ensure_fts(engine, table):
+    # search.py creates the FTS table under a threading lock, which would block
+    # the event loop while the holder waits on the database
+    if (engine.url, table) in _fts_ready:
+        return
+    async with _fts_lock:
+        if (engine.url, table) not in _fts_ready:
+            async with engine.begin() as connection:
+                await connection.run_sync(create_fts, table)
+            _fts_ready.add((engine.url, table))
+
+
+async def _search(model, template):
+    search_term = request.form.get('search_term', '')
+    term = search_term.strip()
+    page = max(request.form.get('page', 1, type=int), 1)
+    per_page = current_app.config['SEARCH_RESULTS_PER_PAGE']
+    engine = database.get_engine()
+    dialect = engine.dialect.name
+    if uses_fts(dialect, term):
+        await _ensure_fts(engine, model.__tablename__)
+    count, rows = search_statements(model, term, dialect, page, per_page)
+    count, rows = await asyncio.gather(database.scalar(count), database.all(rows))
+    return render_template(template, results=search_results(count, rows, page, per_page),
+                           search_term=search_term)
+
+
+@view('main.search_venues')
+async def search_venues():
+    return await _search(Venue, 'pages/search_venues.html')
+
+
+@view('main.search_artists')
+async def search_artists():
+    return await _search(Artist, 'pages/search_artists.html')
+
+
+@view('main.shows')
+@cache.cached_async('shows')
+async def shows():
+    per_page = current_app.config['SHOWS_PER_PAGE']
+    try:
+        statement = shows_page_statement(request.args.get('cursor'), per_page)
+    except ValueError:
+        abort(400)
+    data, next_cursor = page_of_shows(await database.all(statement), per_page)
+    return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
+
+
+#  ASGI application
+#  ----------------------------------------------------------------
+
+def _environ(scope, body):
+    # the WSGI environ Flask builds its request from
+    script_name = scope.get('root_path', '').encode('utf8').decode('latin1')
+    path_info = scope['path'].encode('utf8').decode('latin1')
+    if path_info.startswith(script_name):
+        path_info = path_info[len(script_name):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path_info,
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/%s' % scope['http_version'],
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_LENGTH', 'CONTENT_TYPE') else 'HTTP_' + name
+        value = value.decode('latin1')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+async def _start(send, status, headers):
+    await send({
+        'type': 'http.response.start',
+        'status': int(str(status).split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in headers],
+    })
+
+
+class AsyncPages(object):
+    # the ASGI application: coroutines for the endpoints in VIEWS, the Flask
+    # app in a thread for the rest
+
+    def __init__(self, app):
+        if create_async_engine is None:
+            raise RuntimeError('async mode needs greenlet and an async database driver: '
+                               'pip install -r requirements.txt')
+        self.app = app
+        self.urls = app.url_map.bind('localhost')
+        self.threads = ThreadPoolExecutor(app.config['ASYNC_WSGI_THREADS'],
+                                          thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            environ = _environ(scope, await _read_body(receive))
+            page = self._match(environ)
+            if page is None:
+                await self._run_wsgi(environ, send)
+            else:
+                await self._run_page(page, environ, send)
+
+    def _match(self, environ):
+        # the coroutine for this request, or None to hand it to Flask
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'POST'):
+            return None
+        try:
+            endpoint, _ = self.urls.match(environ['PATH_INFO'], method)
+        except HTTPException:
+            return None
+        return VIEWS.get(endpoint)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                database.connect(self.app.config)
+                if self.app.config['DB_POOL_WARMUP']:
+                    await database.warm(self.app.config['DB_POOL_WARMUP'])
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await database.dispose()
+                self.threads.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _run_page(self, page, environ, send):
+        # what Flask.full_dispatch_request() does, awaiting the view
+        app = self.app
+        with app.request_context(environ):
+            try:
+                try:
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await page(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                response = app.handle_exception(e)
+            await _start(send, response.status_code, response.headers.items())
+            await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def _run_wsgi(self, environ, send):
+        # the Flask app in a thread; streamed responses such as exports are
+        # read from the thread a chunk at a time. Every step runs in the same
+        # context, whichever thread takes it, since a streaming view keeps
+        # Flask's context variables set between chunks.
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+
+        def call(func, *args):
+            return loop.run_in_executor(self.threads, context.run, func, *args)
+
+        body, status, headers = await call(run_wsgi_app, self.app, environ)
+        await _start(send, status, headers.items())
+        chunks = iter(body)
+        try:
+            while True:
+                chunk = await call(next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(body, 'close'):
+                await call(body.close)
@@ -0,0 +1,24 @@
+import hmac
+from flask import current_app, request
+
+#----------------------------------------------------------------------------#
+# Token checks.
+#----------------------------------------------------------------------------#
+
+# /export (EXPORT_TOKEN) and the admin endpoints (ADMIN_TOKEN: deleting a
+# venue or artist, /cache/stats) take 'Authorization: Bearer <token>'. An
+# endpoint whose token is unset refuses everyone, except that the admin
+# endpoints stay open under DEBUG so the Delete buttons work locally.
+
+
+def bearer_authorized(setting):
+    # whether the request carries the token configured in setting
+    token = current_app.config.get(setting)
+    if not token:
+        return False
+    supplied = request.headers.get('Authorization', '')
+    return hmac.compare_digest(supplied.encode('utf-8'), ('Bearer ' + token).encode('utf-8'))
+
+
+def admin_authorized():
+    return current_app.debug or bearer_authorized('ADMIN_TOKEN')
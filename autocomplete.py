@@ -0,0 +1,256 @@
+import re
+import sys
+import time
+import threading
+from array import array
+from flask import current_app
+from models import db, Venue, Artist
+from queries import active
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+# GET /autocomplete?q= suggests venue and artist names as the user types in
+# the navbar search boxes. It answers from a sorted array kept in each
+# worker's memory and never reads the database: every name is filed under
+# its lowercased words and under each run of words that ends it ('the
+# musical hop', 'musical hop', 'hop'), so a query matches the start of any
+# word, and a lookup is one binary search followed by a short scan. The runs
+# aren't copied: an entry is a row id and the offset its run starts at.
+#
+# wsgi.py and asgi.py build the index when a worker starts (elsewhere the
+# first lookup does). Create, edit and delete submissions update the worker
+# that handled them. Other workers, and the importer's rows, are picked up
+# once the index is older than AUTOCOMPLETE_MAX_AGE seconds: it is rebuilt
+# in a background thread while the old one keeps answering.
+#
+# Each worker's index stays within AUTOCOMPLETE_MEMORY_MB, half for venues
+# and half for artists, counted with sys.getsizeof. A catalog too large for
+# that is indexed by whole names only, and past that the names of the rows
+# with the fewest upcoming shows are left out (with a warning in the log).
+
+MODELS = {'venues': Venue, 'artists': Artist}
+
+# most word runs filed per name
+MAX_KEYS = 8
+# rough cost of a row in names{} and texts{}, beyond the strings themselves
+NAME_OVERHEAD = 120
+# an entry's slot in ids[] and offsets[]
+SLOT_SIZE = 12
+
+
+SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    # lowercased words separated by single spaces
+    return ' '.join(SEPARATORS.sub(' ', (text or '').casefold()).split())
+
+
+class PrefixIndex(object):
+    # a suffix array over the normalized names of one model: entry i is the
+    # run of words from offsets[i] to the end of the name of row ids[i], and
+    # entries are sorted by that run. Nothing but the two arrays grows with
+    # the number of words.
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.words = True
+        self.ids = array('q')
+        self.offsets = array('I')
+        self.names = {}
+        self.texts = {}
+        self.size = 0
+        self.skipped = 0
+
+    def _starts(self, text):
+        starts, start = [], 0
+        for word in text.split():
+            starts.append(start)
+            start += len(word) + 1
+        return starts[:MAX_KEYS] if self.words else starts[:1]
+
+    def _cost(self, name, text, starts):
+        return sys.getsizeof(name) + sys.getsizeof(text) + NAME_OVERHEAD + \
+            SLOT_SIZE * len(starts)
+
+    def _run(self, i, length=None):
+        start = self.offsets[i]
+        end = None if length is None else start + length
+        return self.texts[self.ids[i]][start:end]
+
+    def _find(self, text, length=None):
+        # the first entry whose run, cut to length, doesn't sort before text
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            if self._run(middle, length) < text:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def load(self, rows):
+        # fills the index from (id, name) rows, most important first; drops
+        # the word runs, then rows, to stay within the budget
+        rows = [(row_id, name, normalize(name)) for row_id, name in rows]
+        self.words = sum(self._cost(name, text, self._starts(text))
+                         for _, name, text in rows) <= self.budget
+        entries, self.names, self.texts, self.size, self.skipped = [], {}, {}, 0, 0
+        for row_id, name, text in rows:
+            starts = self._starts(text)
+            cost = self._cost(name, text, starts)
+            if self.size + cost > self.budget:
+                self.skipped += 1
+                continue
+            self.size += cost
+            self.names[row_id] = name
+            self.texts[row_id] = text
+            entries.extend((row_id, start) for start in starts)
+        entries.sort(key=lambda entry: self.texts[entry[0]][entry[1]:])
+        self.ids = array('q', (row_id for row_id, _ in entries))
+        self.offsets = array('I', (start for _, start in entries))
+
+    def add(self, row_id, name):
+        # False if it would go over the budget
+        self.remove(row_id)
+        text = normalize(name)
+        starts = self._starts(text)
+        cost = self._cost(name, text, starts)
+        if self.size + cost > self.budget:
+            return False
+        self.size += cost
+        self.names[row_id] = name
+        self.texts[row_id] = text
+        for start in starts:
+            i = self._find(text[start:])
+            self.ids.insert(i, row_id)
+            self.offsets.insert(i, start)
+        return True
+
+    def remove(self, row_id):
+        text = self.texts.get(row_id)
+        if text is None:
+            return
+        starts = self._starts(text)
+        for start in starts:
+            i = self._find(text[start:])
+            while i < len(self.ids) and self._run(i) == text[start:]:
+                if self.ids[i] == row_id and self.offsets[i] == start:
+                    del self.ids[i]
+                    del self.offsets[i]
+                    break
+                i += 1
+        self.size -= self._cost(self.names.pop(row_id), self.texts.pop(row_id), starts)
+
+    def search(self, prefix, limit):
+        # up to limit {"id", "name"} with a run starting with prefix, in
+        # the order of the runs
+        found = []
+        i = self._find(prefix, len(prefix))
+        while len(found) < limit and i < len(self.ids) and \
+                self._run(i, len(prefix)) == prefix:
+            row_id = self.ids[i]
+            if row_id not in found:
+                found.append(row_id)
+            i += 1
+        return [{"id": row_id, "name": self.names[row_id]} for row_id in found]
+
+
+class Autocomplete(object):
+
+    def __init__(self, app=None):
+        self.indexes = None
+        self.built_at = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['autocomplete'] = self
+
+    def _build(self):
+        budget = current_app.config['AUTOCOMPLETE_MEMORY_MB'] * 1024 * 1024 // len(MODELS)
+        indexes = {}
+        for name, model in MODELS.items():
+            index = PrefixIndex(budget)
+            index.load(db.session.query(model.id, model.name).filter(active(model)).
+                       order_by(model.upcoming_shows_count.desc(), model.id))
+            if index.skipped:
+                current_app.logger.warning('autocomplete: left out %d %s to stay within '
+                                           'AUTOCOMPLETE_MEMORY_MB', index.skipped, name)
+            elif not index.words:
+                current_app.logger.warning('autocomplete: indexing whole %s names only to stay '
+                                           'within AUTOCOMPLETE_MEMORY_MB', name[:-1])
+            indexes[name] = index
+        return indexes
+
+    def load(self, app=None):
+        # builds the index now; wsgi.py and asgi.py call this at startup
+        if app is not None:
+            with app.app_context():
+                return self.load()
+        indexes = self._build()
+        with self._lock:
+            self.indexes = indexes
+            self.built_at = time.monotonic()
+
+    def _refresh(self, app):
+        with app.app_context():
+            try:
+                self.load()
+            except Exception:
+                current_app.logger.exception('autocomplete: rebuilding the index failed')
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._refreshing = False
+
+    def _check_age(self):
+        max_age = current_app.config['AUTOCOMPLETE_MAX_AGE']
+        with self._lock:
+            if self._refreshing or not max_age or \
+                    time.monotonic() - self.built_at < max_age:
+                return
+            self._refreshing = True
+        thread = threading.Thread(target=self._refresh, name='autocomplete', daemon=True,
+                                  args=(current_app._get_current_object(),))
+        thread.start()
+
+    def lookup(self, term, limit):
+        # {"venues": [...], "artists": [...]}, each a list of {"id", "name"}
+        if self.indexes is None:
+            self.load()
+        else:
+            self._check_age()
+        prefix = normalize(term)
+        with self._lock:
+            return {name: index.search(prefix, limit) if prefix else []
+                    for name, index in self.indexes.items()}
+
+    def _index(self, model):
+        for name, indexed in MODELS.items():
+            if indexed is model:
+                return self.indexes[name]
+
+    def add(self, model, row_id, name):
+        # called after a create or edit commits
+        if self.indexes is None:
+            return
+        with self._lock:
+            added = self._index(model).add(row_id, name)
+        if not added:
+            current_app.logger.warning('autocomplete: no room for %s %s within '
+                                       'AUTOCOMPLETE_MEMORY_MB', model.__name__, row_id)
+
+    def remove(self, model, row_id):
+        # called after a delete or archive commits
+        if self.indexes is None:
+            return
+        with self._lock:
+            self._index(model).remove(row_id)
+
+
+autocomplete = Autocomplete()
@@ -0,0 +1,188 @@
+"""Requests/s of the async pages under ASGI against the same pages under WSGI.
+
+Generates a catalog with benchmarks/datagen.py, then serves it twice with
+the same number of worker processes: with gunicorn's sync workers
+(wsgi.py) and with uvicorn (asgi.py, see async_views.py). Every statement
+sleeps for --latency milliseconds first, standing in for a database across
+the network, and --concurrency clients request each page the async mode
+answers itself. Prints requests/s and p50/p99 per page in both modes and
+optionally writes them as JSON.
+
+    python benchmarks/async_mode.py --scale small --workers 2 --latency 20
+    python benchmarks/async_mode.py --database postgresql://localhost/fyyur_bench \\
+        --workers 4 --concurrency 64 --output async.json
+
+Needs gunicorn, uvicorn and the async packages from requirements.txt. The
+target database is dropped and recreated; never point it at real data.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datagen
+import routes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes per server')
+    parser.add_argument('--concurrency', type=int, default=32, help='HTTP clients')
+    parser.add_argument('--requests', type=int, default=200, help='requests per page and mode')
+    parser.add_argument('--latency', type=float, default=20,
+                        help='milliseconds added to every SQL statement')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    return parser.parse_args()
+
+
+#  Servers
+#  ----------------------------------------------------------------
+#  gunicorn and uvicorn build the app in each worker with these factories,
+#  which read the database and latency from the environment.
+
+def _latency():
+    return float(os.environ['BENCH_LATENCY_MS']) / 1000
+
+
+def sync_app():
+    from sqlalchemy import event
+    from models import db
+    app = datagen.make_app(os.environ['BENCH_DATABASE'])
+    latency = _latency()
+
+    def sleep(*args):
+        time.sleep(latency)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', sleep)
+    return app
+
+
+def async_app():
+    from async_views import AsyncPages, database
+    latency = _latency()
+
+    def delayed(query):
+        async def wrapper(statement):
+            await asyncio.sleep(latency)
+            return await query(statement)
+        return wrapper
+
+    for name in ('all', 'scalar', 'first'):
+        setattr(database, name, delayed(getattr(database, name)))
+    # the pages it hands to Flask sleep in the sync engine, as under WSGI
+    return AsyncPages(sync_app())
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(mode, args, port):
+    env = dict(os.environ, BENCH_DATABASE=args.database, BENCH_LATENCY_MS=str(args.latency),
+               PYTHONPATH=ROOT)
+    bind = '127.0.0.1:%d' % port
+    if mode == 'wsgi':
+        command = ['gunicorn', '--workers', str(args.workers), '--bind', bind,
+                   '--pythonpath', os.path.dirname(os.path.abspath(__file__)),
+                   '--log-level', 'warning', 'async_mode:sync_app()']
+    else:
+        command = ['uvicorn', '--workers', str(args.workers), '--port', str(port),
+                   '--app-dir', os.path.dirname(os.path.abspath(__file__)),
+                   '--log-level', 'warning', '--factory', 'async_mode:async_app']
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen('http://%s/' % bind, timeout=1).read()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('%s server did not start' % mode)
+
+
+#  Load
+#  ----------------------------------------------------------------
+
+def run(base_url, endpoints, size, args):
+    results = {}
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for endpoint in endpoints:
+            method, build = routes.ROUTES[endpoint]
+            rng = random.Random(args.seed)
+            requests = [build(rng, size) for _ in range(args.requests)]
+            # one request first, so start-up work isn't timed
+            routes._http_request(base_url, method, *requests[0])
+            started = time.perf_counter()
+            done = list(pool.map(lambda item: routes._http_request(base_url, method, *item),
+                                 requests))
+            elapsed = time.perf_counter() - started
+            results[endpoint] = routes.summarize(
+                [ms for ms, _ in done], sum(1 for _, status in done if status >= 500), elapsed)
+    return results
+
+
+def main():
+    args = parse_args()
+    size = datagen.sizes(args)
+    from async_views import VIEWS
+    endpoints = sorted(VIEWS)
+    started = time.time()
+    app = datagen.make_app(args.database)
+    counts = datagen.rebuild(app, size, seed=args.seed)
+    with app.app_context():
+        # the workers of a server would race each other to create them
+        from models import db
+        import search
+        if db.engine.dialect.name == 'sqlite':
+            for table in ('Venue', 'Artist'):
+                search._ensure_fts(db.engine, table)
+    print('seeded %s in %.1fs' % (', '.join('%d %s' % (count, name)
+                                            for name, count in counts.items()),
+                                  time.time() - started))
+
+    results = {}
+    for mode in ('wsgi', 'asgi'):
+        port = _free_port()
+        server = start(mode, args, port)
+        try:
+            results[mode] = run('http://127.0.0.1:%d' % port, endpoints, size, args)
+        finally:
+            server.terminate()
+            server.wait()
+
+    print('\n%d workers, %d clients, %gms per statement' % (
+        args.workers, args.concurrency, args.latency))
+    print('%-22s %10s %10s %8s %10s %10s %7s' % ('page', 'wsgi req/s', 'asgi req/s', 'ratio',
+                                                'wsgi p99', 'asgi p99', 'errors'))
+    for endpoint in endpoints:
+        wsgi, asgi = results['wsgi'][endpoint], results['asgi'][endpoint]
+        print('%-22s %10s %10s %7.1fx %8.0fms %8.0fms %7d' % (
+            endpoint, wsgi['throughput_rps'], asgi['throughput_rps'],
+            asgi['throughput_rps'] / wsgi['throughput_rps'], wsgi['p99_ms'], asgi['p99_ms'],
+            wsgi['errors'] + asgi['errors']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'database': args.database.split('@')[-1], 'sizes': counts,
+                       'workers': args.workers, 'concurrency': args.concurrency,
+                       'latency_ms': args.latency, 'requests': args.requests,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
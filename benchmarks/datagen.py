@@ -0,0 +1,179 @@
+"""Deterministic sample catalog for the benchmarks.
+
+Fills a database with genres, venues, artists and shows. The same seed and
+anchor always produce the same rows; show start times are spread from five
+years before the anchor to one year after it, so detail pages have both past
+and upcoming shows. Ids are assigned explicitly, from 1.
+
+    python benchmarks/datagen.py --database sqlite:///bench.db --scale medium
+    python benchmarks/datagen.py --shows 250000 --seed 7
+
+The target database is dropped and recreated; never point it at real data.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (venues, artists, shows)
+SCALES = {
+    'small': (50, 200, 2000),
+    'medium': (500, 2000, 50000),
+    'large': (2000, 10000, 1000000),
+}
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN'),
+          ('New Orleans', 'LA'), ('Denver', 'CO'), ('Portland', 'OR'), ('Boston', 'MA')]
+
+WORDS = ['Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Crystal', 'Silver',
+         'Wild', 'Neon', 'Hollow', 'Dusty', 'Lucky', 'Royal', 'Paper', 'Iron']
+
+BATCH_SIZE = 10000
+
+
+def add_arguments(parser):
+    parser.add_argument('--database', default='sqlite:///' + os.path.abspath('bench.db'))
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--venues', type=int, help='overrides --scale')
+    parser.add_argument('--artists', type=int, help='overrides --scale')
+    parser.add_argument('--shows', type=int, help='overrides --scale')
+    parser.add_argument('--seed', type=int, default=42)
+
+
+def sizes(args):
+    venues, artists, shows = SCALES[args.scale]
+    return {"venues": args.venues or venues, "artists": args.artists or artists,
+            "shows": args.shows or shows}
+
+
+def default_anchor():
+    # midnight today: stable within a day, and keeps shows on both sides of now
+    return datetime.combine(datetime.now().date(), datetime.min.time())
+
+
+def genre_names():
+    from forms import VenueForm
+    return [value for value, _ in VenueForm.genres.kwargs['choices']]
+
+
+def _name(rng, suffix):
+    return '%s %s %s' % (rng.choice(WORDS), rng.choice(WORDS), suffix)
+
+
+def _insert(db, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(table.insert(), batch)
+
+
+def generate(db, venues, artists, shows, seed=42, anchor=None):
+    # call inside an app context on empty tables; commits when done
+    from models import Venue, Artist, Show, Genre, venue_genres, artist_genres
+    from counters import recount
+    from geo import locate, encode
+    rng = random.Random(seed)
+    anchor = anchor or default_anchor()
+    genres = genre_names()
+
+    _insert(db, Genre.__table__, [dict(id=i, name=name) for i, name in enumerate(genres, 1)])
+
+    def people(count, suffix, seeking):
+        for i in range(1, count + 1):
+            city, state = rng.choice(CITIES)
+            yield {
+                "id": i, "name": _name(rng, suffix), "city": city, "state": state,
+                "phone": '555-%03d-%04d' % (rng.randint(100, 999), rng.randint(0, 9999)),
+                "image_link": 'https://picsum.photos/seed/%s%d/300/300' % (suffix.lower(), i),
+                "facebook_link": 'https://www.facebook.com/%s%d' % (suffix.lower(), i),
+                "website_link": 'https://example.com/%s/%d' % (suffix.lower(), i),
+                seeking: rng.random() < 0.3,
+                "seeking_description": 'Looking for something new',
+                "updated_at": anchor,
+            }
+
+    venue_rows = list(people(venues, 'Hall', 'seeking_talent'))
+    # spread each city's venues over ~10 miles around it; separate generator
+    # so the rest of the data stays the same for a given seed
+    spread = random.Random(seed + 1)
+    for row in venue_rows:
+        row['address'] = '%d %s Street' % (rng.randint(1, 9999), rng.choice(WORDS))
+        latitude, longitude = locate(row['city'], row['state'])
+        row['latitude'] = latitude + spread.uniform(-0.15, 0.15)
+        row['longitude'] = longitude + spread.uniform(-0.15, 0.15)
+        row['geohash'] = encode(row['latitude'], row['longitude'])
+    _insert(db, Venue.__table__, venue_rows)
+    _insert(db, Artist.__table__, people(artists, 'Band', 'seeking_venue'))
+
+    def links(count, key):
+        for i in range(1, count + 1):
+            for genre_id in rng.sample(range(1, len(genres) + 1), rng.randint(1, 3)):
+                yield {key: i, "genre_id": genre_id}
+
+    _insert(db, venue_genres, links(venues, 'venue_id'))
+    _insert(db, artist_genres, links(artists, 'artist_id'))
+
+    def show_rows():
+        for i in range(1, shows + 1):
+            start_time = anchor + timedelta(minutes=rng.randint(-5 * 525600, 525600))
+            yield {
+                "id": i,
+                "venue_id": rng.randint(1, venues),
+                "artist_id": rng.randint(1, artists),
+                "start_time": start_time,
+                "end_time": start_time + timedelta(hours=2),
+                "updated_at": anchor,
+            }
+
+    _insert(db, Show.__table__, show_rows())
+    if db.engine.dialect.name == 'postgresql':
+        # ids were given explicitly, so move the sequences past them
+        for model in (Genre, Venue, Artist, Show):
+            db.session.execute(db.text(
+                "SELECT setval(pg_get_serial_sequence('\"%s\"', 'id'), "
+                "coalesce(max(id), 1)) FROM \"%s\"" % (model.__tablename__, model.__tablename__)))
+    db.session.commit()
+    recount()
+    return {"genres": len(genres), "venues": venues, "artists": artists, "shows": shows}
+
+
+def make_app(database, **config):
+    from app import create_app
+    settings = {'SQLALCHEMY_DATABASE_URI': database, 'CACHE_TYPE': 'null',
+                'REQUEST_LOG': False, 'SLOW_QUERY_MS': 0, 'WTF_CSRF_ENABLED': False}
+    settings.update(config)
+    return create_app(settings)
+
+
+def rebuild(app, size, seed=42, anchor=None):
+    # drop and recreate the schema, then fill it; returns the row counts
+    from models import db
+    with app.app_context():
+        # drops and recreates search.py's FTS tables too
+        db.drop_all()
+        db.create_all()
+        return generate(db, seed=seed, anchor=anchor, **size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args()
+    started = time.time()
+    counts = rebuild(make_app(args.database), sizes(args), seed=args.seed)
+    print('generated %s in %.1fs' % (
+        ', '.join('%d %s' % (count, name) for name, count in counts.items()),
+        time.time() - started))
+
+
+if __name__ == '__main__':
+    main()
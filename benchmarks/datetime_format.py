@@ -0,0 +1,66 @@
+"""Micro-benchmark of the show time formatter.
+
+Formats the start times of a 5,000-show page the way the templates used to
+(str() -> dateutil parse -> babel.dates.format_datetime) and through
+formatting.format_datetime, cold (empty LRU) and warm (repeat render).
+
+    python benchmarks/datetime_format.py --shows 5000 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from flask import Flask
+import formatting
+
+
+def legacy_format(value, format='full'):
+    date = dateutil.parser.parse(str(value))
+    return babel.dates.format_datetime(date, formatting.FORMATS[format], locale='en')
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start = datetime(2026, 1, 1, 20, 0)
+    values = [start + timedelta(hours=7 * i) for i in range(args.shows)]
+    app = Flask(__name__)
+
+    with app.test_request_context(headers={'Accept-Language': 'en'}):
+        legacy = best_of(args.repeat, lambda: [legacy_format(value) for value in values])
+
+        def cold():
+            formatting._format.cache_clear()
+            [formatting.format_datetime(value, 'full') for value in values]
+        new_cold = best_of(args.repeat, cold)
+        new_warm = best_of(args.repeat, lambda: [formatting.format_datetime(value, 'full')
+                                                 for value in values])
+        assert [legacy_format(v) for v in values] == \
+            [formatting.format_datetime(v, 'full') for v in values]
+
+    print('%d show times, best of %d' % (args.shows, args.repeat))
+    print('%-28s %9.2fms' % ('dateutil + babel (before)', legacy))
+    print('%-28s %9.2fms  %5.1fx' % ('format_datetime, cold LRU', new_cold, legacy / new_cold))
+    print('%-28s %9.2fms  %5.1fx' % ('format_datetime, warm LRU', new_warm, legacy / new_warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Latency of the nearby-venues search with and without the geohash index.
+
+Seeds a dedicated database with (by default) 100,000 venues scattered around
+the cities in the gazetteer, then for each radius runs the same queries
+twice: through geo.nearby_venues(), which only reads the geohash cells
+around the point, and as a full scan that computes the distance to every
+venue. Checks that both return the same venues, prints p50/p99 per radius
+and the p50/p99 of /venues/nearby through the Flask test client, and
+optionally writes them as JSON.
+
+    python benchmarks/nearby.py --database sqlite:///bench.db
+    python benchmarks/nearby.py --database postgresql://localhost/fyyur_bench \
+        --venues 100000 --output nearby.json
+
+The target database is dropped and recreated; never point it at real data.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RADII = (5, 20, 50)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='sqlite:///' + os.path.abspath('bench.db'))
+    parser.add_argument('--venues', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=100,
+                        help='queries per radius and method')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    return parser.parse_args()
+
+
+def make_app(database):
+    from app import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': database, 'CACHE_TYPE': 'null',
+                       'REQUEST_LOG': False, 'SLOW_QUERY_MS': 0})
+
+
+def seed(db, Venue, args, rng):
+    from geo import gazetteer, encode
+    cities = sorted(gazetteer().items())
+    now = datetime.now()
+    batch = []
+    for i in range(args.venues):
+        (city, state), (latitude, longitude) = rng.choice(cities)
+        # most venues near the centre, a few out in the suburbs
+        latitude += rng.gauss(0, 0.2)
+        longitude += rng.gauss(0, 0.2)
+        batch.append(dict(name='Venue %d' % i, city=city.title(), state=state,
+                          phone='555-0100', latitude=latitude, longitude=longitude,
+                          geohash=encode(latitude, longitude), updated_at=now))
+        if len(batch) == 10000:
+            db.session.execute(Venue.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Venue.__table__.insert(), batch)
+    db.session.commit()
+    return [position for _, position in cities]
+
+
+def full_scan(db, Venue, latitude, longitude, radius, limit=20):
+    from geo import distance
+    found = []
+    for row in db.session.query(Venue.id, Venue.latitude, Venue.longitude). \
+            filter(Venue.latitude.isnot(None)):
+        miles = distance(latitude, longitude, row.latitude, row.longitude)
+        if miles <= radius:
+            found.append((round(miles, 2), row.id))
+    found.sort()
+    return [venue_id for _, venue_id in found[:limit]]
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+
+def summarize(samples):
+    return {'p50_ms': round(percentile(samples, 50), 3),
+            'p99_ms': round(percentile(samples, 99), 3)}
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    app = make_app(args.database)
+    from models import db, Venue
+    from geo import nearby_venues
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.time()
+        centres = seed(db, Venue, args, rng)
+        print('seeded %d venues in %.1fs' % (args.venues, time.time() - started))
+
+        results = {}
+        for radius in RADII:
+            points = [(lat + rng.gauss(0, 0.1), lng + rng.gauss(0, 0.1))
+                      for lat, lng in (rng.choice(centres) for _ in range(args.requests))]
+            indexed, scanned = [], []
+            for latitude, longitude in points:
+                started = time.perf_counter()
+                found = nearby_venues(latitude, longitude, radius)
+                indexed.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                expected = full_scan(db, Venue, latitude, longitude, radius)
+                scanned.append((time.perf_counter() - started) * 1000)
+                assert [venue["id"] for venue in found] == expected, (latitude, longitude, radius)
+            results['%d miles' % radius] = {'geohash': summarize(indexed),
+                                            'full scan': summarize(scanned)}
+
+    client = app.test_client()
+    samples = []
+    for _ in range(args.requests):
+        latitude, longitude = rng.choice(centres)
+        started = time.perf_counter()
+        response = client.get('/venues/nearby?lat=%f&lng=%f&radius=20' % (latitude, longitude))
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+    results['/venues/nearby'] = {'geohash': summarize(samples)}
+
+    print('%-16s %12s %12s %12s %12s' % ('query', 'p50 geohash', 'p50 scan',
+                                          'p99 geohash', 'p99 scan'))
+    for name, timings in results.items():
+        scan = timings.get('full scan', {'p50_ms': float('nan'), 'p99_ms': float('nan')})
+        print('%-16s %10.2fms %10.2fms %10.2fms %10.2fms' % (
+            name, timings['geohash']['p50_ms'], scan['p50_ms'],
+            timings['geohash']['p99_ms'], scan['p99_ms']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'database': args.database.split('@')[-1], 'venues': args.venues,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
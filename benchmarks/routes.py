@@ -0,0 +1,328 @@
+"""Throughput and latency of every route, in process and over HTTP.
+
+Generates a catalog with benchmarks/datagen.py, then drives each route of the
+app (pages, forms, search, the JSON API and exports) first through the Flask
+test client and then over HTTP against a local threaded server with
+--concurrency clients. Reports requests/s and p50/p90/p99 per route and
+writes them as JSON; --baseline compares against an earlier run.
+
+    python benchmarks/routes.py --scale small --output routes.json
+    python benchmarks/routes.py --scale medium --mode http --concurrency 16 \
+        --baseline routes.json --output routes-new.json
+
+Runs on SQLite by default, so nothing but Python is needed. The target
+database is dropped and recreated; never point it at real data.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datagen
+
+# configured as both the export and the admin token (auth.py)
+TOKEN = 'benchmark'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument('--requests', type=int, default=100, help='requests per route and mode')
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=8, help='HTTP clients')
+    parser.add_argument('--cache', default='null',
+                        help="CACHE_TYPE for the run; 'null' measures uncached work")
+    parser.add_argument('--skip-writes', action='store_true',
+                        help='leave out the create, edit and delete routes')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against an earlier --output file')
+    parser.add_argument('--check', action='store_true',
+                        help='exit with status 1 if any route answered with a 5xx')
+    return parser.parse_args()
+
+
+#  Requests per route
+#  ----------------------------------------------------------------
+#  Each entry builds (path, body) for one request to an endpoint; the body is
+#  a dict of form fields or a JSON string.
+
+def _venue_form(rng, size):
+    city, state = rng.choice(datagen.CITIES)
+    return {'name': 'Bench Venue %d' % rng.randint(1, 10 ** 9), 'city': city, 'state': state,
+            'address': '1 Bench Street', 'phone': '555-555-5555',
+            'genres': rng.sample(datagen.genre_names(), 2),
+            'image_link': 'https://example.com/v.png', 'facebook_link': 'https://www.facebook.com/v',
+            'website_link': 'https://example.com', 'seeking_description': ''}
+
+
+def _artist_form(rng, size):
+    data = _venue_form(rng, size)
+    data['name'] = 'Bench Artist %d' % rng.randint(1, 10 ** 9)
+    del data['address']
+    return data
+
+
+def _show_form(rng, size):
+    return {'artist_id': str(rng.randint(1, size['artists'])),
+            'venue_id': str(rng.randint(1, size['venues'])),
+            'start_time': '2030-01-%02d %02d:00:00' % (rng.randint(1, 28), rng.randint(0, 21)),
+            'duration': '90'}
+
+
+def _lineup(rng, size):
+    shows = [_show_form(rng, size) for _ in range(50)]
+    return json.dumps({'shows': [
+        dict(venue_id=int(show['venue_id']), artist_id=int(show['artist_id']),
+             start_time=show['start_time'].replace(' ', 'T'), duration=int(show['duration']))
+        for show in shows]})
+
+
+def _near(rng):
+    city, state = rng.choice(datagen.CITIES)
+    return urllib.parse.urlencode({'city': city, 'state': state,
+                                   'radius': rng.choice([5, 20, 50])})
+
+
+def _search(rng, size):
+    return {'search_term': rng.choice(datagen.WORDS)[:rng.randint(2, 5)]}
+
+
+def _venue(rng, size):
+    return rng.randint(1, size['venues'])
+
+
+def _artist(rng, size):
+    return rng.randint(1, size['artists'])
+
+
+ROUTES = {
+    'main.index': ('GET', lambda rng, size: ('/', None)),
+    'main.venues': ('GET', lambda rng, size: ('/venues', None)),
+    'main.search_venues': ('POST', lambda rng, size: ('/venues/search', _search(rng, size))),
+    'main.venues_nearby': ('GET', lambda rng, size: ('/venues/nearby?%s' % _near(rng), None)),
+    'main.autocomplete_names': ('GET', lambda rng, size: (
+        '/autocomplete?q=%s' % rng.choice(datagen.WORDS)[:rng.randint(1, 4)], None)),
+    'main.show_venue': ('GET', lambda rng, size: ('/venues/%d' % _venue(rng, size), None)),
+    'main.create_venue_form': ('GET', lambda rng, size: ('/venues/create', None)),
+    'main.create_venue_submission': ('POST', lambda rng, size: ('/venues/create',
+                                                                _venue_form(rng, size))),
+    'main.delete_venue': ('DELETE', lambda rng, size: ('/venues/%d' % _venue(rng, size), None)),
+    'main.artists': ('GET', lambda rng, size: ('/artists', None)),
+    'main.search_artists': ('POST', lambda rng, size: ('/artists/search', _search(rng, size))),
+    'main.show_artist': ('GET', lambda rng, size: ('/artists/%d' % _artist(rng, size), None)),
+    'main.delete_artist': ('DELETE', lambda rng, size: ('/artists/%d' % _artist(rng, size),
+                                                        None)),
+    'main.edit_artist': ('GET', lambda rng, size: ('/artists/%d/edit' % _artist(rng, size), None)),
+    'main.edit_artist_submission': ('POST', lambda rng, size: (
+        '/artists/%d/edit' % _artist(rng, size), _artist_form(rng, size))),
+    'main.edit_venue': ('GET', lambda rng, size: ('/venues/%d/edit' % _venue(rng, size), None)),
+    'main.edit_venue_submission': ('POST', lambda rng, size: (
+        '/venues/%d/edit' % _venue(rng, size), _venue_form(rng, size))),
+    'main.create_artist_form': ('GET', lambda rng, size: ('/artists/create', None)),
+    'main.create_artist_submission': ('POST', lambda rng, size: ('/artists/create',
+                                                                 _artist_form(rng, size))),
+    'main.show_genre': ('GET', lambda rng, size: (
+        '/genres/%s' % urllib.parse.quote(rng.choice(datagen.genre_names())), None)),
+    'main.shows': ('GET', lambda rng, size: ('/shows', None)),
+    'main.create_shows': ('GET', lambda rng, size: ('/shows/create', None)),
+    'main.create_show_submission': ('POST', lambda rng, size: ('/shows/create',
+                                                               _show_form(rng, size))),
+    'main.cache_stats': ('GET', lambda rng, size: ('/cache/stats', None)),
+    'metrics': ('GET', lambda rng, size: ('/metrics', None)),
+    'api.venues': ('GET', lambda rng, size: ('/api/v1/venues', None)),
+    'api.venues_nearby': ('GET', lambda rng, size: ('/api/v1/venues/nearby?%s' % _near(rng),
+                                                    None)),
+    'api.venue': ('GET', lambda rng, size: ('/api/v1/venues/%d' % _venue(rng, size), None)),
+    'api.artists': ('GET', lambda rng, size: ('/api/v1/artists?page=%d' % rng.randint(1, 5),
+                                              None)),
+    'api.artist': ('GET', lambda rng, size: ('/api/v1/artists/%d' % _artist(rng, size), None)),
+    'api.shows': ('GET', lambda rng, size: ('/api/v1/shows', None)),
+    'api.check_shows': ('POST', lambda rng, size: ('/api/v1/shows/check', _lineup(rng, size))),
+    'export.export_entity': ('GET', lambda rng, size: ('/export/venues.ndjson', None)),
+}
+
+WRITES = ('main.create_venue_submission', 'main.delete_venue', 'main.delete_artist',
+          'main.edit_artist_submission', 'main.edit_venue_submission',
+          'main.create_artist_submission', 'main.create_show_submission')
+
+HEADERS = {'Authorization': 'Bearer ' + TOKEN}
+JSON = 'application/json'
+
+
+def check_coverage(app):
+    # every endpoint should have an entry above; report the ones that don't
+    # files served from disk are left out
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - \
+        {'static', 'images.thumbnail', 'assets.bundle_file'}
+    missing = sorted(endpoints - set(ROUTES))
+    for endpoint in missing:
+        print('warning: no benchmark request for %s' % endpoint, file=sys.stderr)
+    return missing
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+
+def summarize(samples, errors, elapsed):
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p90_ms': round(percentile(samples, 90), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+#  Drivers
+#  ----------------------------------------------------------------
+
+def run_client(app, endpoints, size, args):
+    client = app.test_client()
+    results = {}
+    for endpoint in endpoints:
+        method, build = ROUTES[endpoint]
+        rng = random.Random(args.seed)
+        samples, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            path, data = build(rng, size)
+            sent = time.perf_counter()
+            response = client.open(path, method=method, data=data, headers=HEADERS,
+                                   content_type=JSON if isinstance(data, str) else None)
+            response.get_data()
+            samples.append((time.perf_counter() - sent) * 1000)
+            if response.status_code >= 500:
+                errors += 1
+        results[endpoint] = summarize(samples, errors, time.perf_counter() - started)
+    return results
+
+
+def _http_request(base_url, method, path, data):
+    headers = dict(HEADERS)
+    if isinstance(data, str):
+        body = data.encode('utf-8')
+        headers['Content-Type'] = JSON
+    else:
+        body = urllib.parse.urlencode(data, doseq=True).encode('ascii') if data else None
+    request = urllib.request.Request(base_url + path, data=body, method=method, headers=headers)
+    sent = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, ConnectionError):
+        status = 599
+    return (time.perf_counter() - sent) * 1000, status
+
+
+def run_http(app, endpoints, size, args):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = 'http://127.0.0.1:%d' % server.server_port
+    results = {}
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            for endpoint in endpoints:
+                method, build = ROUTES[endpoint]
+                rng = random.Random(args.seed)
+                requests = [build(rng, size) for _ in range(args.requests)]
+                started = time.perf_counter()
+                done = list(pool.map(lambda item: _http_request(base_url, method, *item),
+                                     requests))
+                elapsed = time.perf_counter() - started
+                results[endpoint] = summarize([ms for ms, _ in done],
+                                              sum(1 for _, status in done if status >= 500),
+                                              elapsed)
+    finally:
+        server.shutdown()
+    return results
+
+
+#  Report
+#  ----------------------------------------------------------------
+
+def print_results(mode, results, baseline=None):
+    print('\n%s' % mode)
+    print('%-32s %10s %10s %10s %10s %7s' % ('route', 'req/s', 'p50', 'p90', 'p99', 'errors'))
+    for endpoint, stats in results.items():
+        line = '%-32s %10s %8.2fms %8.2fms %8.2fms %7d' % (
+            endpoint, stats['throughput_rps'], stats['p50_ms'], stats['p90_ms'],
+            stats['p99_ms'], stats['errors'])
+        before = (baseline or {}).get(endpoint)
+        if before and before['p50_ms']:
+            line += '   p50 %+.0f%%' % ((stats['p50_ms'] / before['p50_ms'] - 1) * 100)
+        print(line)
+
+
+def main():
+    args = parse_args()
+    size = datagen.sizes(args)
+    app = datagen.make_app(args.database, CACHE_TYPE=args.cache, EXPORT_TOKEN=TOKEN,
+                           ADMIN_TOKEN=TOKEN)
+    missing = check_coverage(app)
+    # reads first, so the timed pages see the generated catalog unchanged
+    endpoints = [endpoint for endpoint in ROUTES if endpoint not in WRITES]
+    if not args.skip_writes:
+        endpoints += list(WRITES)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    modes = []
+    if args.mode in ('client', 'both'):
+        modes.append(('client', 'test client', run_client))
+    if args.mode in ('http', 'both'):
+        modes.append(('http', 'http, %d clients' % args.concurrency, run_http))
+    results = {}
+    for mode, title, run in modes:
+        # a fresh catalog per mode, since the write routes change it
+        started = time.time()
+        counts = datagen.rebuild(app, size, seed=args.seed)
+        print('seeded %s in %.1fs' % (', '.join('%d %s' % (count, name)
+                                                for name, count in counts.items()),
+                                      time.time() - started))
+        results[mode] = run(app, endpoints, size, args)
+        print_results(title, results[mode], baseline.get(mode))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'database': args.database.split('@')[-1],
+                'sizes': counts,
+                'seed': args.seed,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'cache': args.cache,
+                'python': platform.python_version(),
+                'uncovered': missing,
+                'results': results,
+            }, f, indent=2)
+    if args.check and any(stats['errors'] for mode in results.values()
+                          for stats in mode.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Latency of the show-heavy views with and without the lookup indexes.
+
+Seeds a dedicated database with venues, artists and (by default) one million
+shows, times each view through the Flask test client with the composite
+indexes from migration e4a9b3f07c15 dropped, creates them, and times the
+views again. Prints p50/p99 per view and optionally writes them as JSON.
+
+    python benchmarks/show_indexes.py --database sqlite:///bench.db
+    python benchmarks/show_indexes.py --database postgresql://localhost/fyyur_bench \
+        --shows 1000000 --output indexes.json
+
+The target database is dropped and recreated; never point it at real data.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_INDEXES = ('ix_show_venue_id_start_time', 'ix_show_artist_id_start_time',
+                 'ix_show_start_time_id', 'ix_venue_city_state')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', default='sqlite:///' + os.path.abspath('bench.db'))
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=200,
+                        help='requests per view and phase')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    return parser.parse_args()
+
+
+def make_app(database):
+    from app import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': database, 'CACHE_TYPE': 'null'})
+
+
+def seed(db, Venue, Artist, Show, args, rng):
+    cities = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+              ('Chicago', 'IL'), ('Seattle', 'WA'), ('Nashville', 'TN')]
+    now = datetime.now()
+    db.session.execute(Venue.__table__.insert(), [
+        dict(name='Venue %d' % i, city=cities[i % len(cities)][0],
+             state=cities[i % len(cities)][1], phone='555-0100', updated_at=now)
+        for i in range(args.venues)])
+    db.session.execute(Artist.__table__.insert(), [
+        dict(name='Artist %d' % i, city='Austin', state='TX', phone='555-0100', updated_at=now)
+        for i in range(args.artists)])
+    batch = []
+    for _ in range(args.shows):
+        start_time = now + timedelta(minutes=rng.randint(-5 * 525600, 525600))
+        batch.append(dict(venue_id=rng.randint(1, args.venues),
+                          artist_id=rng.randint(1, args.artists),
+                          start_time=start_time, end_time=start_time + timedelta(hours=2),
+                          updated_at=now))
+        if len(batch) == 10000:
+            db.session.execute(Show.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Show.__table__.insert(), batch)
+    db.session.commit()
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))]
+
+
+def time_views(client, args, rng):
+    views = {
+        '/venues': lambda: '/venues',
+        '/venues/<id>': lambda: '/venues/%d' % rng.randint(1, args.venues),
+        '/artists/<id>': lambda: '/artists/%d' % rng.randint(1, args.artists),
+        '/shows': lambda: '/shows',
+    }
+    results = {}
+    for name, url in views.items():
+        samples = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(url())
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (name, response.status_code)
+        results[name] = {'p50_ms': round(percentile(samples, 50), 3),
+                         'p99_ms': round(percentile(samples, 99), 3)}
+    return results
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    app = make_app(args.database)
+    from models import db, Venue, Artist, Show
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        indexes = [index for model in (Venue, Show) for index in model.__table__.indexes
+                   if index.name in BENCH_INDEXES]
+        for index in indexes:
+            index.drop(bind=db.engine)
+        started = time.time()
+        seed(db, Venue, Artist, Show, args, rng)
+        print('seeded %d venues, %d artists, %d shows in %.1fs' % (
+            args.venues, args.artists, args.shows, time.time() - started))
+
+    client = app.test_client()
+    before = time_views(client, args, random.Random(args.seed))
+
+    with app.app_context():
+        for index in indexes:
+            index.create(bind=db.engine)
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+    after = time_views(client, args, random.Random(args.seed))
+
+    print('%-16s %12s %12s %12s %12s' % ('view', 'p50 before', 'p50 after',
+                                          'p99 before', 'p99 after'))
+    for name in before:
+        print('%-16s %10.2fms %10.2fms %10.2fms %10.2fms' % (
+            name, before[name]['p50_ms'], after[name]['p50_ms'],
+            before[name]['p99_ms'], after[name]['p99_ms']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'database': args.database.split('@')[-1], 'venues': args.venues,
+                       'artists': args.artists, 'shows': args.shows,
+                       'before': before, 'after': after}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from uuid import uuid4
+from functools import wraps
+from collections import OrderedDict
+from flask import request, session, make_response
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+# Backends share one small interface: get(key) returns None on a miss,
+# set(key, value, timeout) with timeout=0 meaning "never expires".
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache(object):
+    # in-process cache for a single worker, bounded by max_entries
+
+    def __init__(self, max_entries=1000, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires_at(self, timeout):
+        timeout = self.default_timeout if timeout is None else timeout
+        return time.time() + timeout if timeout else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._entries[key] = (self._expires_at(timeout), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(object):
+    # shared cache for several workers on one host; one pickle file per key
+
+    def __init__(self, directory, max_entries=5000, default_timeout=300):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        expires_at = time.time() + timeout if timeout else None
+        self._prune()
+        # write to a temp file and rename so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires_at, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _prune(self):
+        names = [name for name in os.listdir(self.directory) if not name.startswith('.')]
+        if len(names) < self.max_entries:
+            return
+        # drop the least recently written half
+        paths = sorted((os.path.join(self.directory, name) for name in names),
+                       key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0)
+        for path in paths[:len(paths) // 2]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+# response headers kept alongside the cached body
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class ResponseCache(object):
+    # caches whole GET responses under the request path plus the current token
+    # of each tag the view depends on. invalidate(tag) drops the tag's token,
+    # so every cached response built against it stops matching at once.
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.vary_functions = []
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        max_entries = app.config.get('CACHE_MAX_ENTRIES', 1000)
+        if cache_type == 'lru':
+            self.backend = LRUCache(max_entries=max_entries, default_timeout=timeout)
+        elif cache_type == 'filesystem':
+            self.backend = FileSystemCache(app.config['CACHE_DIR'], max_entries=max_entries,
+                                           default_timeout=timeout)
+        elif cache_type == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError('Unknown CACHE_TYPE: %r' % cache_type)
+        app.extensions['response_cache'] = self
+
+    def _tag_token(self, tag):
+        key = 'tag:' + tag
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid4().hex
+            self.backend.set(key, token, timeout=0)
+        return token
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def shared(self):
+        # whether other processes, e.g. a CLI command, can clear this cache
+        return not isinstance(self.backend, LRUCache)
+
+    def vary_on(self, func):
+        # func() returns a string describing request state (beyond the URL)
+        # that changes the rendered page, e.g. the negotiated locale
+        self.vary_functions.append(func)
+        return func
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.delete('tag:' + tag)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _key(self, tags, kwargs):
+        # None when the response must not be cached
+        # pages carrying flashed messages are one-off renders
+        if request.method != 'GET' or '_flashes' in session:
+            return None
+        tokens = [self._tag_token(tag.format(**kwargs)) for tag in tags]
+        return ':'.join(['view', request.full_path] + [func() for func in self.vary_functions]
+                        + tokens)
+
+    def _lookup(self, key):
+        entry = self.backend.get(key)
+        self._count(hit=entry is not None)
+        if entry is None:
+            return None
+        body, status, mimetype, headers = entry
+        response = make_response(body, status)
+        response.mimetype = mimetype
+        response.headers.extend(headers)
+        response.headers['X-Cache'] = 'HIT'
+        return response
+
+    def _store(self, key, rv):
+        response = make_response(rv)
+        if response.status_code == 200 and not response.direct_passthrough:
+            headers = [(name, response.headers[name])
+                       for name in CACHED_HEADERS if name in response.headers]
+            self.backend.set(key, (response.get_data(), response.status_code,
+                                   response.mimetype, headers))
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    def cached(self, *tags):
+        # tags may reference view arguments, e.g. @cache.cached('venue:{venue_id}')
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                key = self._key(tags, kwargs)
+                if key is None:
+                    return view(*args, **kwargs)
+                response = self._lookup(key)
+                if response is None:
+                    response = self._store(key, view(*args, **kwargs))
+                return response
+            return wrapper
+        return decorator
+
+    def cached_async(self, *tags):
+        # the same for the coroutine views in async_views.py
+        def decorator(view):
+            @wraps(view)
+            async def wrapper(*args, **kwargs):
+                key = self._key(tags, kwargs)
+                if key is None:
+                    return await view(*args, **kwargs)
+                response = self._lookup(key)
+                if response is None:
+                    response = self._store(key, await view(*args, **kwargs))
+                return response
+            return wrapper
+        return decorator
+
+
+cache = ResponseCache()
@@ -0,0 +1,188 @@
+from collections import Counter
+from datetime import datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, select, func, and_, not_
+from models import db, Venue, Artist, Show
+from cache import cache
+from areas import refresh_venue_areas, refresh_all
+from invalidation import report_cli_invalidation
+from scheduling import show_time
+
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+# Venue and Artist carry upcoming_shows_count and past_shows_count so the
+# listing pages never touch the Show table. Each show records in
+# counted_past which of the two counters it was added to.
+#
+# ORM inserts and deletes of shows adjust the counters in the same
+# transaction (mapper events below); bulk Core inserts call count_shows().
+# A show becomes past when its start time goes by, which no write notices,
+# so 'flask rollover' moves those shows across and should run from cron:
+#
+#   */5 * * * *  flask rollover
+#
+# 'flask recount' rebuilds every counter from the Show table, and then the
+# venue directory summary (areas.py) that shows the venue counters.
+#
+# A show only counts for its venue while its artist isn't archived and for
+# its artist while its venue isn't (see deletion.py): archiving or restoring
+# one side moves its shows off or back onto the other side's counters with
+# count_owner_shows().
+#
+# Counter writes leave updated_at alone, so that a rollover or a recount
+# doesn't make every venue and artist look modified to incremental exports
+# (exporter.py). A show that rolls over is stamped: its counted_past changed.
+
+OWNERS = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+
+# for each side, the model on the other side of a show
+OTHER_SIDE = {'venue_id': (Artist, 'artist_id'), 'artist_id': (Venue, 'venue_id')}
+
+
+def _adjust(connection, model, deltas, upcoming, past):
+    # deltas maps owner id -> number of shows; one UPDATE per distinct count
+    by_count = {}
+    for owner_id, count in deltas.items():
+        by_count.setdefault(count, []).append(owner_id)
+    table = model.__table__
+    for count, ids in by_count.items():
+        connection.execute(table.update().where(table.c.id.in_(ids)).values(
+            upcoming_shows_count=table.c.upcoming_shows_count + upcoming * count,
+            past_shows_count=table.c.past_shows_count + past * count,
+            updated_at=table.c.updated_at))
+
+
+def _field(show, key):
+    return show[key] if isinstance(show, dict) else getattr(show, key)
+
+
+def count_shows(connection, shows, sign=1):
+    # shows are Show objects or dicts with venue_id, artist_id and
+    # counted_past; sign=-1 takes them back off the counters
+    for model, key in OWNERS:
+        upcoming = Counter(_field(show, key) for show in shows
+                           if not _field(show, 'counted_past'))
+        past = Counter(_field(show, key) for show in shows if _field(show, 'counted_past'))
+        _adjust(connection, model, upcoming, sign, 0)
+        _adjust(connection, model, past, 0, sign)
+
+
+def count_owner_shows(connection, model, owner_id, sign):
+    # puts the shows of one venue or artist on (sign=1) or takes them off
+    # (sign=-1) the counters of the artists or venues they are with
+    key = 'venue_id' if model is Venue else 'artist_id'
+    other_model, other_key = OTHER_SIDE[key]
+    show = Show.__table__
+    rows = connection.execute(
+        select(show.c[other_key], show.c.counted_past, func.count(show.c.id)).
+        where(show.c[key] == owner_id).
+        group_by(show.c[other_key], show.c.counted_past)).all()
+    _adjust(connection, other_model, {row[0]: row[2] for row in rows if not row[1]}, sign, 0)
+    _adjust(connection, other_model, {row[0]: row[2] for row in rows if row[1]}, 0, sign)
+
+
+@event.listens_for(Show, 'before_insert')
+def _classify_show(mapper, connection, target):
+    target.start_time = show_time(target.start_time)
+    target.counted_past = target.start_time < datetime.now()
+
+
+@event.listens_for(Show, 'after_insert')
+def _count_inserted_show(mapper, connection, target):
+    count_shows(connection, [target])
+
+
+@event.listens_for(Show, 'after_delete')
+def _uncount_deleted_show(mapper, connection, target):
+    count_shows(connection, [target], sign=-1)
+
+
+def roll_over(now=None, batch_size=10000):
+    # moves shows that have started since the last run from upcoming to past;
+    # returns how many moved. each batch is its own transaction.
+    now = now or datetime.now()
+    moved = 0
+    while True:
+        rows = db.session.query(Show.id, Show.venue_id, Show.artist_id,
+                                Venue.archived_at.isnot(None).label('venue_archived'),
+                                Artist.archived_at.isnot(None).label('artist_archived')). \
+            join(Venue, Show.venue_id == Venue.id). \
+            join(Artist, Show.artist_id == Artist.id). \
+            filter(not_(Show.counted_past), Show.start_time < now). \
+            order_by(Show.id).limit(batch_size).with_for_update(of=Show).all()
+        if not rows:
+            break
+        connection = db.session.connection()
+        connection.execute(Show.__table__.update().
+                           where(Show.__table__.c.id.in_([row.id for row in rows])).
+                           values(counted_past=True))
+        _adjust(connection, Venue, Counter(row.venue_id for row in rows
+                                           if not row.artist_archived), -1, 1)
+        _adjust(connection, Artist, Counter(row.artist_id for row in rows
+                                            if not row.venue_archived), -1, 1)
+        refresh_venue_areas(connection, {row.venue_id for row in rows})
+        db.session.commit()
+        moved += len(rows)
+    return moved
+
+
+def recount(now=None):
+    # recomputes counted_past and both counters for every row
+    now = now or datetime.now()
+    connection = db.session.connection()
+    show = Show.__table__
+    connection.execute(show.update().values(counted_past=show.c.start_time < now,
+                                            updated_at=show.c.updated_at))
+    for model, key in OWNERS:
+        table = model.__table__
+        other = OTHER_SIDE[key][0].__table__
+        other_key = OTHER_SIDE[key][1]
+
+        def shows_of(counted_past):
+            return select(func.count(show.c.id)). \
+                select_from(show.join(other, other.c.id == show.c[other_key])). \
+                where(and_(show.c[key] == table.c.id, show.c.counted_past == counted_past,
+                           other.c.archived_at.is_(None))). \
+                scalar_subquery()
+
+        connection.execute(table.update().values(upcoming_shows_count=shows_of(False),
+                                                 past_shows_count=shows_of(True),
+                                                 updated_at=table.c.updated_at))
+    db.session.commit()
+    refresh_all()
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('rollover')
+@with_appcontext
+def rollover_command():
+    """Move shows that have started from the upcoming to the past counters.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    moved = roll_over()
+    click.echo('Moved %d shows to past' % moved)
+    if moved:
+        cache.invalidate('venues', 'artists')
+        report_cli_invalidation()
+
+
+@click.command('recount')
+@with_appcontext
+def recount_command():
+    """Rebuild the upcoming/past show counters of every venue and artist.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    recount()
+    cache.clear()
+    click.echo('Recounted shows for %d venues and %d artists' % (
+        Venue.query.count(), Artist.query.count()))
+    report_cli_invalidation()
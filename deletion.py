@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from models import db, Venue, Artist
+from counters import count_owner_shows
+from areas import venue_area_keys, refresh_areas
+from queries import artist_ids_for_venue, venue_ids_for_artist
+from invalidation import invalidate_venue, invalidate_artist, report_cli_invalidation
+
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#----------------------------------------------------------------------------#
+
+# DELETE /venues/<id> and /artists/<id> either delete the row or, with
+# SOFT_DELETE on, archive it.
+#
+# Deleting is a single DELETE statement: ON DELETE CASCADE removes the
+# shows and genre links in the database, and the relationships are
+# passive_deletes so the ORM never loads them first. Cascaded shows don't
+# fire the mapper events in counters.py, so their place on the other side's
+# counters is taken back beforehand.
+#
+# Archiving sets archived_at. Every listing filters on archived_at IS NULL
+# (queries.active), which the partial indexes ix_venue_active_state_city and
+# ix_artist_active_id cover, and the detail pages answer 404. 'flask restore'
+# undoes it; 'flask purge' deletes what was archived more than
+# ARCHIVE_RETENTION_DAYS ago, in batches, through the same cascade.
+
+MODELS = {'venue': Venue, 'artist': Artist}
+
+
+def _linked_ids(model, owner_id):
+    # the other side's ids, read while the shows still exist
+    if model is Venue:
+        return artist_ids_for_venue(owner_id)
+    return venue_ids_for_artist(owner_id)
+
+
+def _area_keys(connection, model, owner_id, linked_ids):
+    # the /venues areas that list this venue, or this artist's venues
+    return venue_area_keys(connection, [owner_id] if model is Venue else linked_ids)
+
+
+def _invalidate(model, owner_id, linked_ids):
+    if model is Venue:
+        invalidate_venue(owner_id, artist_ids=linked_ids)
+    else:
+        invalidate_artist(owner_id, venue_ids=linked_ids)
+
+
+def delete(model, owner_id):
+    # deletes a venue or artist with its shows; False if there is none
+    table = model.__table__
+    connection = db.session.connection()
+    row = connection.execute(select(table.c.archived_at).
+                             where(table.c.id == owner_id).with_for_update()).first()
+    if row is None:
+        return False
+    linked_ids = _linked_ids(model, owner_id)
+    areas = _area_keys(connection, model, owner_id, linked_ids)
+    if row.archived_at is None:
+        # archived rows are already off the counters
+        count_owner_shows(connection, model, owner_id, -1)
+    connection.execute(table.delete().where(table.c.id == owner_id))
+    refresh_areas(connection, areas)
+    db.session.commit()
+    _invalidate(model, owner_id, linked_ids)
+    return True
+
+
+def archive(model, owner_id, now=None):
+    # hides a venue or artist; False if there is none or it is archived
+    table = model.__table__
+    connection = db.session.connection()
+    archived = connection.execute(
+        table.update().where(table.c.id == owner_id, table.c.archived_at.is_(None)).
+        values(archived_at=now or datetime.utcnow())).rowcount
+    if not archived:
+        db.session.rollback()
+        return False
+    linked_ids = _linked_ids(model, owner_id)
+    count_owner_shows(connection, model, owner_id, -1)
+    refresh_areas(connection, _area_keys(connection, model, owner_id, linked_ids))
+    db.session.commit()
+    _invalidate(model, owner_id, linked_ids)
+    return True
+
+
+def restore(model, owner_id):
+    # brings back an archived venue or artist; False if it isn't archived
+    table = model.__table__
+    connection = db.session.connection()
+    restored = connection.execute(
+        table.update().where(table.c.id == owner_id, table.c.archived_at.isnot(None)).
+        values(archived_at=None)).rowcount
+    if not restored:
+        db.session.rollback()
+        return False
+    linked_ids = _linked_ids(model, owner_id)
+    count_owner_shows(connection, model, owner_id, 1)
+    refresh_areas(connection, _area_keys(connection, model, owner_id, linked_ids))
+    db.session.commit()
+    _invalidate(model, owner_id, linked_ids)
+    return True
+
+
+def purge(model, before, batch_size=1000):
+    # deletes rows archived before the given time, one transaction per
+    # batch; returns how many went. their pages are already gone from every
+    # listing, so nothing needs invalidating.
+    table = model.__table__
+    purged = 0
+    while True:
+        ids = db.session.execute(
+            select(table.c.id).
+            where(table.c.archived_at.isnot(None), table.c.archived_at < before).
+            order_by(table.c.id).limit(batch_size)).scalars().all()
+        if not ids:
+            break
+        db.session.execute(table.delete().where(table.c.id.in_(ids)))
+        db.session.commit()
+        purged += len(ids)
+    return purged
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('purge')
+@click.option('--days', type=int, default=None,
+              help='Only purge rows archived at least this many days ago '
+                   '[default: ARCHIVE_RETENTION_DAYS].')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows deleted per transaction.')
+@with_appcontext
+def purge_command(days, batch_size):
+    """Delete archived venues and artists for good, with their shows."""
+    if days is None:
+        days = current_app.config['ARCHIVE_RETENTION_DAYS']
+    before = datetime.utcnow() - timedelta(days=days)
+    for name, model in sorted(MODELS.items()):
+        click.echo('Purged %d archived %ss' % (purge(model, before, batch_size), name))
+
+
+@click.command('restore')
+@click.argument('entity', type=click.Choice(sorted(MODELS)))
+@click.argument('owner_id', type=int)
+@with_appcontext
+def restore_command(entity, owner_id):
+    """Bring back an archived venue or artist.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    if not restore(MODELS[entity], owner_id):
+        raise click.ClickException('There is no archived %s with id %d' % (entity, owner_id))
+    click.echo('Restored %s %d' % (entity, owner_id))
+    report_cli_invalidation()
@@ -0,0 +1,182 @@
+import io
+import csv
+import json
+import zlib
+from datetime import datetime
+from itertools import islice
+import click
+from flask import Blueprint, Response, request, abort, current_app, stream_with_context
+from flask.cli import with_appcontext
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+from auth import bearer_authorized
+
+#----------------------------------------------------------------------------#
+# Bulk export.
+#----------------------------------------------------------------------------#
+
+# flask export shows shows.ndjson.gz --since 2026-10-01T00:00:00
+# curl -H "Authorization: Bearer $EXPORT_TOKEN" https://.../export/venues.csv
+#
+# Rows are read with a server-side cursor (stream_results + yield_per) and
+# written out as they arrive, so memory stays flat however large the table.
+# --since / ?since= only exports rows whose updated_at (UTC) is later than
+# the given timestamp; deletions, and the show counters changing, are not
+# tracked.
+
+EXPORTS = {
+    'venues': (Venue, venue_genres, 'venue_id'),
+    'artists': (Artist, artist_genres, 'artist_id'),
+    'shows': (Show, None, None),
+}
+
+# flush the output in pieces of roughly this many bytes
+CHUNK_SIZE = 64 * 1024
+
+
+def _columns(model):
+    return [column.name for column in model.__table__.columns]
+
+
+def _genre_names(link_table, key, ids):
+    names = {}
+    rows = db.session.query(link_table.c[key], Genre.name). \
+        join(Genre, Genre.id == link_table.c.genre_id). \
+        filter(link_table.c[key].in_(ids)). \
+        order_by(Genre.name)
+    for owner_id, name in rows:
+        names.setdefault(owner_id, []).append(name)
+    return names
+
+
+def export_rows(entity, since=None, batch_size=1000):
+    # yields one dict per row, oldest id first
+    model, link_table, key = EXPORTS[entity]
+    query = db.session.query(*model.__table__.columns)
+    if since is not None:
+        query = query.filter(model.updated_at > since)
+    rows = iter(query.order_by(model.id).
+                execution_options(stream_results=True).yield_per(batch_size))
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        genres = {}
+        if link_table is not None:
+            genres = _genre_names(link_table, key, [row.id for row in batch])
+        for row in batch:
+            data = row._asdict()
+            if link_table is not None:
+                data['genres'] = genres.get(row.id, [])
+            yield data
+
+
+def _ndjson_lines(entity, rows):
+    for row in rows:
+        yield json.dumps(row, default=str, separators=(',', ':')) + '\n'
+
+
+def _csv_lines(entity, rows):
+    model = EXPORTS[entity][0]
+    header = _columns(model) + (['genres'] if EXPORTS[entity][1] is not None else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=header)
+    writer.writeheader()
+    for row in rows:
+        if 'genres' in row:
+            row['genres'] = ','.join(row['genres'])
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+FORMATS = {
+    'ndjson': (_ndjson_lines, 'application/x-ndjson'),
+    'csv': (_csv_lines, 'text/csv'),
+}
+
+
+def export_chunks(entity, file_format, since=None, compress=False, batch_size=1000):
+    # encoded (and optionally gzipped) output in pieces of about CHUNK_SIZE bytes
+    lines = FORMATS[file_format][0](entity, export_rows(entity, since, batch_size))
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        pending.append(data)
+        size += len(data)
+        if size >= CHUNK_SIZE:
+            chunk = b''.join(pending)
+            pending, size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    chunk = b''.join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def parse_since(value):
+    # raises ValueError on a malformed timestamp
+    return datetime.fromisoformat(value) if value else None
+
+
+#  HTTP endpoint
+#  ----------------------------------------------------------------
+
+export = Blueprint('export', __name__, url_prefix='/export')
+
+
+@export.route('/<any(venues, artists, shows):entity>.<any(ndjson, csv):file_format>')
+def export_entity(entity, file_format):
+    if not bearer_authorized('EXPORT_TOKEN'):
+        abort(401)
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        abort(400)
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    chunks = export_chunks(entity, file_format, since=since, compress=compress,
+                           batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+    response = Response(stream_with_context(chunks), mimetype=FORMATS[file_format][1])
+    response.headers['Content-Disposition'] = 'attachment; filename=%s.%s' % (entity, file_format)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(sorted(EXPORTS)))
+@click.argument('target', type=click.File('wb'))
+@click.option('--format', 'file_format', type=click.Choice(sorted(FORMATS)),
+              help='Output format; guessed from the file extension by default.')
+@click.option('--since', help='Only rows updated after this ISO timestamp.')
+@click.option('--gzip', 'compress', is_flag=True,
+              help='Gzip the output (implied by a .gz file name).')
+@with_appcontext
+def export_command(entity, target, file_format, since, compress):
+    """Stream venues, artists or shows to a CSV or NDJSON file."""
+    name = target.name if isinstance(target.name, str) else ''
+    if name.endswith('.gz'):
+        compress = True
+        name = name[:-3]
+    if file_format is None:
+        file_format = 'csv' if name.endswith('.csv') else 'ndjson'
+    try:
+        since = parse_since(since)
+    except ValueError:
+        raise click.BadParameter('expected an ISO timestamp', param_hint='--since')
+    written = 0
+    for chunk in export_chunks(entity, file_format, since=since, compress=compress,
+                               batch_size=current_app.config.get('EXPORT_BATCH_SIZE', 1000)):
+        target.write(chunk)
+        written += len(chunk)
+    click.echo('Exported %s to %s (%d bytes)' % (entity, target.name, written), err=True)
@@ -0,0 +1,103 @@
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import dateutil.parser
+from babel import Locale
+from babel.dates import parse_pattern
+from flask import current_app, request, g, has_request_context
+
+#----------------------------------------------------------------------------#
+# Date formatting.
+#----------------------------------------------------------------------------#
+
+# Show times are rendered on every tile, so the formatter works on native
+# datetimes, compiles each Babel pattern once per (format, locale) and keeps
+# recently formatted values in a bounded LRU.
+#
+# The locale comes from the Accept-Language header (limited to
+# SUPPORTED_LOCALES) and the timezone from a 'tz' cookie holding an IANA name,
+# which static/js/script.js sets to the browser's zone (so a visitor's first
+# page is still in the server's zone).
+#
+# Show times are stored naive, in the server's local time: the forms and the
+# importer take them as entered and queries.py and counters.py compare them
+# with datetime.now(). They are converted from SERVER_TIMEZONE, or the
+# server's local zone when that is empty, and only when the request asks for
+# a timezone.
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=256)
+def _compiled(format, locale):
+    return parse_pattern(FORMATS.get(format, format)), Locale.parse(locale)
+
+
+@lru_cache(maxsize=64)
+def _zone(name):
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=8192)
+def _format(value, format, locale, tz_name, server_tz_name):
+    pattern, babel_locale = _compiled(format, locale)
+    if tz_name:
+        if value.tzinfo is None:
+            # astimezone() takes a naive value to be in the local zone
+            value = value.replace(tzinfo=_zone(server_tz_name)) if server_tz_name \
+                else value.astimezone()
+        value = value.astimezone(_zone(tz_name))
+    return pattern.apply(value, babel_locale)
+
+
+def _request_setting(name, resolve):
+    if not has_request_context():
+        return None
+    if name not in g:
+        setattr(g, name, resolve())
+    return getattr(g, name)
+
+
+def request_locale():
+    default = current_app.config.get('DEFAULT_LOCALE', 'en')
+    locale = _request_setting('_locale', lambda: request.accept_languages.best_match(
+        current_app.config.get('SUPPORTED_LOCALES', [default])))
+    return locale or default
+
+
+def request_timezone():
+    def resolve():
+        name = request.cookies.get('tz')
+        if not name:
+            return None
+        try:
+            _zone(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            return None
+        return name
+    return _request_setting('_timezone', resolve)
+
+
+def format_context_key():
+    # locale and timezone the current request renders with; part of cache keys
+    return '%s|%s' % (request_locale(), request_timezone() or '')
+
+
+def format_datetime(value, format='medium', locale=None, tz=None):
+    if value is None:
+        return ''
+    if not isinstance(value, datetime):
+        # strings still go through the old parsing path
+        value = dateutil.parser.parse(str(value))
+    return _format(value, format, locale or request_locale(), tz or request_timezone(),
+                   current_app.config.get('SERVER_TIMEZONE', ''))
+
+
+def cache_info():
+    return {
+        "patterns": _compiled.cache_info()._asdict(),
+        "values": _format.cache_info()._asdict()
+    }
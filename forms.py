@@ -1,20 +1,26 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, \
+    IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, NumberRange, Optional
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # minutes; see scheduling.py
+    duration = IntegerField(
+        'duration', default=120,
+        validators=[Optional(), NumberRange(min=1, max=24 * 60)]
+    )
 
 class VenueForm(Form):
     name = StringField(
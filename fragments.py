@@ -0,0 +1,115 @@
+import os
+from uuid import uuid4
+from flask import g, has_request_context
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cache import cache, NullCache, LRUCache, FileSystemCache
+
+#----------------------------------------------------------------------------#
+# Fragment cache.
+#----------------------------------------------------------------------------#
+
+# {% cache %} keeps the HTML of part of a template, so a page that has to be
+# rendered again (its cached response went stale, or it never had one)
+# reuses the pieces that didn't change:
+#
+#   {% cache 'venue-show', show.id, versions=['artist:' ~ show.artist_id] %}
+#       ... the show's tile ...
+#   {% endcache %}
+#
+# The key is the name and the other arguments, the request's locale and
+# timezone (cache.vary_on) and the current token of each tag in versions,
+# which fragments.invalidate(tag) drops as the response cache does. The
+# show tiles are versioned by 'venue:<id>' and 'artist:<id>', invalidated
+# by invalidation.py when that venue or artist row changes (an edit, a new
+# thumbnail, a delete) but not when a show is booked, so a new show
+# re-renders one tile instead of the whole page. Shows aren't edited once
+# booked, so their id is all a tile's key needs of them.
+#
+# Fragments and their tokens are kept apart from the responses, in a
+# backend of the same CACHE_TYPE holding up to FRAGMENT_CACHE_MAX_ENTRIES,
+# so a page's tiles don't push whole pages out of the LRU. With CACHE_TYPE
+# 'null' templates render as if the tag weren't there.
+
+
+class FragmentCache(object):
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'lru')
+        timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 300)
+        max_entries = app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 10000)
+        if cache_type == 'lru':
+            self.backend = LRUCache(max_entries=max_entries, default_timeout=timeout)
+        elif cache_type == 'filesystem':
+            # a dot directory, which the response cache's pruning skips
+            self.backend = FileSystemCache(os.path.join(app.config['CACHE_DIR'], '.fragments'),
+                                           max_entries=max_entries, default_timeout=timeout)
+        else:
+            self.backend = NullCache()
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.extensions['fragment_cache'] = self
+
+    def _context(self):
+        # the request's vary_on values, worked out once per request
+        if '_fragment_context' not in g:
+            g._fragment_context = [func() for func in cache.vary_functions]
+        return g._fragment_context
+
+    def _tag_token(self, tag):
+        # read once per request, however many tiles share it
+        tokens = g.setdefault('_fragment_tokens', {})
+        if tag not in tokens:
+            key = 'tag:' + tag
+            tokens[tag] = self.backend.get(key)
+            if tokens[tag] is None:
+                tokens[tag] = uuid4().hex
+                self.backend.set(key, tokens[tag], timeout=0)
+        return tokens[tag]
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.delete('tag:' + tag)
+
+    def render(self, parts, versions, render):
+        # the fragment's HTML from the cache, or render() stored under its key
+        if isinstance(self.backend, NullCache) or not has_request_context():
+            return render()
+        key = ':'.join(['fragment'] + [str(part) for part in parts] + self._context()
+                       + [self._tag_token(tag) for tag in versions])
+        html = self.backend.get(key)
+        if html is None:
+            html = str(render())
+            self.backend.set(key, html)
+        return Markup(html)
+
+
+fragments = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache name[, part, ...][, versions=[tag, ...]] %} ... {% endcache %}
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        versions = nodes.List([])
+        while parser.stream.skip_if('comma'):
+            if parser.stream.current.test('name:versions') and \
+                    parser.stream.look().test('assign'):
+                parser.stream.skip(2)
+                versions = parser.parse_expression()
+                break
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts), versions]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, versions, caller):
+        return fragments.render(parts, versions, caller)
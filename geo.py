@@ -0,0 +1,271 @@
+import os
+import re
+import csv
+import math
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, and_, or_
+from models import db, Venue
+from queries import active
+from cache import cache
+from invalidation import report_cli_invalidation
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#----------------------------------------------------------------------------#
+
+# Venues get a latitude and longitude from the gazetteer bundled in
+# data/us_cities.csv (city, state, latitude, longitude; no network needed)
+# whenever they are saved with a new city or state, and 'flask geocode'
+# fills in the ones saved before. A venue in a city the gazetteer doesn't
+# know has no location and never shows up in nearby_venues(); add the city
+# to the file and re-run 'flask geocode'.
+#
+# Each located venue also stores the geohash of its position: a string in
+# which every character halves the cell around the point a few more times,
+# so venues in the same cell share a prefix and one cell is one range scan
+# on ix_venue_geohash. nearby_venues() covers the box around the search
+# circle with at most MAX_CELLS cells, as small as that allows, and only
+# computes the exact distance of the venues in those ranges.
+
+GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'us_cities.csv')
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = math.pi * EARTH_RADIUS_MILES / 180
+KM_PER_MILE = 1.609344
+MAX_RADIUS_MILES = 500
+
+GEOHASH_PRECISION = 9
+# most geohash ranges one nearby query reads
+MAX_CELLS = 16
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+_gazetteer = None
+
+
+#  Geohash
+#  ----------------------------------------------------------------
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        # bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (degrees of latitude, degrees of longitude) covered by one cell
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def covering_cells(latitude, longitude, radius):
+    # geohash prefixes whose cells together contain every point within
+    # radius miles of (latitude, longitude); [''] means everywhere
+    lat_span = radius / MILES_PER_DEGREE
+    farthest = min(abs(latitude) + lat_span, 90.0)
+    if farthest >= 89.9:
+        return ['']
+    # a degree of longitude is shortest on the side nearer the pole
+    lng_span = 1.01 * lat_span / math.cos(math.radians(farthest))
+    south, north = max(latitude - lat_span, -90.0), min(latitude + lat_span, 90.0)
+    west, east = longitude - lng_span, longitude + lng_span
+    # the finest cells that cover the bounding box in at most MAX_CELLS
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_size, lng_size = cell_size(precision)
+        rows = range(int(math.floor((south + 90.0) / lat_size)),
+                     int(math.floor((north + 90.0) / lat_size)) + 1)
+        columns = range(int(math.floor((west + 180.0) / lng_size)),
+                        int(math.floor((east + 180.0) / lng_size)) + 1)
+        if len(rows) * len(columns) <= MAX_CELLS:
+            break
+    else:
+        return ['']
+    cells = set()
+    for row in rows:
+        for column in columns:
+            # encode the centre of each cell; columns wrap around at ±180
+            lat = min((row + 0.5) * lat_size - 90.0, 90.0)
+            lng = ((column + 0.5) * lng_size) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return sorted(cells)
+
+
+def _after(prefix):
+    # the first geohash that sorts after every one starting with prefix, or
+    # None; stays within the geohash alphabet, which sorts the same way in
+    # every collation
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def distance(lat1, lng1, lat2, lng2):
+    # great-circle distance in miles
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+#  Gazetteer
+#  ----------------------------------------------------------------
+
+def _key(city, state):
+    city = re.sub(r'[^a-z0-9 ]', '', (city or '').lower())
+    city = re.sub(r'^saint ', 'st ', ' '.join(city.split()))
+    return city, (state or '').strip().upper()
+
+
+def gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with open(GAZETTEER, encoding='utf-8') as f:
+            _gazetteer = {_key(row['city'], row['state']):
+                          (float(row['latitude']), float(row['longitude']))
+                          for row in csv.DictReader(f)}
+    return _gazetteer
+
+
+def locate(city, state):
+    # (latitude, longitude) of a city, or None
+    return gazetteer().get(_key(city, state))
+
+
+def location_columns(city, state):
+    # values for the latitude, longitude and geohash columns
+    position = locate(city, state)
+    if position is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    return {"latitude": position[0], "longitude": position[1], "geohash": encode(*position)}
+
+
+@event.listens_for(Venue, 'before_insert')
+def _locate_new_venue(mapper, connection, target):
+    if target.latitude is None:
+        for key, value in location_columns(target.city, target.state).items():
+            setattr(target, key, value)
+
+
+@event.listens_for(Venue, 'before_update')
+def _relocate_venue(mapper, connection, target):
+    state = inspect(target)
+    moved = state.attrs.city.history.has_changes() or state.attrs.state.history.has_changes()
+    if moved and not state.attrs.latitude.history.has_changes():
+        for key, value in location_columns(target.city, target.state).items():
+            setattr(target, key, value)
+
+
+#  Queries
+#  ----------------------------------------------------------------
+
+def nearby_venues(latitude, longitude, radius, limit=20):
+    # venues within radius miles, nearest first, as dicts with a distance
+    cells = covering_cells(latitude, longitude, radius)
+    query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                             Venue.latitude, Venue.longitude, Venue.image_link,
+                             Venue.image_key, Venue.upcoming_shows_count)
+    ranges = []
+    for cell in cells:
+        upper = _after(cell)
+        ranges.append(Venue.geohash >= cell if upper is None else
+                      and_(Venue.geohash >= cell, Venue.geohash < upper))
+    query = query.filter(or_(*ranges), active(Venue))
+    found = []
+    for row in query:
+        miles = distance(latitude, longitude, row.latitude, row.longitude)
+        if miles <= radius:
+            found.append({
+                "id": row.id,
+                "name": row.name,
+                "city": row.city,
+                "state": row.state,
+                "address": row.address,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+                "image_link": row.image_link,
+                "image_key": row.image_key,
+                "num_upcoming_shows": row.upcoming_shows_count,
+                "distance": round(miles, 2),
+            })
+    found.sort(key=lambda venue: (venue["distance"], venue["id"]))
+    return found[:limit]
+
+
+def nearby_args(args):
+    # (latitude, longitude, radius in miles) from lat=&lng= or city=&state=
+    # plus radius= (miles, or km with unit=km); ValueError if they don't add up
+    if args.get('lat') or args.get('lng'):
+        try:
+            latitude, longitude = float(args['lat']), float(args['lng'])
+        except (KeyError, ValueError):
+            raise ValueError('lat and lng must both be numbers')
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError('lat must be within ±90 and lng within ±180')
+    else:
+        position = locate(args.get('city'), args.get('state'))
+        if position is None:
+            raise ValueError('unknown city %s, %s' % (args.get('city'), args.get('state')))
+        latitude, longitude = position
+    try:
+        radius = float(args.get('radius', 20))
+    except ValueError:
+        raise ValueError('radius must be a number')
+    if args.get('unit') == 'km':
+        radius /= KM_PER_MILE
+    if not 0 < radius <= MAX_RADIUS_MILES:
+        raise ValueError('radius must be more than 0 and at most %d miles' % MAX_RADIUS_MILES)
+    return latitude, longitude, radius
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('geocode')
+@click.option('--all', 'everything', is_flag=True,
+              help='Locate every venue again, not only those without a location.')
+@with_appcontext
+def geocode_command(everything):
+    """Set venue locations from the bundled gazetteer.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    query = db.session.query(Venue.id, Venue.city, Venue.state)
+    if not everything:
+        query = query.filter(Venue.latitude.is_(None))
+    located = missed = 0
+    places = {}
+    for row in query:
+        places.setdefault((row.city, row.state), []).append(row.id)
+    table = Venue.__table__
+    for (city, state), ids in places.items():
+        values = location_columns(city, state)
+        if values["latitude"] is None:
+            missed += len(ids)
+            continue
+        db.session.execute(table.update().where(table.c.id.in_(ids)).values(**values))
+        located += len(ids)
+    db.session.commit()
+    click.echo('Located %d venues; %d are in cities the gazetteer does not know' % (
+        located, missed))
+    if located:
+        cache.invalidate('venues')
+        report_cli_invalidation()
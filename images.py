@@ -0,0 +1,329 @@
+import io
+import os
+import re
+import socket
+import hashlib
+import tempfile
+import threading
+import ipaddress
+import http.client
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import click
+from flask import Blueprint, current_app, send_from_directory, url_for, abort
+from flask.cli import with_appcontext
+from models import db, Venue, Artist
+from invalidation import invalidate_venue, invalidate_artist, report_cli_invalidation
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are stored at their original size
+    Image = None
+
+#----------------------------------------------------------------------------#
+# Image thumbnails.
+#----------------------------------------------------------------------------#
+
+# Venues and artists point image_link at arbitrary remote URLs. When one is
+# created or edited, a background worker fetches the image once, checks that
+# it really is an image, writes a thumbnail per size in SIZES to IMAGE_DIR
+# and stores the key in image_key. Pages then load /images/<hash>-<size>.<ext>,
+# which never changes and is served with a one-year immutable Cache-Control;
+# until the key is set (or when the fetch fails) they keep hotlinking.
+#
+# Without Pillow, images are validated by their magic bytes and stored as
+# they are. 'flask images' processes every link that has no key yet.
+#
+# Unless IMAGE_ALLOW_PRIVATE is set, fetches refuse hosts that resolve to a
+# private, loopback or link-local address. The host is looked up once, by
+# the check, and the connection is made to the address it approved; fetches
+# don't go through HTTP proxies, which would look the host up again.
+
+SIZES = {'tile': 300, 'full': 600}
+
+FORMATS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+ONE_YEAR = 365 * 24 * 3600
+
+KEY_PATTERN = re.compile(r'^[0-9a-f]{32}\.(jpg|png|gif|webp)$')
+NAME_PATTERN = re.compile(r'^[0-9a-f]{32}-(%s)\.(jpg|png|gif|webp)$' % '|'.join(SIZES))
+
+
+class ImageError(Exception):
+    pass
+
+
+def sniff(data):
+    for magic, extension in FORMATS:
+        if data.startswith(magic):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _check_url(url):
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageError('not an http(s) URL')
+
+
+def _checked_address(host, port, allow_private):
+    # resolves host once and returns the address to connect to. The
+    # connection goes to this address rather than looking the name up again,
+    # so DNS can't answer the check with a public address and the connection
+    # with a private one.
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ImageError('cannot resolve %s' % host)
+    if not allow_private:
+        for address in addresses:
+            ip = ipaddress.ip_address(address[4][0])
+            if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved:
+                raise ImageError('refusing to fetch from %s' % ip)
+    return addresses[0][4][0]
+
+
+def _connection_class(connection_class, allow_private):
+    # connection_class, connecting through _checked_address
+    def connect(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        host, port = address
+        return socket.create_connection((_checked_address(host, port, allow_private), port),
+                                        timeout, source_address)
+
+    def build(host, **kwargs):
+        connection = connection_class(host, **kwargs)
+        connection._create_connection = connect
+        return connection
+    return build
+
+
+class _CheckedHTTPHandler(urllib.request.HTTPHandler):
+
+    def __init__(self, allow_private):
+        super(_CheckedHTTPHandler, self).__init__()
+        self.allow_private = allow_private
+
+    def http_open(self, req):
+        return self.do_open(_connection_class(http.client.HTTPConnection, self.allow_private),
+                            req)
+
+
+class _CheckedHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def __init__(self, allow_private):
+        super(_CheckedHTTPSHandler, self).__init__()
+        self.allow_private = allow_private
+
+    def https_open(self, req):
+        return self.do_open(_connection_class(http.client.HTTPSConnection, self.allow_private),
+                            req, context=self._context)
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    # a redirect must stay on http(s); its address is checked on connect
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_url(newurl)
+        return super(_CheckedRedirects, self).redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch(url, timeout=10, max_bytes=5 * 1024 * 1024, allow_private=False):
+    # the image bytes at url, or ImageError
+    _check_url(url)
+    # no proxies: the address checked must be the one connected to
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}),
+                                         _CheckedHTTPHandler(allow_private),
+                                         _CheckedHTTPSHandler(allow_private),
+                                         _CheckedRedirects())
+    request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-thumbnailer'})
+    try:
+        with opener.open(request, timeout=timeout) as response:
+            content_type = response.headers.get('Content-Type', '')
+            if not content_type.startswith('image/'):
+                raise ImageError('not an image (%s)' % (content_type or 'no content type'))
+            data = response.read(max_bytes + 1)
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        raise ImageError('fetch failed: %s' % getattr(e, 'reason', e))
+    if len(data) > max_bytes:
+        raise ImageError('larger than %d bytes' % max_bytes)
+    return data
+
+
+def resize(data):
+    # returns (extension, {size name: bytes})
+    extension = sniff(data)
+    if extension is None:
+        raise ImageError('unrecognised image format')
+    if Image is None:
+        return extension, {name: data for name in SIZES}
+    try:
+        Image.open(io.BytesIO(data)).verify()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception as e:
+        raise ImageError('invalid image: %s' % e)
+    keep_alpha = image.mode in ('RGBA', 'LA', 'P')
+    image_format, extension = ('PNG', 'png') if keep_alpha else ('JPEG', 'jpg')
+    resized = {}
+    for name, size in SIZES.items():
+        copy = image.copy()
+        copy.thumbnail((size, size))
+        if not keep_alpha:
+            copy = copy.convert('RGB')
+        output = io.BytesIO()
+        copy.save(output, image_format, optimize=True)
+        resized[name] = output.getvalue()
+    return extension, resized
+
+
+def store(directory, data):
+    # writes the thumbnails of data to directory; returns the image key
+    extension, resized = resize(data)
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    os.makedirs(directory, exist_ok=True)
+    for name, content in resized.items():
+        path = os.path.join(directory, '%s-%s.%s' % (digest, name, extension))
+        if os.path.exists(path):
+            continue
+        fd, temp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(temp, path)
+    return '%s.%s' % (digest, extension)
+
+
+def thumbnail_url(image_key, image_link, size='tile'):
+    # template helper: the local thumbnail once it exists, else the remote link
+    if image_key and KEY_PATTERN.match(image_key):
+        digest, extension = image_key.split('.')
+        return url_for('images.thumbnail', name='%s-%s.%s' % (digest, size, extension))
+    return image_link
+
+
+class ImageWorker(object):
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['images'] = self
+
+    def process(self, url):
+        # fetches url and sets image_key on every venue and artist using it
+        config = current_app.config
+        existing = db.session.query(Venue.image_key).filter(
+            Venue.image_link == url, Venue.image_key.isnot(None)).first() or \
+            db.session.query(Artist.image_key).filter(
+                Artist.image_link == url, Artist.image_key.isnot(None)).first()
+        if existing:
+            key = existing.image_key
+        else:
+            data = fetch(url, timeout=config['IMAGE_FETCH_TIMEOUT'],
+                         max_bytes=config['IMAGE_MAX_BYTES'],
+                         allow_private=config['IMAGE_ALLOW_PRIVATE'])
+            key = store(config['IMAGE_DIR'], data)
+        venue_ids = [row.id for row in db.session.query(Venue.id).filter(
+            Venue.image_link == url, Venue.image_key.is_distinct_from(key))]
+        artist_ids = [row.id for row in db.session.query(Artist.id).filter(
+            Artist.image_link == url, Artist.image_key.is_distinct_from(key))]
+        for model, ids in ((Venue, venue_ids), (Artist, artist_ids)):
+            if ids:
+                db.session.query(model).filter(model.id.in_(ids)). \
+                    update({'image_key': key}, synchronize_session=False)
+        db.session.commit()
+        for venue_id in venue_ids:
+            invalidate_venue(venue_id)
+        for artist_id in artist_ids:
+            invalidate_artist(artist_id)
+        return key
+
+    def _run(self, app, url):
+        with app.app_context():
+            try:
+                self.process(url)
+            except ImageError as e:
+                current_app.logger.warning('image %s: %s', url, e)
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception('image %s', url)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._pending.discard(url)
+
+    def enqueue(self, url):
+        # called after a create or edit commits; runs inline when
+        # IMAGE_WORKERS is 0
+        if not url:
+            return
+        app = current_app._get_current_object()
+        workers = app.config['IMAGE_WORKERS']
+        with self._lock:
+            if url in self._pending:
+                return
+            self._pending.add(url)
+            if workers and self._executor is None:
+                # started on first use, so each forked worker gets its own
+                self._executor = ThreadPoolExecutor(workers, thread_name_prefix='images')
+        if not workers:
+            self._run(app, url)
+        else:
+            self._executor.submit(self._run, app, url)
+
+
+#  HTTP endpoint
+#  ----------------------------------------------------------------
+
+thumbnails = Blueprint('images', __name__, url_prefix='/images')
+
+
+@thumbnails.route('/<name>')
+def thumbnail(name):
+    if not NAME_PATTERN.match(name):
+        abort(404)
+    response = send_from_directory(current_app.config['IMAGE_DIR'], name, max_age=ONE_YEAR)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+#  CLI
+#  ----------------------------------------------------------------
+
+@click.command('images')
+@with_appcontext
+def images_command():
+    """Fetch and thumbnail every image link that has no thumbnail yet.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    urls = {row.image_link for model in (Venue, Artist) for row in
+            db.session.query(model.image_link).filter(
+                model.image_key.is_(None), model.image_link.isnot(None), model.image_link != '')}
+    done = 0
+    for url in sorted(urls):
+        try:
+            images.process(url)
+            done += 1
+        except ImageError as e:
+            db.session.rollback()
+            click.echo('%s: %s' % (url, e), err=True)
+    click.echo('Thumbnailed %d of %d image links' % (done, len(urls)))
+    if done:
+        report_cli_invalidation()
+
+
+images = ImageWorker()
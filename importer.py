@@ -0,0 +1,265 @@
+import csv
+import json
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+import click
+from flask.cli import with_appcontext
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from queries import get_or_create_genres, active
+from counters import count_shows
+from areas import refresh_venue_areas
+from scheduling import check_lineup, DEFAULT_DURATION
+from cache import cache
+from invalidation import report_cli_invalidation
+
+#----------------------------------------------------------------------------#
+# Bulk import.
+#----------------------------------------------------------------------------#
+
+# flask import venues venues.csv
+# flask import shows lineup.ndjson --chunk-size 5000
+#
+# Rows are streamed from the file, validated with the same WTForms classes as
+# the create pages and written one chunk per transaction. Shows go in as a
+# single executemany per chunk; venues and artists are added through the ORM
+# so their genres can be linked. A row that fails validation or violates a
+# constraint is reported and skipped without aborting the rest of the load.
+# Shows that overlap an existing booking, or an earlier row, are rejected
+# (see scheduling.py); their length is the optional 'duration' in minutes.
+#
+# In CSV files, genres are a comma-separated list inside one cell and
+# booleans are 'y'/'true' or 'false'/empty.
+
+ENTITIES = {
+    'venues': (VenueForm, Venue),
+    'artists': (ArtistForm, Artist),
+    'shows': (ShowForm, Show),
+}
+
+
+class UnreadableRow(object):
+    # stands in for an NDJSON line that isn't a JSON object, so that it is
+    # reported with the rows that fail validation
+
+    def __init__(self, error):
+        self.error = error
+
+
+def read_rows(stream, file_format):
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            yield row
+    else:
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield UnreadableRow('not valid JSON on line %d: %s' % (number, e))
+                continue
+            if isinstance(row, dict):
+                yield row
+            else:
+                yield UnreadableRow('line %d is not a JSON object' % number)
+
+
+def to_formdata(row):
+    # raises ValueError for values a form field can't take (an NDJSON row
+    # can hold any JSON type)
+    formdata = MultiDict()
+    for key, value in row.items():
+        if value is None:
+            continue
+        if key == 'genres':
+            if isinstance(value, str):
+                value = value.split(',')
+            if not isinstance(value, list) or not all(isinstance(genre, str) for genre in value):
+                raise ValueError('genres: not a list of genre names')
+            for genre in value:
+                formdata.add(key, genre.strip())
+        elif isinstance(value, (list, dict)):
+            raise ValueError('%s: not a single value' % key)
+        elif isinstance(value, bool):
+            formdata.add(key, 'y' if value else 'false')
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def validate(form_class, model, row):
+    # returns (values, None) or (None, error message)
+    if isinstance(row, UnreadableRow):
+        return None, row.error
+    try:
+        formdata = to_formdata(row)
+    except ValueError as e:
+        return None, str(e)
+    form = form_class(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, '; '.join('%s: %s' % (field, errors[0])
+                               for field, errors in form.errors.items())
+    columns = model.__table__.columns.keys()
+    values = {key: value for key, value in form.data.items()
+              if key in columns and key != 'id'}
+    for extra in ('genres', 'duration'):
+        if extra in form.data:
+            values[extra] = form.data[extra]
+    return values, None
+
+
+def check_show_references(chunk):
+    # ShowForm doesn't know which ids exist, so look them up once per chunk
+    artist_ids = {values['artist_id'] for _, values in chunk}
+    venue_ids = {values['venue_id'] for _, values in chunk}
+    known_artists = {row.id for row in db.session.query(Artist.id).filter(
+        Artist.id.in_(artist_ids), active(Artist))}
+    known_venues = {row.id for row in db.session.query(Venue.id).filter(
+        Venue.id.in_(venue_ids), active(Venue))}
+    valid, errors = [], []
+    for number, values in chunk:
+        if values['artist_id'] not in known_artists:
+            errors.append((number, 'artist_id: no artist with id %s' % values['artist_id']))
+        elif values['venue_id'] not in known_venues:
+            errors.append((number, 'venue_id: no venue with id %s' % values['venue_id']))
+        else:
+            valid.append((number, values))
+    return valid, errors
+
+
+def coerce_show(values):
+    # the form takes a duration in minutes; the table stores end_time
+    duration = values.pop('duration', None)
+    values['end_time'] = values['start_time'] + (
+        timedelta(minutes=duration) if duration else DEFAULT_DURATION)
+    return values, None
+
+
+def check_show_conflicts(chunk):
+    # overlapping bookings, against the database and within the chunk
+    conflicts = {}
+    for conflict in check_lineup([values for _, values in chunk]):
+        who = 'venue' if conflict["on"] == 'venue_id' else 'artist'
+        if 'show_id' in conflict:
+            message = 'start_time: %s already booked (show %s)' % (who, conflict["show_id"])
+        else:
+            message = 'start_time: %s double-booked with row %d' % (
+                who, chunk[conflict["other_index"]][0])
+        conflicts.setdefault(conflict["index"], message)
+    valid = [item for index, item in enumerate(chunk) if index not in conflicts]
+    errors = [(chunk[index][0], message) for index, message in conflicts.items()]
+    return valid, errors
+
+
+def insert_chunk(model, chunk):
+    if model is Show:
+        # Core insert skips the mapper events, so count the shows here
+        now = datetime.now()
+        rows = [dict(values, counted_past=values['start_time'] < now) for _, values in chunk]
+        db.session.execute(Show.__table__.insert(), rows)
+        count_shows(db.session.connection(), rows)
+        refresh_venue_areas(db.session.connection(), {row['venue_id'] for row in rows})
+        return
+    names = {name for _, values in chunk for name in values.get('genres', [])}
+    genres = {genre.name: genre for genre in get_or_create_genres(names)}
+    db.session.add_all([
+        model(**dict(values, genres=[genres[name] for name in values.get('genres', [])
+                                     if name in genres]))
+        for _, values in chunk])
+
+
+def write_chunk(model, chunk):
+    # one transaction per chunk; if it fails, retry row by row in savepoints
+    # so that only the offending rows are rejected. returns the row errors.
+    try:
+        insert_chunk(model, chunk)
+        db.session.commit()
+        return []
+    except Exception:
+        db.session.rollback()
+
+    errors = []
+    for number, values in chunk:
+        savepoint = db.session.begin_nested()
+        try:
+            insert_chunk(model, [(number, values)])
+            savepoint.commit()
+        except Exception as e:
+            savepoint.rollback()
+            errors.append((number, str(getattr(e, 'orig', e)).strip().splitlines()[0]))
+    db.session.commit()
+    return errors
+
+
+def import_rows(entity, rows, chunk_size=1000, on_error=None, on_progress=None):
+    form_class, model = ENTITIES[entity]
+    numbered = enumerate(rows, 1)
+    totals = {"rows": 0, "imported": 0, "errors": 0}
+    while True:
+        batch = list(islice(numbered, chunk_size))
+        if not batch:
+            break
+        chunk, errors = [], []
+        for number, row in batch:
+            values, error = validate(form_class, model, row)
+            if values is not None and model is Show:
+                values, error = coerce_show(values)
+            if error:
+                errors.append((number, error))
+            else:
+                chunk.append((number, values))
+        if model is Show and chunk:
+            chunk, missing = check_show_references(chunk)
+            errors.extend(missing)
+            chunk, overlapping = check_show_conflicts(chunk)
+            errors.extend(overlapping)
+        if chunk:
+            failed = write_chunk(model, chunk)
+            errors.extend(failed)
+            totals["imported"] += len(chunk) - len(failed)
+        totals["rows"] += len(batch)
+        totals["errors"] += len(errors)
+        if on_error:
+            for number, error in sorted(errors):
+                on_error(number, error)
+        if on_progress:
+            on_progress(totals)
+    return totals
+
+
+@click.command('import')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'ndjson']),
+              help='File format; guessed from the file extension by default.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows validated and written per transaction.')
+@with_appcontext
+def import_command(entity, source, file_format, chunk_size):
+    """Bulk import venues, artists or shows from a CSV or NDJSON file.
+
+    With a per-worker ('lru') CACHE_TYPE, web workers keep serving their
+    cached pages until they expire.
+    """
+    if file_format is None:
+        file_format = 'csv' if source.name.endswith('.csv') else 'ndjson'
+    started = time.time()
+
+    def on_error(number, error):
+        click.echo('row %d: %s' % (number, error), err=True)
+
+    def on_progress(totals):
+        elapsed = time.time() - started
+        click.echo('%s: %d rows, %d imported, %d errors (%.0f rows/s)' % (
+            entity, totals["rows"], totals["imported"], totals["errors"],
+            totals["rows"] / elapsed if elapsed else 0))
+
+    totals = import_rows(entity, read_rows(source, file_format), chunk_size=chunk_size,
+                         on_error=on_error, on_progress=on_progress)
+    cache.clear()
+    click.echo('Done: imported %d of %d %s in %.1fs' % (
+        totals["imported"], totals["rows"], entity, time.time() - started))
+    report_cli_invalidation()
@@ -0,0 +1,47 @@
+import click
+from flask import current_app
+from cache import cache
+from fragments import fragments
+from queries import artist_ids_for_venue, venue_ids_for_artist
+
+#----------------------------------------------------------------------------#
+# Cache invalidation.
+#----------------------------------------------------------------------------#
+
+# Cached pages are tagged 'venues', 'artists', 'shows', 'venue:<id>' and
+# 'artist:<id>'. Detail pages embed the names and images of the other side
+# of each show, so edits also reach the linked venue/artist pages. Pass the
+# linked ids in when the shows are gone by the time the cache is cleared.
+# Changes to a venue or artist row also drop the show tiles that embed it
+# (fragments.py); new shows don't.
+
+
+def invalidate_venue(venue_id, artist_ids=None):
+    if artist_ids is None:
+        artist_ids = artist_ids_for_venue(venue_id)
+    cache.invalidate('venues', 'shows', 'venue:%s' % venue_id,
+                     *['artist:%s' % artist_id for artist_id in artist_ids])
+    fragments.invalidate('venue:%s' % venue_id)
+
+
+def invalidate_artist(artist_id, venue_ids=None):
+    if venue_ids is None:
+        venue_ids = venue_ids_for_artist(artist_id)
+    cache.invalidate('artists', 'shows', 'artist:%s' % artist_id,
+                     *['venue:%s' % venue_id for venue_id in venue_ids])
+    fragments.invalidate('artist:%s' % artist_id)
+
+
+def invalidate_show(venue_id, artist_id):
+    cache.invalidate('venues', 'artists', 'shows', 'venue:%s' % venue_id, 'artist:%s' % artist_id)
+
+
+def report_cli_invalidation():
+    # CLI commands run in a process of their own, and the per-worker 'lru'
+    # cache of each web worker is out of their reach
+    if cache.shared:
+        return
+    click.echo("Note: with CACHE_TYPE 'lru' the web workers' cached pages can't be cleared "
+               "from here, and may be served for up to %d more seconds. Use a shared "
+               "CACHE_TYPE such as 'filesystem' to have them cleared."
+               % current_app.config['CACHE_DEFAULT_TIMEOUT'], err=True)
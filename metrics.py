@@ -0,0 +1,194 @@
+import json
+import time
+import logging
+import threading
+from flask import request, g, current_app, has_request_context, has_app_context, \
+    before_render_template, template_rendered, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+# Every request records its latency, the number of SQL statements it ran and
+# the time spent in them, and the time spent rendering templates. Totals per
+# route are served at /metrics in the Prometheus text format and each request
+# is written as one JSON line to the 'fyyur.requests' logger.
+#
+# Statements slower than SLOW_QUERY_MS are logged with their parameters to
+# 'fyyur.sql'. Counters live in the worker process, so with several gunicorn
+# workers each scrape sees the worker that answered it.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+request_log = logging.getLogger('fyyur.requests')
+sql_log = logging.getLogger('fyyur.sql')
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _short(value, limit=1000):
+    value = repr(value)
+    return value if len(value) <= limit else value[:limit] + '...'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the statement's own context, so a statement that fails leaves
+    # nothing behind on the pooled connection
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    if has_request_context():
+        g.sql_count = g.get('sql_count', 0) + 1
+        g.sql_time = g.get('sql_time', 0) + elapsed
+    if not has_app_context():
+        return
+    threshold = current_app.config.get('SLOW_QUERY_MS')
+    if threshold and elapsed * 1000 >= threshold:
+        with metrics._lock:
+            metrics.slow_queries += 1
+        sql_log.warning(json.dumps({
+            "duration_ms": round(elapsed * 1000, 3),
+            "statement": statement,
+            "parameters": _short(parameters),
+            "path": request.path if has_request_context() else None,
+        }))
+
+
+def _before_render(sender, template, context, **extra):
+    g.setdefault('render_started', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    started = g.get('render_started')
+    if started:
+        g.template_time = g.get('template_time', 0) + time.perf_counter() - started.pop()
+
+
+class RouteStats(object):
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statuses = {}
+
+
+class RequestMetrics(object):
+
+    def __init__(self, app=None):
+        self.routes = {}
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_rendered, app)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        app.extensions['metrics'] = self
+        for logger in (request_log, sql_log):
+            if not logger.handlers:
+                path = app.config.get('REQUEST_LOG_FILE')
+                handler = logging.FileHandler(path) if path else logging.StreamHandler()
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+
+    def _start(self):
+        g.request_started = time.perf_counter()
+
+    def _finish(self, response):
+        if 'request_started' not in g:
+            return response
+        duration = time.perf_counter() - g.request_started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        sql_count, sql_time = g.get('sql_count', 0), g.get('sql_time', 0)
+        template_time = g.get('template_time', 0)
+        with self._lock:
+            stats = self.routes.get((route, request.method))
+            if stats is None:
+                stats = self.routes[(route, request.method)] = RouteStats()
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+            stats.count += 1
+            stats.duration += duration
+            stats.sql_count += sql_count
+            stats.sql_time += sql_time
+            stats.template_time += template_time
+            stats.statuses[response.status_code] = stats.statuses.get(response.status_code, 0) + 1
+        if current_app.config.get('REQUEST_LOG'):
+            request_log.info(json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "route": route,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 3),
+                "sql_count": sql_count,
+                "sql_ms": round(sql_time * 1000, 3),
+                "template_ms": round(template_time * 1000, 3),
+            }))
+        return response
+
+    def render(self):
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            metric('fyyur_requests_total', 'counter', 'Requests by route, method and status.')
+            for (route, method), stats in routes:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('fyyur_requests_total{route="%s",method="%s",status="%s"} %d' % (
+                        _label(route), method, status, count))
+            metric('fyyur_request_duration_seconds', 'histogram', 'Request latency by route.')
+            for (route, method), stats in routes:
+                labels = 'route="%s",method="%s"' % (_label(route), method)
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append('fyyur_request_duration_seconds_bucket{%s,le="%s"} %d' % (
+                        labels, bound, count))
+                lines.append('fyyur_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (
+                    labels, stats.count))
+                lines.append('fyyur_request_duration_seconds_sum{%s} %f' % (labels, stats.duration))
+                lines.append('fyyur_request_duration_seconds_count{%s} %d' % (labels, stats.count))
+            for name, attr, help_text, fmt in (
+                    ('fyyur_sql_statements_total', 'sql_count', 'SQL statements run by route.', '%d'),
+                    ('fyyur_sql_seconds_total', 'sql_time', 'Time spent in SQL by route.', '%f'),
+                    ('fyyur_template_seconds_total', 'template_time',
+                     'Time spent rendering templates by route.', '%f')):
+                metric(name, 'counter', help_text)
+                for (route, method), stats in routes:
+                    lines.append(('%s{route="%s",method="%s"} ' + fmt) % (
+                        name, _label(route), method, getattr(stats, attr)))
+            metric('fyyur_slow_queries_total', 'counter',
+                   'Statements slower than SLOW_QUERY_MS.')
+            lines.append('fyyur_slow_queries_total %d' % self.slow_queries)
+        return '\n'.join(lines) + '\n'
+
+    def expose(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+metrics = RequestMetrics()
@@ -0,0 +1,102 @@
+"""move genres into a Genre table with venue/artist association tables.
+
+Revision ID: 9b7e41c2d5a0
+Revises: 5f3c2a9d81be
+Create Date: 2026-10-18 10:03:17.402951
+
+"""
+import csv
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e41c2d5a0'
+down_revision = '5f3c2a9d81be'
+branch_labels = None
+depends_on = None
+
+
+def parse_genres(value):
+    # genres were written as postgres array literals, e.g. {Jazz,"Rock n Roll"}
+    if not value:
+        return []
+    value = value.strip().lstrip('{').rstrip('}')
+    return [name.strip() for name in next(csv.reader([value])) if name.strip()]
+
+
+def format_genres(names):
+    return '{' + ','.join('"%s"' % name if ' ' in name else name for name in names) + '}'
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_venue_genres_genre_id'), 'venue_genres', ['genre_id'], unique=False)
+    op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_artist_genres_genre_id'), 'artist_genres', ['genre_id'], unique=False)
+
+    # copy the existing genre strings into the new tables
+    bind = op.get_bind()
+    genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    genre_ids = {}
+    for table, link_table, key in (('Venue', 'venue_genres', 'venue_id'),
+                                   ('Artist', 'artist_genres', 'artist_id')):
+        owner = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link = sa.table(link_table, sa.column(key, sa.Integer), sa.column('genre_id', sa.Integer))
+        links = []
+        for owner_id, genres in bind.execute(sa.select(owner.c.id, owner.c.genres)):
+            for name in set(parse_genres(genres)):
+                if name not in genre_ids:
+                    genre_ids[name] = bind.execute(
+                        genre.insert().values(name=name).returning(genre.c.id)).scalar()
+                links.append({key: owner_id, 'genre_id': genre_ids[name]})
+        if links:
+            op.bulk_insert(link, links)
+
+    op.drop_column('Venue', 'genres')
+    op.drop_column('Artist', 'genres')
+
+
+def downgrade():
+    op.add_column('Artist', sa.Column('genres', sa.VARCHAR(length=120), nullable=True))
+    op.add_column('Venue', sa.Column('genres', sa.VARCHAR(length=120), nullable=True))
+
+    bind = op.get_bind()
+    genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    for table, link_table, key in (('Venue', 'venue_genres', 'venue_id'),
+                                   ('Artist', 'artist_genres', 'artist_id')):
+        owner = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        link = sa.table(link_table, sa.column(key, sa.Integer), sa.column('genre_id', sa.Integer))
+        names = {}
+        rows = bind.execute(sa.select(link.c[key], genre.c.name).
+                            select_from(link.join(genre, link.c.genre_id == genre.c.id)).
+                            order_by(genre.c.name))
+        for owner_id, name in rows:
+            names.setdefault(owner_id, []).append(name)
+        for owner_id, owner_names in names.items():
+            bind.execute(owner.update().where(owner.c.id == owner_id).
+                         values(genres=format_genres(owner_names)))
+
+    op.drop_index(op.f('ix_artist_genres_genre_id'), table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index(op.f('ix_venue_genres_genre_id'), table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
@@ -0,0 +1,27 @@
+"""add image_key to venues and artists for local thumbnails.
+
+Revision ID: a7d3e5c1f920
+Revises: f2c6d81b3a94
+Create Date: 2026-10-18 15:48:05.113962
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5c1f920'
+down_revision = 'f2c6d81b3a94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing links are thumbnailed by 'flask images'
+    op.add_column('Venue', sa.Column('image_key', sa.String(length=40), nullable=True))
+    op.add_column('Artist', sa.Column('image_key', sa.String(length=40), nullable=True))
+
+
+def downgrade():
+    op.drop_column('Artist', 'image_key')
+    op.drop_column('Venue', 'image_key')
@@ -0,0 +1,56 @@
+"""add end_time to shows and forbid overlapping bookings.
+
+Revision ID: b5e08d4c7a31
+Revises: a7d3e5c1f920
+Create Date: 2026-10-18 16:52:40.276115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e08d4c7a31'
+down_revision = 'a7d3e5c1f920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing shows are taken to last two hours (scheduling.DEFAULT_DURATION)
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        op.execute('UPDATE "Show" SET end_time = start_time + interval \'2 hours\'')
+    else:
+        op.execute('UPDATE "Show" SET end_time = datetime(start_time, \'+2 hours\')')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    if not postgres:
+        return
+    for column in ('venue_id', 'artist_id'):
+        overlaps = op.get_bind().execute(sa.text(
+            'SELECT a.id, b.id FROM "Show" a JOIN "Show" b ON a.{column} = b.{column} '
+            'AND a.id < b.id AND a.start_time < b.end_time AND b.start_time < a.end_time '
+            'LIMIT 20'.format(column=column))).all()
+        if overlaps:
+            raise RuntimeError(
+                'shows overlap on %s, resolve these before upgrading: %s' % (
+                    column, ', '.join('%s/%s' % pair for pair in overlaps)))
+    # gist on plain integers needs btree_gist
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in (('show_venue_no_overlap', 'venue_id'),
+                         ('show_artist_no_overlap', 'artist_id')):
+        op.execute(
+            'ALTER TABLE "Show" ADD CONSTRAINT {name} EXCLUDE USING gist '
+            '({column} WITH =, tsrange(start_time, end_time) WITH &&)'
+            .format(name=name, column=column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT show_artist_no_overlap')
+        op.execute('ALTER TABLE "Show" DROP CONSTRAINT show_venue_no_overlap')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
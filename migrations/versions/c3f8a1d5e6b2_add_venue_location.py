@@ -0,0 +1,31 @@
+"""add latitude, longitude and geohash to venues.
+
+Revision ID: c3f8a1d5e6b2
+Revises: b5e08d4c7a31
+Create Date: 2026-10-18 17:12:44.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f8a1d5e6b2'
+down_revision = 'b5e08d4c7a31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing venues are located by 'flask geocode'
+    op.add_column('Venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('Venue', sa.Column('geohash', sa.String(length=12), nullable=True))
+    op.create_index('ix_venue_geohash', 'Venue', ['geohash'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_venue_geohash', table_name='Venue')
+    op.drop_column('Venue', 'geohash')
+    op.drop_column('Venue', 'longitude')
+    op.drop_column('Venue', 'latitude')
@@ -0,0 +1,35 @@
+"""add updated_at columns for incremental exports.
+
+Revision ID: c81d0f6a2e47
+Revises: 9b7e41c2d5a0
+Create Date: 2026-10-18 11:26:52.870314
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81d0f6a2e47'
+down_revision = '9b7e41c2d5a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing rows are stamped with the migration time, in UTC like the
+    # models' datetime.utcnow (the database's now() is in its session zone)
+    now = datetime.utcnow()
+    for table in ('Venue', 'Artist', 'Show'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.get_bind().execute(sa.text('UPDATE "%s" SET updated_at = :now' % table), {"now": now})
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), nullable=False)
+        op.create_index(op.f('ix_%s_updated_at' % table), table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('Show', 'Artist', 'Venue'):
+        op.drop_index(op.f('ix_%s_updated_at' % table), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,41 @@
+"""add archived_at to venues and artists.
+
+Revision ID: d7a2c94e1f36
+Revises: c3f8a1d5e6b2
+Create Date: 2026-10-18 19:03:27.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2c94e1f36'
+down_revision = 'c3f8a1d5e6b2'
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text('archived_at IS NULL')
+ARCHIVED = sa.text('archived_at IS NOT NULL')
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.add_column('Artist', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_venue_active_state_city', 'Venue', ['state', 'city', 'name'],
+                    unique=False, postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_venue_archived_at', 'Venue', ['archived_at'],
+                    unique=False, postgresql_where=ARCHIVED, sqlite_where=ARCHIVED)
+    op.create_index('ix_artist_active_id', 'Artist', ['id'],
+                    unique=False, postgresql_where=ACTIVE, sqlite_where=ACTIVE)
+    op.create_index('ix_artist_archived_at', 'Artist', ['archived_at'],
+                    unique=False, postgresql_where=ARCHIVED, sqlite_where=ARCHIVED)
+
+
+def downgrade():
+    op.drop_index('ix_artist_archived_at', table_name='Artist')
+    op.drop_index('ix_artist_active_id', table_name='Artist')
+    op.drop_index('ix_venue_archived_at', table_name='Venue')
+    op.drop_index('ix_venue_active_state_city', table_name='Venue')
+    op.drop_column('Artist', 'archived_at')
+    op.drop_column('Venue', 'archived_at')
@@ -0,0 +1,43 @@
+"""add the per-city venue summary behind /venues.
+
+Revision ID: e9b4f2a6c850
+Revises: d7a2c94e1f36
+Create Date: 2026-10-18 20:41:09.562713
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9b4f2a6c850'
+down_revision = 'd7a2c94e1f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    venue_area = op.create_table('VenueArea',
+    sa.Column('state', sa.String(length=120), nullable=False),
+    sa.Column('city', sa.String(length=120), nullable=False),
+    sa.Column('venues', sa.JSON(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('state', 'city')
+    )
+
+    # same as 'flask refresh-areas'
+    now = datetime.utcnow()
+    areas = {}
+    for row in op.get_bind().execute(sa.text(
+            'SELECT id, name, city, state, upcoming_shows_count FROM "Venue" '
+            'WHERE archived_at IS NULL ORDER BY name, id')):
+        areas.setdefault((row.state or '', row.city or ''), []).append(
+            {"id": row.id, "name": row.name, "num_upcoming_shows": row.upcoming_shows_count})
+    op.bulk_insert(venue_area, [
+        {"state": state, "city": city, "venues": venues, "refreshed_at": now}
+        for (state, city), venues in sorted(areas.items())])
+
+
+def downgrade():
+    op.drop_table('VenueArea')
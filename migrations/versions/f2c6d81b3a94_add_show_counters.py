@@ -0,0 +1,52 @@
+"""add upcoming/past show counters to venues and artists.
+
+Revision ID: f2c6d81b3a94
+Revises: e4a9b3f07c15
+Create Date: 2026-10-18 14:37:21.408816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6d81b3a94'
+down_revision = 'e4a9b3f07c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Show', sa.Column('counted_past', sa.Boolean(), nullable=False,
+                                    server_default=sa.false()))
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), nullable=False,
+                                       server_default='0'))
+    op.create_index('ix_show_upcoming_start_time', 'Show', ['start_time'], unique=False,
+                    postgresql_where=sa.text('NOT counted_past'),
+                    sqlite_where=sa.text('NOT counted_past'))
+
+    # same as 'flask recount'; start times are naive local times
+    if op.get_bind().dialect.name == 'sqlite':
+        now = "datetime('now', 'localtime')"
+    else:
+        now = 'LOCALTIMESTAMP'
+    op.execute('UPDATE "Show" SET counted_past = (start_time < %s)' % now)
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(
+            'UPDATE "{table}" SET '
+            'upcoming_shows_count = (SELECT count(*) FROM "Show" '
+            'WHERE "Show".{key} = "{table}".id AND NOT "Show".counted_past), '
+            'past_shows_count = (SELECT count(*) FROM "Show" '
+            'WHERE "Show".{key} = "{table}".id AND "Show".counted_past)'
+            .format(table=table, key=key))
+
+
+def downgrade():
+    op.drop_index('ix_show_upcoming_start_time', table_name='Show')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
+    op.drop_column('Show', 'counted_past')
@@ -0,0 +1,31 @@
+"""record when the venue summary was last rebuilt in full.
+
+Revision ID: f7d1a3c6b942
+Revises: e9b4f2a6c850
+Create Date: 2026-10-19 10:12:40.118305
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d1a3c6b942'
+down_revision = 'e9b4f2a6c850'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    refresh = op.create_table('VenueAreaRefresh',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # VenueArea has been kept up to date by the write hooks
+    op.bulk_insert(refresh, [{"id": 1, "refreshed_at": datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('VenueAreaRefresh')
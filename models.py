@@ -1,61 +1,175 @@
+from datetime import datetime
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores ON DELETE CASCADE unless asked, on every connection
+    if type(dbapi_connection).__module__.startswith('sqlite3'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
+venue_genres = db.Table('venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+artist_genres = db.Table('artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<Genre {self.id} {self.name}>'
+
 
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_venue_city_state', 'city', 'state'),
+        db.Index('ix_venue_geohash', 'geohash'),
+        # listings only read venues that aren't archived (deletion.py)
+        db.Index('ix_venue_active_state_city', 'state', 'city', 'name',
+                 postgresql_where=db.text('archived_at IS NULL'),
+                 sqlite_where=db.text('archived_at IS NULL')),
+        db.Index('ix_venue_archived_at', 'archived_at',
+                 postgresql_where=db.text('archived_at IS NOT NULL'),
+                 sqlite_where=db.text('archived_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     address = db.Column(db.String(120))
+    # set from city and state, see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
     phone = db.Column(db.String(120),  nullable=False)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
     # DONE: implement any missing fields, as a database migration using Flask-Migrate
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=venue_genres, lazy='selectin',
+                             order_by='Genre.name', backref=db.backref('venues', lazy=True))
     image_link = db.Column(db.String(500))
+    # local thumbnails of image_link, see images.py
+    image_key = db.Column(db.String(40))
     website_link = db.Column(db.String(500))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    venue_show = db.relationship('Show', backref='venue_show', lazy=True)
+    # shows go with their venue through ON DELETE CASCADE, without being loaded
+    venue_show = db.relationship('Show', backref='venue_show', lazy=True, passive_deletes=True)
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    # set when archived: hidden everywhere until restored or purged
+    archived_at = db.Column(db.DateTime)
 
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        db.Index('ix_artist_active_id', 'id',
+                 postgresql_where=db.text('archived_at IS NULL'),
+                 sqlite_where=db.text('archived_at IS NULL')),
+        db.Index('ix_artist_archived_at', 'archived_at',
+                 postgresql_where=db.text('archived_at IS NOT NULL'),
+                 sqlite_where=db.text('archived_at IS NOT NULL')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120),  nullable=False)
-    genres = db.Column(db.String(120))
+    genres = db.relationship('Genre', secondary=artist_genres, lazy='selectin',
+                             order_by='Genre.name', backref=db.backref('artists', lazy=True))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
 
     # DONE: implement any missing fields, as a database migration using Flask-Migrate
     image_link = db.Column(db.String(500))
+    # local thumbnails of image_link, see images.py
+    image_key = db.Column(db.String(40))
     website_link = db.Column(db.String(500))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    artist_show = db.relationship('Show', backref='artist_show', lazy=True)
+    artist_show = db.relationship('Show', backref='artist_show', lazy=True, passive_deletes=True)
+    # maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+    # set when archived: hidden everywhere until restored or purged
+    archived_at = db.Column(db.DateTime)
 
 # Done Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+        # upcoming shows still to be rolled over, see counters.py
+        db.Index('ix_show_upcoming_start_time', 'start_time',
+                 postgresql_where=db.text('NOT counted_past'),
+                 sqlite_where=db.text('NOT counted_past')),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    # shows at one venue or by one artist may not overlap (scheduling.py)
+    end_time = db.Column(db.DateTime, nullable=False)
+    # which counter of its venue and artist the show is in (counters.py)
+    counted_past = db.Column(db.Boolean, nullable=False, default=False,
+                             server_default=db.false())
+    updated_at = db.Column(db.DateTime, nullable=False, index=True,
+                           default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
+
+class VenueArea(db.Model):
+    # one row per city for /venues, kept up to date by areas.py
+    __tablename__ = 'VenueArea'
+
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    # [{"id", "name", "num_upcoming_shows"}, ...] of the active venues, by name
+    venues = db.Column(db.JSON, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
 
     def __repr__(self):
-        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
\ No newline at end of file
+        return f'<VenueArea {self.city}, {self.state}>'
+
+
+class VenueAreaRefresh(db.Model):
+    # a single row: when 'flask refresh-areas' last rebuilt all of VenueArea
+    __tablename__ = 'VenueAreaRefresh'
+
+    id = db.Column(db.Integer, primary_key=True)
+    refreshed_at = db.Column(db.DateTime, nullable=False)
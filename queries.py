@@ -0,0 +1,222 @@
+from datetime import datetime
+from sqlalchemy import select, and_, or_
+from models import db, Venue, Artist, Show, Genre, venue_genres, artist_genres
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+# Archived venues and artists (deletion.py) are left out of every listing,
+# and so are their shows.
+#
+# The pages the async server answers itself (async_views.py) run the same
+# statements on an AsyncSession, so those are built by *_statement()
+# functions, and turned into what the templates expect by the helpers next
+# to them.
+
+
+def active(model):
+    return model.archived_at.is_(None)
+
+
+def active_statement(model, owner_id):
+    return select(model).where(model.id == owner_id, active(model))
+
+
+def get_active(model, owner_id):
+    # the venue or artist with this id, or None if missing or archived
+    return db.session.execute(active_statement(model, owner_id)).scalars().first()
+
+
+def venue_areas_statement():
+    return select(Venue.id, Venue.name, Venue.city, Venue.state,
+                  Venue.upcoming_shows_count.label('num_upcoming_shows')). \
+        where(active(Venue)). \
+        order_by(Venue.state, Venue.city, Venue.name)
+
+
+def venue_areas():
+    # builds the city/state -> venues -> num_upcoming_shows tree for /venues
+    # from the venue table alone (counts are kept by counters.py)
+    return group_areas(db.session.execute(venue_areas_statement()).all())
+
+
+def group_areas(rows):
+    # rows come ordered by state and city; grouping is done here in python
+    areas = []
+    by_location = {}
+    for row in rows:
+        area = by_location.get((row.city, row.state))
+        if area is None:
+            area = {"city": row.city, "state": row.state, "venues": []}
+            by_location[(row.city, row.state)] = area
+            areas.append(area)
+        area["venues"].append({
+            "id": row.id,
+            "name": row.name,
+            "num_upcoming_shows": row.num_upcoming_shows
+        })
+    return areas
+
+
+def _split_shows(rows, now):
+    # rows come back ordered by start_time, so both lists stay ordered.
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        show = row._asdict()
+        if row.start_time >= now:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    return past_shows, upcoming_shows
+
+
+def venue_shows_statement(venue_id):
+    # every show at a venue with its artist, by start time
+    return select(Show.id,
+                  Show.start_time,
+                  Artist.id.label('artist_id'),
+                  Artist.name.label('artist_name'),
+                  Artist.image_link.label('artist_image_link'),
+                  Artist.image_key.label('artist_image_key')). \
+        join(Artist, Show.artist_id == Artist.id). \
+        where(Show.venue_id == venue_id, active(Artist)). \
+        order_by(Show.start_time)
+
+
+def artist_shows_statement(artist_id):
+    # every show by an artist with its venue, by start time
+    return select(Show.id,
+                  Show.start_time,
+                  Venue.id.label('venue_id'),
+                  Venue.name.label('venue_name'),
+                  Venue.image_link.label('venue_image_link'),
+                  Venue.image_key.label('venue_image_key')). \
+        join(Venue, Show.venue_id == Venue.id). \
+        where(Show.artist_id == artist_id, active(Venue)). \
+        order_by(Show.start_time)
+
+
+def venue_show_history(venue_id, now=None):
+    # every show at a venue from one joined query, split into (past, upcoming)
+    now = now or datetime.now()
+    return _split_shows(db.session.execute(venue_shows_statement(venue_id)).all(), now)
+
+
+def artist_show_history(artist_id, now=None):
+    # every show by an artist from one joined query, split into (past, upcoming)
+    now = now or datetime.now()
+    return _split_shows(db.session.execute(artist_shows_statement(artist_id)).all(), now)
+
+
+def encode_show_cursor(start_time, show_id):
+    return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_show_cursor(cursor):
+    # raises ValueError on a malformed cursor
+    start_time, show_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def shows_page_statement(cursor=None, per_page=20):
+    # raises ValueError on a malformed cursor
+    statement = select(
+        Show.id,
+        Show.start_time,
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Artist.image_key.label('artist_image_key')). \
+        join(Venue, Show.venue_id == Venue.id). \
+        join(Artist, Show.artist_id == Artist.id). \
+        where(active(Venue), active(Artist))
+    if cursor:
+        start_time, show_id = decode_show_cursor(cursor)
+        statement = statement.where(or_(
+            Show.start_time < start_time,
+            and_(Show.start_time == start_time, Show.id < show_id)))
+    return statement.order_by(Show.start_time.desc(), Show.id.desc()).limit(per_page + 1)
+
+
+def shows_page(cursor=None, per_page=20):
+    # one page of the /shows feed, newest first, keyed on (start_time, id).
+    # returns (shows, next_cursor); next_cursor is None on the last page.
+    rows = db.session.execute(shows_page_statement(cursor, per_page)).all()
+    return page_of_shows(rows, per_page)
+
+
+def page_of_shows(rows, per_page):
+    # the extra row fetched past the page only says there is a next one
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_show_cursor(rows[-1].start_time, rows[-1].id)
+    shows = [row._asdict() for row in rows]
+    return shows, next_cursor
+
+
+def get_or_create_genres(names):
+    # maps submitted genre names onto Genre rows, creating any that are new
+    names = sorted({name.strip() for name in names if name and name.strip()})
+    if not names:
+        return []
+    existing = {genre.name: genre for genre in
+                Genre.query.filter(Genre.name.in_(names)).all()}
+    return [existing.get(name) or Genre(name=name) for name in names]
+
+
+def genre_directory(genre, city=None, state=None):
+    # venues and artists tagged with a genre, optionally narrowed to one area.
+    # walks the genre_id index on the association tables instead of scanning.
+    venues = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state). \
+        join(venue_genres, venue_genres.c.venue_id == Venue.id). \
+        filter(venue_genres.c.genre_id == genre.id, active(Venue))
+    artists = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state). \
+        join(artist_genres, artist_genres.c.artist_id == Artist.id). \
+        filter(artist_genres.c.genre_id == genre.id, active(Artist))
+    if city:
+        venues = venues.filter(Venue.city == city)
+        artists = artists.filter(Artist.city == city)
+    if state:
+        venues = venues.filter(Venue.state == state)
+        artists = artists.filter(Artist.state == state)
+    return {
+        "venues": venues.order_by(Venue.name).all(),
+        "artists": artists.order_by(Artist.name).all()
+    }
+
+
+def artist_ids_for_venue(venue_id):
+    rows = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+    return [row.artist_id for row in rows]
+
+
+def venue_ids_for_artist(artist_id):
+    rows = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+    return [row.venue_id for row in rows]
+
+
+def artist_list_statement():
+    return select(Artist.id, Artist.name,
+                  Artist.upcoming_shows_count.label('num_upcoming_shows')). \
+        where(active(Artist)). \
+        order_by(Artist.id)
+
+
+def artist_list():
+    # every artist for /artists, with counts kept by counters.py
+    return db.session.execute(artist_list_statement()).all()
+
+
+def artists_page(page=1, per_page=20):
+    # one page of artists by id; returns (artists, has_next)
+    rows = db.session.query(Artist.id, Artist.name, Artist.city, Artist.state,
+                            Artist.upcoming_shows_count.label('num_upcoming_shows')). \
+        filter(active(Artist)). \
+        order_by(Artist.id). \
+        limit(per_page + 1).offset((page - 1) * per_page).all()
+    return [row._asdict() for row in rows[:per_page]], len(rows) > per_page
@@ -0,0 +1,136 @@
+import time
+import threading
+from itertools import cycle
+from flask import current_app, request, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session as BaseSession
+
+#----------------------------------------------------------------------------#
+# Read replicas.
+#----------------------------------------------------------------------------#
+
+# DATABASE_REPLICA_URLS=postgresql://replica1/fyyur,postgresql://replica2/fyyur
+#
+# GET and HEAD requests read from the replicas, taken in turn, each request
+# sending all its statements to the same one so that a page never mixes two
+# replicas' snapshots. A replica is pinged at most once every
+# REPLICA_CHECK_INTERVAL seconds and skipped while the ping fails; with no
+# healthy replica, reads fall back to the primary.
+#
+# Everything else uses the primary: flushes, INSERT/UPDATE/DELETE and
+# SELECT ... FOR UPDATE statements (and the rest of the request after one of
+# those), CLI commands, and any request from a browser that committed a
+# write within the last REPLICA_STICKY_SECONDS, so the redirect after an
+# edit doesn't read a replica that hasn't caught up. Read-only POSTs (the
+# search forms) don't pin the browser to the primary.
+
+STICKY_COOKIE = 'fyyur_primary'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class Replica(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0
+
+
+class ReplicaRouter(object):
+
+    def __init__(self, app=None, engine_options=None):
+        self.replicas = []
+        self._next = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, engine_options)
+
+    def init_app(self, app, engine_options=None):
+        # engine_options(config, uri) gives the pool settings for each replica
+        self.replicas = [
+            Replica(create_engine(uri, **(engine_options(app.config, uri) if engine_options else {})))
+            for uri in app.config.get('SQLALCHEMY_REPLICA_URIS', [])]
+        self._next = cycle(self.replicas)
+        self.check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        app.extensions['replicas'] = self
+        if self.replicas:
+            app.after_request(self._stick_after_write)
+
+    def _stick_after_write(self, response):
+        if g.get('_committed'):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=self.sticky_seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def use_replica(self):
+        return (has_request_context() and request.method in READ_METHODS
+                and STICKY_COOKIE not in request.cookies)
+
+    def _check(self, replica):
+        now = time.monotonic()
+        if now - replica.checked_at < self.check_interval:
+            return replica.healthy
+        replica.checked_at = now
+        try:
+            with replica.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+        except Exception as e:
+            if replica.healthy:
+                current_app.logger.warning('replica %s is down: %s', replica.engine.url, e)
+            replica.healthy = False
+        else:
+            replica.healthy = True
+        return replica.healthy
+
+    def replica_engine(self):
+        # next healthy replica in turn, or None
+        for _ in range(len(self.replicas)):
+            with self._lock:
+                replica = next(self._next)
+            if self._check(replica):
+                return replica.engine
+        return None
+
+    def request_engine(self):
+        # the replica this request reads from, picked on its first statement
+        if '_replica_engine' not in g:
+            g._replica_engine = self.replica_engine()
+        return g._replica_engine
+
+    def status(self):
+        return [{"url": replica.engine.url.render_as_string(hide_password=True),
+                 "healthy": replica.healthy} for replica in self.replicas]
+
+
+def _writes(clause):
+    return clause is not None and (getattr(clause, 'is_dml', False) or
+                                   getattr(clause, '_for_update_arg', None) is not None)
+
+
+class RoutingSession(Session):
+    # db.session for the app: sends read-only requests to a replica
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            router = current_app.extensions.get('replicas')
+            if router is not None and router.replicas and router.use_replica():
+                if self._flushing or _writes(clause):
+                    # and read this request's own writes from the primary
+                    g._replica_engine = None
+                else:
+                    engine = router.request_engine()
+                    if engine is not None:
+                        return engine
+        return super(RoutingSession, self).get_bind(mapper=mapper, clause=clause, bind=bind,
+                                                    **kwargs)
+
+
+@event.listens_for(BaseSession, 'after_commit')
+def _note_commit(session):
+    if has_request_context():
+        g._committed = True
+
+
+replicas = ReplicaRouter()
@@ -0,0 +1,145 @@
+from datetime import timedelta
+from zoneinfo import ZoneInfo
+import dateutil.parser
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from models import db, Show
+
+#----------------------------------------------------------------------------#
+# Scheduling conflicts.
+#----------------------------------------------------------------------------#
+
+# A show occupies [start_time, end_time) at its venue and for its artist, and
+# two shows sharing either may not overlap. On Postgres this is enforced by
+# the exclusion constraints show_venue_no_overlap / show_artist_no_overlap
+# (migration b5e08d4c7a31); check_lineup() finds conflicts up front so they
+# can be reported nicely, and is the only check on SQLite.
+#
+# check_lineup() takes a whole list of proposed shows: it loads the existing
+# shows of the venues and artists involved with one query per side, puts
+# those and the proposals into an IntervalIndex per venue/artist and asks
+# each proposal what it overlaps, so n proposals against m existing shows
+# cost O((n + m) log(n + m)) plus the conflicts found, not O(n * m).
+
+DEFAULT_DURATION = timedelta(hours=2)
+MAX_DURATION = timedelta(hours=24)
+
+SIDES = ('venue_id', 'artist_id')
+
+
+class IntervalIndex(object):
+    # static interval tree over half-open [start, end) intervals. items are
+    # kept sorted by start as an implicit balanced tree (the middle element of
+    # each range is its root) and max_end holds the latest end in each subtree.
+
+    def __init__(self, intervals):
+        # intervals: (start, end, value)
+        self.items = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.max_end = [None] * len(self.items)
+        self._build(0, len(self.items) - 1)
+
+    def _build(self, lo, hi):
+        if lo > hi:
+            return None
+        mid = (lo + hi) // 2
+        latest = self.items[mid][1]
+        for child in (self._build(lo, mid - 1), self._build(mid + 1, hi)):
+            if child is not None and child > latest:
+                latest = child
+        self.max_end[mid] = latest
+        return latest
+
+    def overlapping(self, start, end):
+        # values of every interval overlapping [start, end)
+        found = []
+        ranges = [(0, len(self.items) - 1)]
+        while ranges:
+            lo, hi = ranges.pop()
+            if lo > hi:
+                continue
+            mid = (lo + hi) // 2
+            if self.max_end[mid] <= start:
+                # everything below here ends before the query starts
+                continue
+            ranges.append((lo, mid - 1))
+            item_start, item_end, value = self.items[mid]
+            if item_start < end:
+                if item_end > start:
+                    found.append(value)
+                ranges.append((mid + 1, hi))
+        return found
+
+
+def show_time(value):
+    # a start or end time as shows are stored: naive, in SERVER_TIMEZONE or
+    # the server's local zone (see formatting.py). strings are parsed and
+    # values with an offset converted.
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    if value is not None and value.tzinfo is not None:
+        zone = current_app.config.get('SERVER_TIMEZONE') if has_app_context() else None
+        value = value.astimezone(ZoneInfo(zone) if zone else None).replace(tzinfo=None)
+    return value
+
+
+def end_of(show):
+    return show.get('end_time') or show['start_time'] + DEFAULT_DURATION
+
+
+def _existing_shows(side, keys, start, end):
+    # shows already booked for these venues/artists that could overlap [start, end)
+    column = getattr(Show, side)
+    return db.session.query(Show.id, column.label('key'), Show.start_time, Show.end_time). \
+        filter(column.in_(keys),
+               Show.start_time < end,
+               Show.start_time > start - MAX_DURATION,
+               Show.end_time > start).all()
+
+
+def check_lineup(shows, exclude_ids=()):
+    # shows: dicts with venue_id, artist_id, start_time and optionally
+    # end_time. returns a list of conflicts, each
+    #   {"index": i, "on": "venue_id", "show_id": id}       an existing show
+    #   {"index": i, "on": "venue_id", "other_index": j}    an earlier proposal
+    if not shows:
+        return []
+    spans = [(show['start_time'], end_of(show)) for show in shows]
+    first = min(start for start, _ in spans)
+    last = max(end for _, end in spans)
+    conflicts = []
+    for side in SIDES:
+        by_key = {}
+        for index, show in enumerate(shows):
+            by_key.setdefault(show[side], []).append(
+                (spans[index][0], spans[index][1], ('index', index)))
+        for row in _existing_shows(side, list(by_key), first, last):
+            if row.id not in exclude_ids:
+                by_key[row.key].append((row.start_time, row.end_time, ('show_id', row.id)))
+        for intervals in by_key.values():
+            if len(intervals) < 2:
+                continue
+            index = IntervalIndex(intervals)
+            for start, end, (kind, value) in intervals:
+                if kind != 'index':
+                    continue
+                for other_kind, other in index.overlapping(start, end):
+                    if other_kind == 'show_id':
+                        conflicts.append({"index": value, "on": side, "show_id": other})
+                    elif other < value:
+                        conflicts.append({"index": value, "on": side, "other_index": other})
+    return sorted(conflicts, key=lambda conflict: (conflict["index"], conflict["on"]))
+
+
+def describe(conflict):
+    who = 'venue' if conflict["on"] == 'venue_id' else 'artist'
+    if 'show_id' in conflict:
+        return 'The %s is already booked then (show %s)' % (who, conflict["show_id"])
+    return 'The %s is double-booked with row %d' % (who, conflict["other_index"] + 1)
+
+
+@event.listens_for(Show, 'before_insert')
+def _default_end_time(mapper, connection, target):
+    target.start_time = show_time(target.start_time)
+    target.end_time = show_time(target.end_time)
+    if target.end_time is None and target.start_time is not None:
+        target.end_time = target.start_time + DEFAULT_DURATION
@@ -0,0 +1,151 @@
+import threading
+from sqlalchemy import select, func, text, event
+from models import db, Venue, Artist
+from queries import active
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+# Postgres serves name searches from the pg_trgm GIN indexes added in the
+# 5f3c2a9d81be migration. SQLite (local development) gets an FTS5 trigram
+# table per model, kept in sync with triggers and created on first use if
+# the database predates it. db.create_all() and db.drop_all() build and
+# drop both along with the tables, so tests and benchmarks search with them.
+#
+# search_statements() builds the count and page queries without running
+# them, so async_views.py can send both at once.
+
+_fts_ready = set()
+_fts_lock = threading.Lock()
+
+
+def _like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return '%' + escaped + '%'
+
+
+def _ensure_fts(engine, table):
+    if (engine.url, table) in _fts_ready:
+        return
+    with _fts_lock:
+        # threaded servers can get here from several requests at once
+        if (engine.url, table) in _fts_ready:
+            return
+        with engine.begin() as connection:
+            create_fts(connection, table)
+        _fts_ready.add((engine.url, table))
+
+
+def create_fts(connection, table):
+    # the FTS table and its triggers, unless they exist
+    fts = table + '_fts'
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': fts}).first()
+    if not exists:
+        connection.execute(text(
+            'CREATE VIRTUAL TABLE "{fts}" USING fts5('
+            'name, content=\'{table}\', content_rowid=\'id\', tokenize=\'trigram\')'
+            .format(fts=fts, table=table)))
+        connection.execute(text(
+            'CREATE TRIGGER "{fts}_ai" AFTER INSERT ON "{table}" BEGIN '
+            'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); END'
+            .format(fts=fts, table=table)))
+        connection.execute(text(
+            'CREATE TRIGGER "{fts}_ad" AFTER DELETE ON "{table}" BEGIN '
+            'INSERT INTO "{fts}"("{fts}", rowid, name) VALUES (\'delete\', old.id, old.name); END'
+            .format(fts=fts, table=table)))
+        connection.execute(text(
+            'CREATE TRIGGER "{fts}_au" AFTER UPDATE OF name ON "{table}" BEGIN '
+            'INSERT INTO "{fts}"("{fts}", rowid, name) VALUES (\'delete\', old.id, old.name); '
+            'INSERT INTO "{fts}"(rowid, name) VALUES (new.id, new.name); END'
+            .format(fts=fts, table=table)))
+        connection.execute(text(
+            'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')'.format(fts=fts)))
+
+
+TRIGRAM_INDEXES = {'Venue': 'ix_venue_name_trgm', 'Artist': 'ix_artist_name_trgm'}
+
+
+@event.listens_for(Venue.__table__, 'after_create')
+@event.listens_for(Artist.__table__, 'after_create')
+def _create_search_index(table, connection, **kwargs):
+    # what the migrations and _ensure_fts() would have added
+    if connection.dialect.name == 'sqlite':
+        create_fts(connection, table.name)
+        _fts_ready.add((connection.engine.url, table.name))
+    elif connection.dialect.name == 'postgresql':
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS {index} ON "{table}" USING gin (name gin_trgm_ops)'
+            .format(index=TRIGRAM_INDEXES[table.name], table=table.name)))
+
+
+@event.listens_for(Venue.__table__, 'before_drop')
+@event.listens_for(Artist.__table__, 'before_drop')
+def _drop_search_index(table, connection, **kwargs):
+    # the FTS table would outlive its triggers, which go with the table
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS "%s_fts"' % table.name))
+        _fts_ready.discard((connection.engine.url, table.name))
+
+
+def _fts_statements(model, term, page, per_page):
+    table = model.__tablename__
+    match = '"' + term.replace('"', '""') + '"'
+    # archived rows stay in the index; the join leaves them out
+    matches = ('FROM "{fts}" JOIN "{table}" ON "{table}".id = "{fts}".rowid '
+               'WHERE "{fts}" MATCH :match AND "{table}".archived_at IS NULL'
+               .format(fts=table + '_fts', table=table))
+    count = text('SELECT count(*) ' + matches).bindparams(match=match)
+    rows = text('SELECT "{fts}".rowid AS id, "{fts}".name '.format(fts=table + '_fts') +
+                matches + ' ORDER BY rank LIMIT :limit OFFSET :offset'). \
+        bindparams(match=match, limit=per_page, offset=(page - 1) * per_page)
+    return count, rows
+
+
+def _like_statements(model, term, page, per_page, rank_by_similarity):
+    matches = select(model.id, model.name). \
+        where(model.name.ilike(_like_pattern(term), escape='\\'), active(model))
+    count = select(func.count()).select_from(matches.subquery())
+    if rank_by_similarity:
+        rows = matches.order_by(func.similarity(model.name, term).desc(), model.name)
+    else:
+        rows = matches.order_by(model.name)
+    return count, rows.limit(per_page).offset((page - 1) * per_page)
+
+
+def uses_fts(dialect, term):
+    # the trigram tokenizer can't match anything shorter than 3 characters
+    return dialect == 'sqlite' and len(term) >= 3
+
+
+def search_statements(model, term, dialect, page=1, per_page=20):
+    # (count statement, page statement) for a stripped search term; on
+    # SQLite, the FTS table must exist (create_fts) when uses_fts() says so
+    if uses_fts(dialect, term):
+        return _fts_statements(model, term, page, per_page)
+    return _like_statements(model, term, page, per_page,
+                            rank_by_similarity=dialect == 'postgresql')
+
+
+def search_by_name(model, term, page=1, per_page=20):
+    # ranked, case-insensitive partial match on model.name.
+    # returns the {"count", "data"} shape the search_*.html templates expect.
+    term = (term or '').strip()
+    engine = db.session.get_bind()
+    if uses_fts(engine.dialect.name, term):
+        _ensure_fts(engine, model.__tablename__)
+    count, rows = search_statements(model, term, engine.dialect.name, page, per_page)
+    return search_results(db.session.execute(count).scalar(),
+                          db.session.execute(rows).all(), page, per_page)
+
+
+def search_results(count, rows, page, per_page):
+    return {
+        "count": count,
+        "data": rows,
+        "page": page,
+        "has_next": page * per_page < count
+    }
@@ -2,3 +2,101 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Show times are rendered in the timezone named by the 'tz' cookie (see
+// formatting.py): keep it set to the browser's, so the pages after the
+// first one use it.
+(function () {
+  var zone = window.Intl && Intl.DateTimeFormat().resolvedOptions().timeZone;
+  if (!zone || !/^[A-Za-z0-9_+\-\/]+$/.test(zone) ||
+      document.cookie.split('; ').indexOf('tz=' + zone) !== -1) {
+    return;
+  }
+  document.cookie = 'tz=' + zone + '; path=/; max-age=31536000; samesite=lax';
+})();
+
+// Delete buttons on the venue and artist pages: DELETE the record, then go
+// back to the homepage.
+document.addEventListener('click', function (e) {
+  var button = e.target.closest('[data-delete-url]');
+  if (!button || !window.confirm('Delete this and all its shows?')) {
+    return;
+  }
+  button.disabled = true;
+  fetch(button.getAttribute('data-delete-url'), {method: 'DELETE'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error('status ' + response.status);
+      }
+      window.location.href = '/';
+    })
+    .catch(function () {
+      button.disabled = false;
+      window.alert('Sorry, that could not be deleted.');
+    });
+});
+
+// Search boxes with data-autocomplete="venues" or "artists": suggest names
+// from /autocomplete once typing pauses, linking straight to the page.
+(function () {
+  var DELAY = 150;
+
+  function suggestions(input) {
+    var list = input.parentNode.querySelector('.autocomplete');
+    if (!list) {
+      list = document.createElement('ul');
+      list.className = 'autocomplete';
+      input.parentNode.appendChild(list);
+    }
+    return list;
+  }
+
+  function render(input, items) {
+    var list = suggestions(input);
+    var kind = input.getAttribute('data-autocomplete');
+    list.innerHTML = '';
+    items.forEach(function (item) {
+      var link = document.createElement('a');
+      link.href = '/' + kind + '/' + item.id;
+      link.textContent = item.name;
+      var entry = document.createElement('li');
+      entry.appendChild(link);
+      list.appendChild(entry);
+    });
+    list.hidden = !items.length;
+  }
+
+  document.querySelectorAll('[data-autocomplete]').forEach(function (input) {
+    var timer = null;
+    var latest = 0;
+    input.addEventListener('input', function () {
+      window.clearTimeout(timer);
+      var term = input.value.trim();
+      if (!term) {
+        render(input, []);
+        return;
+      }
+      timer = window.setTimeout(function () {
+        var sent = ++latest;
+        fetch('/autocomplete?q=' + encodeURIComponent(term))
+          .then(function (response) { return response.json(); })
+          .then(function (data) {
+            // an answer to an older query can arrive after a newer one
+            if (sent === latest && input.value.trim() === term) {
+              render(input, data[input.getAttribute('data-autocomplete')] || []);
+            }
+          })
+          .catch(function () {});
+      }, DELAY);
+    });
+    input.addEventListener('keydown', function (e) {
+      if (e.key === 'Escape') {
+        render(input, []);
+      }
+    });
+    input.addEventListener('blur', function () {
+      // let a click on a suggestion land first
+      window.setTimeout(function () { render(input, []); }, 200);
+    });
+  });
+})();
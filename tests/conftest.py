@@ -0,0 +1,72 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import db, Genre, Venue, Artist, Show
+from counters import recount
+
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Chicago', 'IL')]
+
+
+def make_app(tmp_path, **config):
+    # an app on a fresh SQLite database in tmp_path, with the tables created
+    app = create_app(dict({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'fyyur.db'),
+        # debug keeps create_app from logging to error.log
+        'DEBUG': True,
+        'TESTING': True,
+        'CACHE_TYPE': 'null',
+        'REQUEST_LOG': False,
+        'SLOW_QUERY_MS': 0,
+        'WTF_CSRF_ENABLED': False,
+        'IMAGE_DIR': str(tmp_path / 'images'),
+        'IMAGE_WORKERS': 0,
+        'TEMPLATE_CACHE_DIR': '',
+    }, **config))
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def seed(app, count):
+    # adds count venues and count artists, each with two past and two
+    # upcoming shows plus one with the first artist or at the first venue,
+    # and brings the counters and /venues summary up to date
+    now = datetime.now()
+    with app.app_context():
+        genre = Genre.query.filter_by(name='Jazz').first() or Genre(name='Jazz')
+        start = db.session.query(db.func.count(Venue.id)).scalar()
+        venues = [Venue(name='Venue %d' % i, city=CITIES[i % 3][0], state=CITIES[i % 3][1],
+                        address='%d Main St' % i, phone='555-0100', genres=[genre])
+                  for i in range(start, start + count)]
+        artists = [Artist(name='Artist %d' % i, city=CITIES[i % 3][0], state=CITIES[i % 3][1],
+                          phone='555-0100', genres=[genre])
+                   for i in range(start, start + count)]
+        db.session.add_all(venues + artists)
+        db.session.flush()
+        for i, (venue, artist) in enumerate(zip(venues, artists)):
+            for days in (-60, -30, 30, 60):
+                start_time = now + timedelta(days=days, hours=i)
+                db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                                    start_time=start_time,
+                                    end_time=start_time + timedelta(hours=2)))
+            start_time = now + timedelta(days=90, hours=start + i)
+            for venue_id, artist_id in {(1, artist.id), (venue.id, 1)}:
+                db.session.add(Show(venue_id=venue_id, artist_id=artist_id,
+                                    start_time=start_time,
+                                    end_time=start_time + timedelta(hours=2)))
+        db.session.commit()
+        recount()
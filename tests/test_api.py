@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+from models import db, Venue
+from conftest import seed
+
+
+def test_venues_are_paged_by_venue(app):
+    seed(app, 5)
+    client = app.test_client()
+    pages = [client.get('/api/v1/venues?per_page=2&page=%d' % page).json for page in (1, 2, 3)]
+    listed = [[venue["id"] for area in page["data"] for venue in area["venues"]]
+              for page in pages]
+    assert [len(ids) for ids in listed] == [2, 2, 1]
+    assert sorted(sum(listed, [])) == [1, 2, 3, 4, 5]
+    assert [page["has_next"] for page in pages] == [True, True, False]
+
+
+def test_if_modified_since(app):
+    seed(app, 2)
+    client = app.test_client()
+    for path in ('/api/v1/venues', '/api/v1/venues/1', '/api/v1/artists',
+                 '/api/v1/artists/1', '/api/v1/shows'):
+        response = client.get(path)
+        assert response.last_modified is not None, path
+        since = response.headers['Last-Modified']
+        assert client.get(path, headers={'If-Modified-Since': since}).status_code == 304, path
+    since = client.get('/api/v1/venues/1').headers['Last-Modified']
+    with app.app_context():
+        venue = db.session.get(Venue, 1)
+        venue.name = 'Renamed'
+        # a minute on, so the change lands in a later second than since
+        venue.updated_at = datetime.utcnow() + timedelta(minutes=1)
+        db.session.commit()
+    response = client.get('/api/v1/venues/1', headers={'If-Modified-Since': since})
+    assert response.status_code == 200
+    assert response.json["data"]["name"] == 'Renamed'
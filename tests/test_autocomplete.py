@@ -0,0 +1,54 @@
+from autocomplete import PrefixIndex, normalize
+
+NAMES = [(1, 'The Musical Hop'), (2, 'Park Square Live Music & Coffee'),
+         (3, "The Dueling Pianos Bar"), (4, 'Musicians Hall')]
+
+
+def ids(index, prefix, limit=10):
+    return [item["id"] for item in index.search(normalize(prefix), limit)]
+
+
+def loaded():
+    index = PrefixIndex(budget=1024 * 1024)
+    index.load(NAMES)
+    return index
+
+
+def test_prefix_matches_the_start_of_any_word():
+    index = loaded()
+    assert sorted(ids(index, 'mus')) == [1, 2, 4]
+    assert ids(index, 'musical h') == [1]
+    assert ids(index, 'HOP') == [1]
+    assert ids(index, 'live music & c') == [2]
+    assert ids(index, 'usical') == []
+    assert ids(index, 'the') == [3, 1]
+    assert len(ids(index, 'mus', limit=2)) == 2
+
+
+def test_add_and_remove_keep_the_index_sorted():
+    index = loaded()
+    assert index.add(5, 'Hop Scotch')
+    assert ids(index, 'hop') == [1, 5]
+    # renaming replaces the old name's runs
+    assert index.add(1, 'The Jazz Cellar')
+    assert ids(index, 'hop') == [5]
+    assert ids(index, 'jazz') == [1]
+    index.remove(4)
+    index.remove(4)
+    assert sorted(ids(index, 'mus')) == [2]
+    fresh = PrefixIndex(budget=1024 * 1024)
+    fresh.load([(1, 'The Jazz Cellar')] + NAMES[1:3] + [(5, 'Hop Scotch')])
+    assert list(index.ids) == list(fresh.ids)
+    assert list(index.offsets) == list(fresh.offsets)
+    assert index.size == fresh.size
+
+
+def test_budget():
+    full = loaded()
+    # room for whole names only
+    index = PrefixIndex(budget=full.size - 1)
+    index.load(NAMES)
+    assert not index.words and index.skipped == 0
+    assert ids(index, 'the') == [3, 1] and ids(index, 'hop') == []
+    assert not index.add(5, 'x' * index.budget)
+    assert 5 not in index.names
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Show
+from counters import roll_over, recount
+from deletion import archive, restore
+from conftest import seed
+
+
+def counters():
+    return {(model.__name__, row.id): (row.upcoming_shows_count, row.past_shows_count)
+            for model in (Venue, Artist) for row in model.query.order_by(model.id)}
+
+
+def counted(now):
+    # the counters worked out from the Show table, leaving out shows with
+    # an archived venue or artist
+    result = {}
+    for model, key, other, other_key in ((Venue, 'venue_id', Artist, 'artist_id'),
+                                         (Artist, 'artist_id', Venue, 'venue_id')):
+        for owner in model.query:
+            shows = Show.query.join(other, getattr(Show, other_key) == other.id). \
+                filter(getattr(Show, key) == owner.id, other.archived_at.is_(None)).all()
+            result[(model.__name__, owner.id)] = (
+                sum(1 for show in shows if show.start_time >= now),
+                sum(1 for show in shows if show.start_time < now))
+    return result
+
+
+def test_rollover_matches_a_recount(app):
+    seed(app, 6)
+    later = datetime.now() + timedelta(days=45)
+    with app.app_context():
+        pending = Show.query.filter(Show.counted_past.is_(False), Show.start_time < later).count()
+        # in several batches
+        assert pending > 4
+        assert roll_over(now=later, batch_size=4) == pending
+        assert roll_over(now=later) == 0
+        rolled = counters()
+        assert rolled == counted(later)
+        recount(now=later)
+        assert counters() == rolled
+
+
+def test_inserts_deletes_and_archives_keep_the_counters(app):
+    seed(app, 4)
+    now = datetime.now()
+    with app.app_context():
+        db.session.add(Show(venue_id=2, artist_id=3, start_time=now + timedelta(days=120)))
+        db.session.add(Show(venue_id=3, artist_id=2, start_time=now - timedelta(days=120)))
+        db.session.delete(db.session.get(Show, 1))
+        db.session.commit()
+        assert counters() == counted(now)
+        archive(Artist, 2)
+        assert counters() == counted(now)
+        restore(Artist, 2)
+        assert counters() == counted(now)
+        recount(now=now)
+        assert counters() == counted(now)
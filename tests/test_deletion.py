@@ -0,0 +1,30 @@
+from models import db, Venue, Show
+from conftest import seed
+
+
+def test_admin_endpoints_need_the_token(app):
+    seed(app, 2)
+    app.config.update(DEBUG=False, ADMIN_TOKEN='secret')
+    client = app.test_client()
+    for headers in ({}, {'Authorization': 'Bearer wrong'}):
+        assert client.delete('/venues/2', headers=headers).status_code == 401
+        assert client.get('/cache/stats', headers=headers).status_code == 401
+    with app.app_context():
+        assert db.session.get(Venue, 2) is not None
+
+    headers = {'Authorization': 'Bearer secret'}
+    assert client.get('/cache/stats', headers=headers).status_code == 200
+    response = client.delete('/venues/2', headers=headers)
+    assert response.status_code == 200 and response.json["success"]
+    with app.app_context():
+        assert db.session.get(Venue, 2) is None
+        assert Show.query.filter_by(venue_id=2).count() == 0
+
+
+def test_admin_endpoints_refuse_everyone_without_a_token(app):
+    seed(app, 1)
+    app.config.update(DEBUG=False, ADMIN_TOKEN=None)
+    client = app.test_client()
+    assert client.delete('/venues/1', headers={'Authorization': 'Bearer '}).status_code == 401
+    assert client.get('/cache/stats').status_code == 401
+    assert b'data-delete-url' not in client.get('/venues/1').data
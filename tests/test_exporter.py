@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Show
+from exporter import export_rows
+from counters import roll_over, recount
+from conftest import seed
+
+LONG_AGO = datetime(2020, 1, 1)
+
+
+def exported_ids(entity, since):
+    return [row["id"] for row in export_rows(entity, since=since)]
+
+
+def test_counter_updates_dont_count_as_modifications(app):
+    seed(app, 3)
+    with app.app_context():
+        for model in (Venue, Artist, Show):
+            db.session.execute(model.__table__.update().values(updated_at=LONG_AGO))
+        db.session.commit()
+        since = LONG_AGO + timedelta(seconds=1)
+
+        # a month on, the shows 30 days out have started
+        moved = roll_over(now=datetime.now() + timedelta(days=45))
+        recount()
+        assert moved
+        assert exported_ids('venues', since) == []
+        assert exported_ids('artists', since) == []
+        assert len(exported_ids('shows', since)) == moved
+
+        db.session.get(Venue, 2).name = 'Renamed'
+        db.session.commit()
+        assert exported_ids('venues', since) == [2]
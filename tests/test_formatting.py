@@ -0,0 +1,29 @@
+import time
+from datetime import datetime
+import pytest
+from formatting import format_datetime
+
+SHOW = datetime(2030, 6, 1, 20, 0)
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    # run as a server in New York
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_show_times_stay_in_the_servers_zone(app, local_zone):
+    with app.test_request_context(headers={'Cookie': 'tz=America/New_York'}):
+        assert format_datetime(SHOW, 'medium', 'en') == 'Sat 06, 01, 2030 8:00PM'
+
+
+def test_show_times_convert_to_the_visitors_zone(app, local_zone):
+    with app.test_request_context(headers={'Cookie': 'tz=America/Los_Angeles'}):
+        assert format_datetime(SHOW, 'medium', 'en') == 'Sat 06, 01, 2030 5:00PM'
+    app.config['SERVER_TIMEZONE'] = 'UTC'
+    with app.test_request_context(headers={'Cookie': 'tz=America/Los_Angeles'}):
+        assert format_datetime(SHOW, 'medium', 'en') == 'Sat 06, 01, 2030 1:00PM'
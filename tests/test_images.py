@@ -0,0 +1,104 @@
+import socket
+import struct
+import threading
+import zlib
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import pytest
+from models import db, Artist
+from images import fetch, ImageError, ONE_YEAR
+from conftest import seed
+
+
+def png(width=4, height=4):
+    # a valid RGB PNG, small enough to write out by hand
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    rows = b''.join(b'\x00' + b'\xff\x00\x00' * width for _ in range(height))
+    return b'\x89PNG\r\n\x1a\n' + \
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b'')
+
+
+@pytest.fixture
+def image_server():
+    # serves a PNG at /band.png on a local port; .requests lists the paths asked for
+    body = png()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.requests.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def artist_form(artist, image_link):
+    return {"name": artist.name, "city": artist.city, "state": artist.state,
+            "phone": artist.phone, "facebook_link": '', "image_link": image_link,
+            "website_link": '', "seeking_description": '', "genres": ['Jazz']}
+
+
+def test_edit_fetches_and_serves_thumbnails(app, image_server):
+    app.config['IMAGE_ALLOW_PRIVATE'] = True
+    seed(app, 1)
+    url = 'http://127.0.0.1:%d/band.png' % image_server.server_port
+    with app.app_context():
+        form = artist_form(db.session.get(Artist, 1), url)
+    client = app.test_client()
+    # IMAGE_WORKERS is 0, so the fetch runs before the redirect
+    assert client.post('/artists/1/edit', data=form).status_code == 302
+    assert image_server.requests == ['/band.png']
+    with app.app_context():
+        image_key = db.session.get(Artist, 1).image_key
+    assert image_key
+    digest, extension = image_key.split('.')
+    response = client.get('/images/%s-tile.%s' % (digest, extension))
+    assert response.status_code == 200
+    assert response.data.startswith(b'\x89PNG')
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+    assert response.cache_control.max_age == ONE_YEAR
+
+
+def test_fetch_refuses_private_addresses(image_server):
+    with pytest.raises(ImageError, match='refusing'):
+        fetch('http://127.0.0.1:%d/band.png' % image_server.server_port)
+    assert image_server.requests == []
+
+
+def test_fetch_connects_to_the_checked_address(monkeypatch):
+    # DNS rebinding: the name resolves to a public address when checked and
+    # to loopback afterwards, so the connection must go to the address checked
+    # rather than look the name up again
+    answers = ['93.184.215.14', '127.0.0.1']
+    lookups, connections = [], []
+
+    def rebinding(host, port, *args, **kwargs):
+        lookups.append(host)
+        address = answers.pop(0) if answers else '127.0.0.1'
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port))]
+
+    def connect(address, *args, **kwargs):
+        connections.append(address)
+        raise ConnectionRefusedError('not connecting in tests')
+
+    monkeypatch.setattr(socket, 'getaddrinfo', rebinding)
+    monkeypatch.setattr(socket, 'create_connection', connect)
+    with pytest.raises(ImageError, match='fetch failed'):
+        fetch('http://images.example:8080/band.png')
+    assert lookups == ['images.example']
+    assert connections == [('93.184.215.14', 8080)]
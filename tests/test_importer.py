@@ -0,0 +1,90 @@
+import io
+import json
+from datetime import datetime, timedelta
+from models import db, Venue, Artist, Show
+from importer import import_rows, read_rows
+from conftest import seed
+
+VENUES_CSV = """name,city,state,address,phone,genres,facebook_link,seeking_talent
+The Den,Austin,TX,1 Red River St,555-0101,"Jazz, Blues",https://facebook.com/den,y
+,Austin,TX,2 Red River St,555-0102,Jazz,https://facebook.com/nameless,
+The Loft,Austin,TX,3 Red River St,555-0103,Rock n Roll,https://facebook.com/loft,false
+"""
+
+ARTIST = {"name": "The Quartet", "city": "Austin", "state": "TX", "phone": "555-0104",
+          "genres": ["Jazz"], "facebook_link": "https://facebook.com/quartet"}
+
+
+def run_import(app, entity, text, file_format, **kwargs):
+    errors = []
+    with app.app_context():
+        totals = import_rows(entity, read_rows(io.StringIO(text), file_format),
+                             on_error=lambda number, error: errors.append((number, error)),
+                             **kwargs)
+    return totals, errors
+
+
+def ndjson(*rows):
+    return ''.join((row if isinstance(row, str) else json.dumps(row)) + '\n' for row in rows)
+
+
+def test_csv_rows_that_fail_validation_are_skipped(app):
+    totals, errors = run_import(app, 'venues', VENUES_CSV, 'csv')
+    assert totals == {"rows": 3, "imported": 2, "errors": 1}
+    assert errors == [(2, 'name: This field is required.')]
+    with app.app_context():
+        den = Venue.query.filter_by(name='The Den').one()
+        assert sorted(genre.name for genre in den.genres) == ['Blues', 'Jazz']
+        assert den.seeking_talent
+
+
+def test_ndjson_rows_of_the_wrong_shape_are_reported(app):
+    text = ndjson(ARTIST,
+                  '{"name": ',
+                  '["not", "an", "object"]',
+                  dict(ARTIST, name='Numbered', genres=5),
+                  dict(ARTIST, name='Listed', genres=[1, 2]),
+                  dict(ARTIST, name={"first": "Nested"}),
+                  dict(ARTIST, name='The Trio'))
+    totals, errors = run_import(app, 'artists', text, 'ndjson')
+    assert totals == {"rows": 7, "imported": 2, "errors": 5}
+    assert [number for number, _ in errors] == [2, 3, 4, 5, 6]
+    assert errors[0][1].startswith('not valid JSON on line 2')
+    assert errors[1][1] == 'line 3 is not a JSON object'
+    assert errors[2][1] == errors[3][1] == 'genres: not a list of genre names'
+    assert errors[4][1] == 'name: not a single value'
+    with app.app_context():
+        assert sorted(artist.name for artist in Artist.query) == ['The Quartet', 'The Trio']
+
+
+def test_a_failing_chunk_is_retried_row_by_row(app):
+    # phone is optional on the form but NOT NULL in the table, so the
+    # second row only fails when the chunk is written
+    rows = [dict(ARTIST, name='Artist %d' % i) for i in range(3)]
+    del rows[1]['phone']
+    totals, errors = run_import(app, 'artists', ndjson(*rows), 'ndjson', chunk_size=2)
+    assert totals == {"rows": 3, "imported": 2, "errors": 1}
+    assert len(errors) == 1 and errors[0][0] == 2 and 'NOT NULL' in errors[0][1]
+    with app.app_context():
+        assert sorted(artist.name for artist in Artist.query) == ['Artist 0', 'Artist 2']
+
+
+def test_shows_are_checked_and_counted(app):
+    seed(app, 2)
+    start = (datetime.now() + timedelta(days=200)).replace(microsecond=0)
+
+    def show(artist_id, venue_id, hours=0):
+        return {"artist_id": artist_id, "venue_id": venue_id,
+                "start_time": (start + timedelta(hours=hours)).strftime('%Y-%m-%d %H:%M:%S')}
+
+    with app.app_context():
+        before = db.session.get(Venue, 2).upcoming_shows_count
+    text = ndjson(show(2, 2), show(99, 2, 5), show(1, 2, 1), dict(show(1, 1, 24), duration=90))
+    totals, errors = run_import(app, 'shows', text, 'ndjson')
+    assert totals == {"rows": 4, "imported": 2, "errors": 2}
+    assert errors == [(2, 'artist_id: no artist with id 99'),
+                      (3, 'start_time: venue double-booked with row 1')]
+    with app.app_context():
+        assert db.session.get(Venue, 2).upcoming_shows_count == before + 1
+        added = Show.query.filter(Show.venue_id == 1, Show.start_time == start + timedelta(hours=24)).one()
+        assert added.end_time - added.start_time == timedelta(minutes=90)
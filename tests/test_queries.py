@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import event
+from models import db
+from conftest import seed
+
+# statements each page runs, whatever the number of venues, artists and shows
+STATEMENTS = {
+    '/venues': 1,
+    '/venues/1': 3,
+    '/artists/1': 3,
+}
+
+
+def count_statements(app, path):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = app.test_client().get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('path', sorted(STATEMENTS))
+def test_statements_per_page_dont_grow_with_rows(app, path):
+    seed(app, 3)
+    assert count_statements(app, path) == STATEMENTS[path]
+    seed(app, 40)
+    assert count_statements(app, path) == STATEMENTS[path]
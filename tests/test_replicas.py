@@ -0,0 +1,79 @@
+import shutil
+import pytest
+from sqlalchemy import create_engine, event, select, update
+from models import db, Venue, Genre
+from replicas import replicas, STICKY_COOKIE
+from conftest import make_app, seed
+
+
+@pytest.fixture
+def routed(tmp_path):
+    # a primary and a copy of it as the replica, which renames venue 1 so
+    # that pages show which database they were read from
+    seed(make_app(tmp_path), 1)
+    shutil.copy(tmp_path / 'fyyur.db', tmp_path / 'replica.db')
+    replica_uri = 'sqlite:///%s' % (tmp_path / 'replica.db')
+    with create_engine(replica_uri).begin() as connection:
+        connection.execute(update(Venue.__table__).where(Venue.__table__.c.id == 1).
+                           values(name='Replica Hall'))
+    app = make_app(tmp_path, SQLALCHEMY_REPLICA_URIS=[replica_uri])
+    statements = {"primary": 0, "replica": 0}
+    with app.app_context():
+        engines = {"primary": db.engine, "replica": replicas.replicas[0].engine}
+
+    def counter(name):
+        def record(*args):
+            statements[name] += 1
+        return record
+
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', counter(name))
+    yield app, statements
+    for engine in engines.values():
+        engine.dispose()
+
+
+def test_reads_go_to_the_replica(routed):
+    app, statements = routed
+    response = app.test_client().get('/venues/1')
+    assert b'Replica Hall' in response.data
+    assert statements["primary"] == 0 and statements["replica"] > 0
+
+
+def test_writes_go_to_the_primary_and_stick(routed):
+    app, statements = routed
+    client = app.test_client()
+    form = {"name": 'Primary Hall', "city": 'San Francisco', "state": 'CA',
+            "phone": '555-0100', "facebook_link": '', "image_link": '',
+            "website_link": '', "seeking_description": '', "genres": ['Jazz']}
+    response = client.post('/venues/1/edit', data=form)
+    assert STICKY_COOKIE in response.headers.get('Set-Cookie', '')
+    statements.update(primary=0, replica=0)
+    # the redirect after the edit carries the cookie, so it reads the primary
+    assert b'Primary Hall' in client.get('/venues/1').data
+    assert statements["replica"] == 0
+
+
+def test_locking_reads_go_to_the_primary(routed):
+    app, statements = routed
+    with app.test_request_context('/venues/1'):
+        statement = select(Venue.name).where(Venue.id == 1)
+        assert db.session.execute(statement.with_for_update()).scalar() == 'Venue 0'
+        # and so does the rest of the request
+        assert db.session.execute(statement).scalar() == 'Venue 0'
+    assert statements["replica"] == 0
+
+
+def test_flushes_and_updates_go_to_the_primary(routed):
+    app, statements = routed
+    with app.test_request_context('/venues/1'):
+        assert db.session.get(Venue, 1).name == 'Replica Hall'
+        db.session.add(Genre(name='Polka'))
+        db.session.flush()
+        # the request reads its own write back
+        assert db.session.execute(select(Genre.id).where(Genre.name == 'Polka')).scalar()
+        db.session.execute(update(Venue).where(Venue.id == 1).values(name='Updated Hall'))
+        db.session.commit()
+    with app.app_context():
+        assert db.session.get(Venue, 1).name == 'Updated Hall'
+        assert Genre.query.filter_by(name='Polka').count() == 1
@@ -0,0 +1,74 @@
+import random
+from datetime import timedelta, timezone
+from models import db, Show
+from scheduling import IntervalIndex, check_lineup
+from conftest import seed
+
+
+def check(app, shows):
+    return app.test_client().post('/api/v1/shows/check', json={"shows": shows})
+
+
+def test_check_converts_times_with_an_offset(app):
+    seed(app, 1)
+    with app.app_context():
+        show = db.session.get(Show, 1)
+        # the same instant, written in UTC
+        start_time = show.start_time.astimezone().astimezone(timezone.utc).isoformat()
+    response = check(app, [{"venue_id": 1, "artist_id": 1, "start_time": start_time}])
+    assert response.status_code == 200
+    assert {"index": 0, "on": "venue_id", "show_id": 1} in response.json["conflicts"]
+
+
+def test_check_rejects_bad_times(app):
+    for start_time in ('tomorrow', 5, None):
+        response = check(app, [{"venue_id": 1, "artist_id": 1, "start_time": start_time}])
+        assert response.status_code == 400
+
+
+def overlapping(intervals, start, end):
+    return sorted(IntervalIndex(intervals).overlapping(start, end))
+
+
+def test_intervals_that_only_touch_dont_overlap():
+    intervals = [(10, 12, 'a'), (12, 14, 'b'), (14, 16, 'c')]
+    assert overlapping(intervals, 12, 14) == ['b']
+    assert overlapping(intervals, 8, 10) == []
+    assert overlapping(intervals, 16, 18) == []
+    assert overlapping(intervals, 11, 15) == ['a', 'b', 'c']
+    assert overlapping(intervals, 13, 13.5) == ['b']
+    assert overlapping(intervals, 0, 100) == ['a', 'b', 'c']
+
+
+def test_intervals_match_a_pairwise_check():
+    rng = random.Random(7)
+    for size in (0, 1, 2, 3, 10, 200):
+        intervals = []
+        for value in range(size):
+            start = rng.randrange(100)
+            intervals.append((start, start + rng.randrange(1, 30), value))
+        for _ in range(50):
+            start = rng.randrange(-10, 110)
+            end = start + rng.randrange(1, 30)
+            assert overlapping(intervals, start, end) == sorted(
+                value for item_start, item_end, value in intervals
+                if item_start < end and start < item_end)
+
+
+def test_back_to_back_bookings_dont_conflict(app):
+    seed(app, 1)
+    with app.app_context():
+        show = db.session.get(Show, 1)
+        before = show.start_time - timedelta(hours=2)
+        lineup = [
+            # ends as show 1 starts, and starts as it ends
+            {"venue_id": 1, "artist_id": 1, "start_time": before, "end_time": show.start_time},
+            {"venue_id": 1, "artist_id": 1, "start_time": show.end_time,
+             "end_time": show.end_time + timedelta(hours=1)},
+            # a minute into show 1
+            {"venue_id": 1, "artist_id": 1, "start_time": show.end_time - timedelta(minutes=1),
+             "end_time": show.end_time + timedelta(minutes=30)},
+        ]
+        conflicts = check_lineup(lineup)
+    assert {(conflict["index"], conflict.get("show_id"), conflict.get("other_index"))
+            for conflict in conflicts} == {(2, 1, None), (2, None, 1)}
@@ -0,0 +1,41 @@
+from sqlalchemy import event, inspect
+from models import db, Venue
+from search import search_by_name
+from conftest import seed
+
+
+def searched(app, term):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            results = search_by_name(Venue, term)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return [row.name for row in results["data"]], statements
+
+
+def test_create_all_builds_the_search_index(app):
+    with app.app_context():
+        assert 'Venue_fts' in inspect(db.engine).get_table_names()
+    seed(app, 12)
+    names, statements = searched(app, 'nue 1')
+    assert names and all('nue 1' in name for name in names)
+    assert all('MATCH' in statement for statement in statements)
+
+
+def test_the_index_follows_renames_and_rebuilds(app):
+    seed(app, 2)
+    with app.app_context():
+        db.session.get(Venue, 1).name = 'Blue Moon'
+        db.session.commit()
+    assert searched(app, 'moon')[0] == ['Blue Moon']
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    seed(app, 1)
+    assert searched(app, 'venue')[0] == ['Venue 0']
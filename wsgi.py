@@ -0,0 +1,19 @@
+#----------------------------------------------------------------------------#
+# WSGI entry point.
+#----------------------------------------------------------------------------#
+
+# gunicorn --workers 4 --bind 0.0.0.0:8000 wsgi:application
+# uwsgi --http :8000 --processes 4 --module wsgi:application --lazy-apps
+#
+# Settings come from config.py, which reads the environment (DATABASE_URL,
+# SECRET_KEY, DB_POOL_SIZE, ...). Each worker imports this module after the
+# fork and builds its own connection pool, so don't enable gunicorn's
+# --preload or run uwsgi without --lazy-apps.
+
+from app import create_app, warm_pool, warm_templates
+from autocomplete import autocomplete
+
+application = create_app()
+warm_pool(application)
+warm_templates(application)
+autocomplete.load(application)